@@ -0,0 +1,87 @@
+"""Adaptive limit on the number of requests in flight to Qualer.
+
+The limit follows AIMD, like TCP congestion control. Every healthy reply
+raises it by ``1/limit``, so it grows by about one per round of requests up
+to the ceiling. A slow reply, a failed connection, a 429 or a 5xx halves it,
+at most once per round trip, so one burst of errors is not punished several
+times over. A ``Retry-After`` from the server pauses every worker, not only
+the one that received it.
+"""
+
+import random
+import threading
+import time
+import metrics
+
+DEFAULT_SLOW_SECONDS = 10.0
+
+
+class AdaptiveLimiter:
+    """Blocks callers while the in-flight count is at the current limit."""
+
+    def __init__(self, ceiling=10, floor=1, slow_seconds=DEFAULT_SLOW_SECONDS, decrease=0.5):
+        self.floor = floor
+        self.slow_seconds = slow_seconds
+        self.decrease = decrease
+        self.in_flight = 0
+        self.decreases = 0
+        self._cond = threading.Condition()
+        self._resume_at = 0.0
+        self._last_decrease = 0.0
+        self.set_ceiling(ceiling)
+
+    def set_ceiling(self, ceiling):
+        """Cap the limit at ``ceiling``; it restarts halfway and climbs from there."""
+        with self._cond:
+            self.ceiling = max(self.floor, ceiling)
+            self.limit = max(float(self.floor), self.ceiling / 2)
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    self._cond.wait(pause)
+                elif self.in_flight < int(self.limit):
+                    break
+                else:
+                    self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, ok=True):
+        """Record how a request went and let the next one through."""
+        with self._cond:
+            self.in_flight -= 1
+            if ok and latency <= self.slow_seconds:
+                self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+            else:
+                self._back_off(latency)
+            limit = self.limit
+            self._cond.notify_all()
+        metrics.gauge("concurrency_limit", int(limit))
+
+    def pause(self, seconds):
+        """Hold every new request for ``seconds`` (a server ``Retry-After``)."""
+        with self._cond:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def _back_off(self, latency):
+        now = time.monotonic()
+        # Requests that were already in flight when the limit was cut report
+        # the same congestion; only cut again after a round trip has passed
+        if now - self._last_decrease < min(max(latency, 1.0), self.slow_seconds):
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        metrics.count("concurrency_decreases_total")
+        self.limit = max(float(self.floor), self.limit * self.decrease)
+
+
+def backoff_delay(attempt, retry_after=None, base=1.0, cap=60.0):
+    """Seconds to wait before retry ``attempt`` (0-based); honours ``Retry-After``."""
+    if retry_after:
+        return min(retry_after, cap)
+    delay = min(cap, base * 2**attempt)
+    # Jitter spreads out workers that failed together
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,232 @@
+"""End-to-end throughput of the crawl scripts against the fake Qualer server.
+
+Run from the repository root against a scratch database (the crawlers write
+their real tables, so never point this at the production database):
+
+    python -m benchmarks.bench_crawl --database-url postgresql://postgres@localhost/scratch
+    python -m benchmarks.bench_crawl --database-url ... --latency 0.05 --concurrency 20
+    python -m benchmarks.bench_crawl --database-url ... --crawler collectBudgets --scale 3
+    python -m benchmarks.bench_crawl --database-url ... --processes 4
+    python -m benchmarks.bench_crawl --database-url ... --spare-techniques 200 --no-bulk
+
+Each crawler runs in its own process, so its peak memory is its own. The
+table reports the requests made, requests/s and rows/s over the whole run,
+the time spent inside the database loader and the peak resident set size. collectBudgets
+reads the budget IDs that collectUncertainties loaded, so keep that order.
+With ``--processes N`` each crawler runs as N workers sharing one database
+work queue (``--queue``); the table then shows the wall time of the slowest
+worker, the rows and database time summed over all of them and the largest
+peak. collectUncertainties and getCMCs read the site-level grids of the fake
+sites first unless ``--no-bulk`` is given; ``--spare-techniques`` adds
+techniques without budgets, as in a real TechniquesList.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from functools import wraps
+from benchmarks.fakeQualer import AUTH_COOKIE, FakeCatalog, FakeQualer
+
+CRAWLERS = ("collectUncertainties", "getCMCs", "collectBudgets")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None where unknown."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class _Meter:
+    """Counts the rows passing through a function and the time spent in it."""
+
+    def __init__(self):
+        self.rows = 0
+        self.seconds = 0.0
+
+    def wrap(self, function, rows):
+        @wraps(function)
+        def measured(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.seconds += time.perf_counter() - start
+            self.rows += rows(args, result)
+            return result
+
+        return measured
+
+
+def run_crawler(name, base_url, database_url, cache_dir, concurrency, queue=None, bulk=()):
+    """Run one crawler in this process and return its measurements."""
+    from sqlalchemy import create_engine
+    from qualerAuth import save_cookies
+
+    module = importlib.import_module(name)
+    module.BASE_URL = base_url
+    module.engine = create_engine(database_url)
+    # A cached login means the crawler never needs to start Chrome
+    save_cookies([AUTH_COOKIE], os.path.join(cache_dir, "qualer_cookies.json"))
+
+    db = _Meter()
+    rows = _Meter()
+    if name == "collectUncertainties":
+        import dbWriter
+
+        dbWriter.load_records = db.wrap(dbWriter.load_records, lambda a, _: len(a[2]))
+        argv = ["--concurrency", str(concurrency), "--refresh-pairs"]
+        counted = db
+    elif name == "getCMCs":
+        # Capabilities stream into COPY, so the time includes reading the reply
+        module.replace_records = db.wrap(module.replace_records, lambda _, loaded: loaded)
+        argv = []
+        counted = db
+    else:
+        # collectBudgets writes files; count the component and value rows it saves
+        module.split_components = rows.wrap(
+            module.split_components, lambda a, _: len(a[1]) * 2
+        )
+        argv = ["--workers", str(concurrency)]
+        counted = rows
+
+    if name != "collectBudgets":
+        # The sites to read the site-level grids of, or --no-bulk
+        argv += [arg for siteId in bulk for arg in ("--site-id", str(siteId))] or ["--no-bulk"]
+    # Queued workers must not --restart: it would empty the queue the others share.
+    # They share this machine, so each needs its own name (and collectBudgets part).
+    argv += ["--queue", queue, "--worker", os.path.basename(cache_dir)] if queue else ["--restart"]
+    start = time.perf_counter()
+    module.main(["--cache-dir", cache_dir, *argv])
+    elapsed = time.perf_counter() - start
+    return {
+        "crawler": name,
+        "seconds": elapsed,
+        "rows": counted.rows,
+        "db_seconds": db.seconds if counted is db else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="Scratch database to load into")
+    parser.add_argument("--crawler", choices=CRAWLERS, action="append", help="Default: all")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--scale", type=int, default=1, help="Copies of the seed catalogue")
+    parser.add_argument("--components", type=int, default=4, help="Components per budget")
+    parser.add_argument("--values", type=int, default=3, help="Values per component")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 replies")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of dropped connections")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of 429 replies")
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Workers per crawler, sharing a work queue"
+    )
+    parser.add_argument(
+        "--spare-techniques", type=int, default=0, help="Techniques without budgets per copy"
+    )
+    parser.add_argument(
+        "--no-bulk", action="store_true", help="Fetch per pair and technique, not per site"
+    )
+    # Internal: run a single crawler in this process and print its result
+    parser.add_argument("--run", choices=CRAWLERS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--cache-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--queue", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        result = run_crawler(
+            args.run,
+            args.base_url,
+            args.database_url,
+            args.cache_dir,
+            args.concurrency,
+            args.queue,
+            () if args.no_bulk else range(1, args.scale + 1),
+        )
+        print(json.dumps(result))
+        return
+
+    catalog = FakeCatalog(
+        scale=args.scale,
+        components_per_budget=args.components,
+        values_per_component=args.values,
+        spare_techniques=args.spare_techniques,
+    )
+    print(
+        f"{len(catalog.techniques)} techniques x {len(catalog.service_capabilities)} service "
+        f"capability rows ({catalog.pair_count} pairs), {len(catalog.budgets)} budgets"
+    )
+    pythonpath = os.pathsep.join(filter(None, [ROOT, os.getenv("PYTHONPATH")]))
+    env = dict(os.environ, PYTHONPATH=pythonpath)
+    results = []
+    with FakeQualer(
+        catalog,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        throttle_rate=args.throttle_rate,
+    ) as fake, tempfile.TemporaryDirectory() as workdir:
+        for name in args.crawler or CRAWLERS:
+            requests_before = fake.requests
+            queue = ["--queue", f"bench-{time.time_ns()}"] if args.processes > 1 else []
+            children = [
+                subprocess.Popen(
+                    [
+                        sys.executable, "-m", "benchmarks.bench_crawl",
+                        "--run", name,
+                        "--database-url", args.database_url,
+                        "--base-url", fake.url,
+                        "--cache-dir", os.path.join(workdir, f"cache{i}"),
+                        "--concurrency", str(args.concurrency),
+                        "--scale", str(args.scale),
+                        *(["--no-bulk"] if args.no_bulk else []),
+                        *queue,
+                    ],
+                    cwd=workdir,  # collectBudgets writes csv/ under the working directory
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                )
+                for i in range(args.processes)
+            ]
+            outputs = [child.communicate()[0] for child in children]
+            failed = [child.returncode for child in children if child.returncode]
+            if failed:
+                sys.exit(f"{name} failed with exit code {failed[0]}")
+            parts = [json.loads(out.strip().splitlines()[-1]) for out in outputs]
+            result = dict(parts[0], seconds=max(p["seconds"] for p in parts))
+            result["rows"] = sum(p["rows"] for p in parts)
+            if result["db_seconds"] is not None:
+                result["db_seconds"] = sum(p["db_seconds"] for p in parts)
+            if result["peak_rss_mb"] is not None:
+                result["peak_rss_mb"] = max(p["peak_rss_mb"] for p in parts)
+            result["requests"] = fake.requests - requests_before
+            results.append(result)
+
+    print(
+        f"\n{'crawler':>22} {'seconds':>9} {'requests':>9} {'requests/s':>11} {'rows/s':>10}"
+        f" {'db seconds':>11} {'peak MiB':>9}"
+    )
+    for r in results:
+        db_seconds = "-" if r["db_seconds"] is None else f"{r['db_seconds']:.2f}"
+        peak = "-" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f}"
+        print(
+            f"{r['crawler']:>22} {r['seconds']:9.2f} {r['requests']:9,}"
+            f" {r['requests'] / r['seconds']:11,.0f}"
+            f" {r['rows'] / r['seconds']:10,.0f} {db_seconds:>11} {peak:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""Local stand-in for the Qualer endpoints the crawl scripts call.
+
+The catalogue is seeded from ``json/serviceCapabilities.json`` and
+``json/budgets.json``; component, value and capability rows are generated
+deterministically from a seed. ``scale`` repeats the service groups,
+techniques and budgets under new IDs to grow the crawl, one site per copy;
+``spare_techniques`` adds techniques without budgets to each copy. The
+site-level grid endpoints answer ``page``/``pageSize`` one page at a time.
+
+Requests without the fake auth cookie are redirected to ``/login`` like the
+real site does. Latency, 5xx errors and dropped connections can be injected
+to see how the crawlers behave under load, as can 429s with ``Retry-After``.
+
+Run standalone with ``python -m benchmarks.fakeQualer --port 8800``.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+JSON_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "json")
+AUTH_COOKIE = {"name": ".ASPXAUTH", "value": "fake-qualer"}
+_AUTH = f"{AUTH_COOKIE['name']}={AUTH_COOKIE['value']}"
+# Keeps scaled copies of an ID apart from the originals and from each other
+_ID_STRIDE = 1_000_000
+_UNITS = ("mV", "V", "kPa", "psi", "°C", "in", "lbf·in")
+_DISTRIBUTIONS = ("Normal", "Rectangular", "Triangular", "U-Shaped")
+
+
+class FakeCatalog:
+    """The data served by ``FakeQualer``, built once up front."""
+
+    def __init__(
+        self,
+        scale=1,
+        components_per_budget=4,
+        values_per_component=3,
+        capabilities_per_technique=20,
+        groups_per_budget=2,
+        spare_techniques=0,
+        seed=0,
+        json_dir=JSON_DIR,
+    ):
+        self.components_per_budget = components_per_budget
+        self.values_per_component = values_per_component
+        self.capabilities_per_technique = capabilities_per_technique
+        self.seed = seed
+        with open(os.path.join(json_dir, "serviceCapabilities.json"), encoding="utf-8") as f:
+            views = json.load(f)["views"]
+        with open(os.path.join(json_dir, "budgets.json"), encoding="utf-8") as f:
+            budgets = json.load(f)["Data"]
+
+        names = sorted({budget["TechniqueName"] for budget in budgets if budget["TechniqueName"]})
+        self.service_capabilities = []
+        self.techniques = []
+        self.budgets = {}
+        self.listing = {}
+        self._pairs = {}
+        rng = random.Random(seed)
+        for copy in range(scale):
+            offset = copy * _ID_STRIDE
+            for view in views:
+                self.service_capabilities.append(
+                    dict(view, ServiceGroupId=view["ServiceGroupId"] + offset)
+                )
+            technique_ids = {}
+            labels = {}
+            for i, name in enumerate(names):
+                technique_ids[name] = 1000 + i + offset
+                labels[name] = f"{name} #{copy}" if copy else name
+                self.techniques.append({"TechniqueId": 1000 + i + offset, "Name": labels[name]})
+            # Techniques no budget uses, as most of a real TechniquesList
+            for i in range(len(names), len(names) + spare_techniques):
+                self.techniques.append({"TechniqueId": 1000 + i + offset, "Name": f"Spare {i}"})
+            group_ids = sorted({view["ServiceGroupId"] + offset for view in views})
+            for budget in budgets:
+                budgetId = budget["UncertaintyBudgetId"] + offset
+                # The site-level listing row, shaped like json/budgets.json
+                self.listing[budgetId] = dict(
+                    budget,
+                    UncertaintyBudgetId=budgetId,
+                    TechniqueName=labels.get(budget["TechniqueName"]),
+                )
+                self.budgets[budgetId] = {
+                    "UncertaintyBudgetId": budgetId,
+                    "BudgetName": budget["BudgetName"],
+                    "ComponentsCount": components_per_budget,
+                    "ActivationDate": budget["ActivationDate"],
+                    "ExpirationDate": budget["ExpirationDate"],
+                    "SiteId": 1 + copy,
+                }
+                # A budget without a technique is not offered under any service group
+                techniqueId = technique_ids.get(budget["TechniqueName"])
+                if techniqueId is None:
+                    continue
+                for groupId in rng.sample(group_ids, min(groups_per_budget, len(group_ids))):
+                    self._pairs.setdefault((groupId, techniqueId), []).append(budgetId)
+
+    @property
+    def pair_count(self):
+        return len({v["ServiceGroupId"] for v in self.service_capabilities}) * len(self.techniques)
+
+    def uncertainty_budgets(self, serviceGroupId, techniqueId):
+        return [self.budgets[b] for b in self._pairs.get((serviceGroupId, techniqueId), [])]
+
+    def uncertainty_components(self, budgetId):
+        if budgetId not in self.budgets:
+            return []
+        rng = random.Random(budgetId * 7919 + self.seed)
+        components = []
+        for i in range(self.components_per_budget):
+            componentId = budgetId * 100 + i
+            components.append(
+                {
+                    "Id": componentId,
+                    "Name": f"Component {i + 1}",
+                    "ComponentType": rng.choice(("A", "B")),
+                    "DistributionType": rng.choice(_DISTRIBUTIONS),
+                    "Divisor": rng.choice((1.0, 2.0, 3 ** 0.5, 6 ** 0.5, 2 ** 0.5)),
+                    "SensitivityCoefficient": 1.0,
+                    "DegreesOfFreedom": rng.choice((None, 9, 29, 100)),
+                    "UncertaintyValues": [
+                        self._value(rng, componentId * 100 + j)
+                        for j in range(self.values_per_component)
+                    ],
+                }
+            )
+        return components
+
+    def capabilities(self, techniqueId):
+        rng = random.Random(techniqueId * 104729 + self.seed)
+        rows = []
+        low = 0.0
+        for i in range(self.capabilities_per_technique):
+            high = low + rng.uniform(1, 100)
+            rows.append(
+                {
+                    "Parameter": f"Parameter {i % 3 + 1}",
+                    "RangeMin": round(low, 4),
+                    "RangeMax": round(high, 4),
+                    "Unit": rng.choice(_UNITS),
+                    "Uncertainty": round(rng.uniform(0.001, 1), 6),
+                    "UncertaintyUnit": "%",
+                }
+            )
+            low = high
+        return rows
+
+    def site_capabilities(self, siteId):
+        """Capabilities of every technique of a site, named as in the budget listing."""
+        rows = []
+        for technique in self.techniques:
+            if technique["TechniqueId"] // _ID_STRIDE + 1 == siteId:
+                rows.extend(
+                    dict(row, TechniqueName=technique["Name"])
+                    for row in self.capabilities(technique["TechniqueId"])
+                )
+        return rows
+
+    def budget_listing(self, siteId):
+        return [
+            self.listing[budgetId]
+            for budgetId, budget in self.budgets.items()
+            if budget["SiteId"] == siteId
+        ]
+
+    @staticmethod
+    def _value(rng, valueId):
+        low = rng.uniform(0, 100)
+        return {
+            "Id": valueId,
+            "Value": round(rng.uniform(0.0001, 0.5), 6),
+            "RangeMin": round(low, 4),
+            "RangeMax": round(low + rng.uniform(1, 1000), 4),
+            "Unit": rng.choice(_UNITS),
+            "IsPercent": rng.random() < 0.2,
+        }
+
+
+class FakeQualer:
+    """Threaded HTTP server answering like Qualer, for tests and benchmarks."""
+
+    def __init__(
+        self,
+        catalog=None,
+        port=0,
+        latency=0.0,
+        jitter=0.5,
+        error_rate=0.0,
+        drop_rate=0.0,
+        throttle_rate=0.0,
+        seed=0,
+    ):
+        self.catalog = catalog or FakeCatalog(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.throttle_rate = throttle_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _fault(self):
+        """Sleep for the configured latency, then pick None, "error", "drop" or "throttle"."""
+        with self._lock:
+            self.requests += 1
+            roll = self._rng.random()
+            delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+        if roll < self.drop_rate:
+            fault = "drop"
+        elif roll < self.drop_rate + self.error_rate:
+            fault = "error"
+        elif roll < self.drop_rate + self.error_rate + self.throttle_rate:
+            fault = "throttle"
+        else:
+            return None
+        with self._lock:
+            self.errors += 1
+        return fault
+
+    def route(self, path, query, form):
+        """JSON payload for an API path, or None if the path is unknown."""
+        catalog = self.catalog
+        params = {**query, **form}
+
+        def number(name):
+            return int(params[name][0])
+
+        if path == "/ServiceType/ServiceCapabilities":
+            return {"Success": True, "views": catalog.service_capabilities}
+        if path == "/ServiceGroupTechnique/TechniquesList":
+            return catalog.techniques
+        if path == "/ServiceGroupTechnique/UncertaintyBudgets":
+            budgets = catalog.uncertainty_budgets(number("serviceGroupId"), number("techniqueId"))
+            return {"Data": budgets, "Total": len(budgets)}
+        if path == "/UncertaintyComponent/List":
+            components = catalog.uncertainty_components(number("UncertaintyBudgetId"))
+            return {"uncertaintyComponents": components}
+        if path == "/CertificationCapability/Capabilities_Read":
+            if "techniqueId" in params:
+                return _grid(catalog.capabilities(number("techniqueId")), params)
+            return _grid(catalog.site_capabilities(number("siteId")), params)
+        if path == "/Uncertainty/UncertaintyBudget_Read":
+            return {"Success": True, **_grid(catalog.budget_listing(number("siteId")), params)}
+        return None
+
+
+def _grid(rows, params):
+    """A grid reply: one page of ``rows`` when ``page`` and ``pageSize`` are given.
+
+    ``sort`` orders the rows first, as a Kendo sort string (``Name-asc~Id-desc``).
+    """
+    sort = params.get("sort", [""])[0]
+    for field, _, direction in reversed([part.rpartition("-") for part in sort.split("~") if part]):
+        rows = sorted(
+            rows,
+            key=lambda row: (row.get(field) is None, row.get(field)),
+            reverse=direction == "desc",
+        )
+    if "pageSize" in params:
+        size = int(params["pageSize"][0])
+        start = (int(params["page"][0]) - 1) * size
+        return {"Data": rows[start:start + size], "Total": len(rows)}
+    return {"Data": rows, "Total": len(rows)}
+
+
+_LOGIN_PAGE = b"""<html><body><form method="post">
+<input id="Email" name="Email"><input id="Password" name="Password" type="password">
+</form></body></html>"""
+_TOKEN_PAGE = b"""<html><body><form>
+<input name="__RequestVerificationToken" type="hidden" value="fake-token">
+</form></body></html>"""
+
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self._serve({})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8") if length else ""
+            self._serve(parse_qs(body, keep_blank_values=True))
+
+        def _serve(self, form):
+            url = urlsplit(self.path)
+            if url.path.lower().startswith("/login"):
+                return self._send(200, _LOGIN_PAGE, "text/html")
+            if _AUTH not in (self.headers.get("Cookie") or ""):
+                self.send_response(302)
+                self.send_header("Location", f"/login?ReturnUrl={url.path}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            fault = fake._fault()
+            if fault == "drop":
+                self.close_connection = True
+                return
+            if fault == "error":
+                return self._send(503, b"Service Unavailable", "text/plain")
+            if fault == "throttle":
+                return self._send(429, b"Too Many Requests", "text/plain", {"Retry-After": "1"})
+            if url.path == "/Uncertainty/UncertaintyBudgets":
+                return self._send(200, _TOKEN_PAGE, "text/html")
+            payload = fake.route(url.path, parse_qs(url.query), form)
+            if payload is None:
+                return self._send(404, b"Not Found", "text/plain")
+            self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+        def _send(self, status, body, content_type, headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output readable
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fake Qualer endpoints locally.")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503 replies")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of dropped connections")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of 429 replies")
+    args = parser.parse_args(argv)
+
+    fake = FakeQualer(
+        FakeCatalog(scale=args.scale),
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        throttle_rate=args.throttle_rate,
+    )
+    print(f"Serving fake Qualer on {fake.url} (auth cookie {_AUTH})")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
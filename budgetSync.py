@@ -0,0 +1,82 @@
+"""Decide which uncertainty budgets need their components downloaded again.
+
+The bulk ``UncertaintyBudget_Read`` listing (the shape saved in
+``json/budgets.json``) carries enough metadata to tell whether a budget has
+changed since its components were last fetched. The metadata seen at the last
+sync is kept in a small JSON state file; comparing it with a fresh listing
+gives the budgets that are new, changed, expiring soon or gone.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+DEFAULT_STATE_PATH = os.path.join("cache", "budget_sync.json")
+DEFAULT_EXPIRING_DAYS = 30
+
+# Listing fields compared against the stored state. ComponentsCount is only
+# compared when the listing includes it.
+SYNC_FIELDS = ("ComponentsCount", "ActivationDate", "ExpirationDate")
+
+
+def load_state(path=DEFAULT_STATE_PATH):
+    """Metadata per budget ID as of the last sync, or {} before the first one."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {int(budgetId): meta for budgetId, meta in json.load(f).items()}
+
+
+def save_state(state, path=DEFAULT_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({str(budgetId): meta for budgetId, meta in state.items()}, f)
+    os.replace(tmp_path, path)
+
+
+def budget_metadata(budget):
+    """The subset of a listing row that is compared between syncs."""
+    return {field: budget[field] for field in SYNC_FIELDS if field in budget}
+
+
+def synced_metadata(budget, now=None):
+    """State entry for a budget whose components have just been fetched."""
+    return {**budget_metadata(budget), "synced": (now or datetime.now()).isoformat()}
+
+
+def plan_sync(listing, state, expiring_days=DEFAULT_EXPIRING_DAYS, now=None):
+    """Compare a budget listing with the stored state.
+
+    Returns ``(to_fetch, removed)`` where ``to_fetch`` maps each budget ID that
+    needs fetching to the reason ("new", "changed" or "expiring") and
+    ``removed`` is the set of stored budget IDs missing from the listing.
+    """
+    horizon = (now or datetime.now()) + timedelta(days=expiring_days)
+    to_fetch = {}
+    for budget in listing:
+        budgetId = budget["UncertaintyBudgetId"]
+        stored = state.get(budgetId)
+        if stored is None:
+            to_fetch[budgetId] = "new"
+        elif any(stored.get(k) != v for k, v in budget_metadata(budget).items()):
+            to_fetch[budgetId] = "changed"
+        elif _entered_expiry_window(budget, stored, horizon, expiring_days):
+            to_fetch[budgetId] = "expiring"
+    removed = set(state) - {budget["UncertaintyBudgetId"] for budget in listing}
+    return to_fetch, removed
+
+
+def _entered_expiry_window(budget, stored, horizon, expiring_days):
+    """Expiring budgets are fetched once after they come within the window."""
+    expiration = _parse_date(budget.get("ExpirationDate"))
+    if expiration > horizon:
+        return False
+    synced = _parse_date(stored.get("synced"), default=datetime.min)
+    return synced < expiration - timedelta(days=expiring_days)
+
+
+def _parse_date(value, default=datetime.max):
+    if not value:
+        return default
+    return datetime.fromisoformat(value)
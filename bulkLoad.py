@@ -0,0 +1,511 @@
+"""Bulk loading into PostgreSQL with ``COPY FROM STDIN``.
+
+Rows are encoded as CSV and streamed to the server in chunks, so a whole
+table goes over in one statement instead of one ``INSERT`` round trip per
+500-row slice. Column types come from ``schema.TABLE_COLUMNS`` and fall back
+to the Python/pandas type of the data for columns not listed there.
+
+Tables with a natural key in ``schema.TABLE_KEYS`` are loaded idempotently:
+rows are COPYed into a temporary staging table and merged with
+``INSERT ... ON CONFLICT DO UPDATE``, which only rewrites rows whose content
+changed.
+
+Upserted and replaced rows carry a ``RowHash`` (see ``rowHash``). Before a
+load is merged, its hashes are compared with the rows already stored, and
+every row added, changed or removed is recorded in ``<table>_history`` in
+the same transaction, so consumers can read what a load changed (see
+``changeLog``) instead of rereading the table.
+"""
+
+import itertools
+import json
+import numbers
+from contextlib import contextmanager
+import metrics
+from records import Batch, Record
+from rowHash import HASH_COLUMN, hash_rows
+from schema import TABLE_COLUMNS, TABLE_KEYS
+
+CHUNK_ROWS = 5000
+
+_PANDAS_TYPES = {
+    "b": "BOOLEAN",
+    "i": "BIGINT",
+    "u": "BIGINT",
+    "f": "DOUBLE PRECISION",
+}
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def python_type(value):
+    """PostgreSQL type for a decoded JSON (or numpy) value."""
+    # numpy booleans are not numbers.Integral; their dtype gives them away
+    if isinstance(value, bool) or getattr(getattr(value, "dtype", None), "kind", "") == "b":
+        return "BOOLEAN"
+    if isinstance(value, numbers.Integral):
+        return "BIGINT"
+    if isinstance(value, numbers.Real):
+        return "DOUBLE PRECISION"
+    return "TEXT"
+
+
+def record_columns(table, records):
+    """Ordered {column: type} for dicts or ``records.Record``s, in first-seen key order."""
+    declared = TABLE_COLUMNS.get(table, {})
+    columns = {}
+    for record in records:
+        for name, value in record.items():
+            if name in columns and (columns[name] or value is None):
+                continue
+            columns[name] = declared.get(name) or (
+                python_type(value) if value is not None else None
+            )
+    return {name: type_ or "TEXT" for name, type_ in columns.items()}
+
+
+def batch_columns(table, batch):
+    """Ordered {column: type} for a ``records.Batch``."""
+    declared = TABLE_COLUMNS.get(table, {})
+    columns = {}
+    for i, name in enumerate(batch.names):
+        type_ = declared.get(name)
+        if type_ is None:
+            value = next(
+                (row[i] for row in batch.rows if len(row) > i and row[i] is not None), None
+            )
+            type_ = "TEXT" if value is None else python_type(value)
+        columns[name] = type_
+    return columns
+
+
+def record_rows(columns, records):
+    """Rows of values in ``columns`` order for dicts or ``records.Record``s."""
+    names = tuple(columns)
+    for record in records:
+        if isinstance(record, Record):
+            yield record.values(names)
+        else:
+            yield [record.get(name) for name in names]
+
+
+def peek_columns(table, records, sample_rows=CHUNK_ROWS):
+    """Columns for ``records``, and the records, reading no more than ``sample_rows`` ahead.
+
+    A list is typed from all of its records. An iterator, such as rows being
+    decoded from a reply, is typed from its first ``sample_rows`` so it can be
+    COPYed while it is read; a key that first shows up after them is not loaded.
+    Qualer serializes every row of a listing with the same keys.
+    """
+    if isinstance(records, list):
+        return record_columns(table, records), records
+    records = iter(records)
+    head = list(itertools.islice(records, sample_rows))
+    return record_columns(table, head), itertools.chain(head, records)
+
+
+def dataframe_columns(table, df):
+    """Ordered {column: type} for a DataFrame."""
+    declared = TABLE_COLUMNS.get(table, {})
+    return {
+        name: declared.get(name) or _PANDAS_TYPES.get(dtype.kind, "TEXT")
+        for name, dtype in df.dtypes.items()
+    }
+
+
+def create_table_sql(table, columns):
+    definitions = ", ".join(
+        f"{quote_ident(name)} {type_}" for name, type_ in columns.items()
+    )
+    return f"CREATE TABLE IF NOT EXISTS {quote_ident(table)} ({definitions})"
+
+
+def copy_sql(table, columns):
+    names = ", ".join(quote_ident(name) for name in columns)
+    return f"COPY {quote_ident(table)} ({names}) FROM STDIN WITH (FORMAT csv)"
+
+
+def encode_field(value):
+    """CSV field for COPY: unquoted empty is NULL, strings are always quoted."""
+    if value is None:
+        return ""
+    kind = type(value)
+    if kind is str:
+        return '"' + value.replace('"', '""') + '"'
+    if kind is int or kind is bool:
+        return str(value)
+    if kind is float:
+        return "" if value != value else repr(value)
+    if kind is dict or kind is list:
+        return encode_field(json.dumps(value))
+    # Anything else normally comes from pandas or numpy; pandas is only
+    # imported once such a value shows up
+    import pandas as pd
+
+    if pd.isna(value):
+        return ""
+    return encode_field(value.item() if hasattr(value, "item") else str(value))
+
+
+def encode_rows(rows, chunk_rows=CHUNK_ROWS):
+    """Yield CSV text in chunks of ``chunk_rows`` rows."""
+    lines = []
+    for row in rows:
+        lines.append(",".join(map(encode_field, row)))
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+class _ChunkReader:
+    """File-like adapter for psycopg2's ``copy_expert``."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _copy(cursor, sql, chunks):
+    if hasattr(cursor, "copy"):  # psycopg 3
+        with cursor.copy(sql) as copy:
+            for chunk in chunks:
+                copy.write(chunk)
+    else:  # psycopg2
+        cursor.copy_expert(sql, _ChunkReader(chunks))
+
+
+def _counted(table, rows):
+    return metrics.counted(rows, "db_rows_total", table=table)
+
+
+@contextmanager
+def _transaction(engine):
+    connection = engine.raw_connection()
+    try:
+        yield connection.cursor()
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def copy_rows(engine, table, columns, rows, replace=False):
+    """COPY ``rows`` (sequences in ``columns`` order) into ``table``.
+
+    The table is created with the given column types if it does not exist;
+    ``replace=True`` drops it first, like ``DataFrame.to_sql(if_exists="replace")``.
+    Everything runs in one transaction.
+    """
+    with metrics.timer("db_load_seconds", table=table), _transaction(engine) as cursor:
+        if replace:
+            cursor.execute(f"DROP TABLE IF EXISTS {quote_ident(table)}")
+        cursor.execute(create_table_sql(table, columns))
+        _copy(cursor, copy_sql(table, columns), encode_rows(_counted(table, rows)))
+
+
+def upsert_sql(table, columns, key, stage):
+    """Merge ``stage`` into ``table``, skipping rows that did not change."""
+    names = ", ".join(quote_ident(name) for name in columns)
+    keys = ", ".join(quote_ident(name) for name in key)
+    # A batch may hold the same key twice; the row staged last wins
+    sql = (
+        f"INSERT INTO {quote_ident(table)} AS t ({names}) "
+        f"SELECT DISTINCT ON ({keys}) {names} FROM {quote_ident(stage)} "
+        f"ORDER BY {keys}, ctid DESC "
+        f"ON CONFLICT ({keys}) "
+    )
+    values = [name for name in columns if name not in key]
+    if not values:
+        return sql + "DO NOTHING"
+    assignments = ", ".join(f"{quote_ident(v)} = EXCLUDED.{quote_ident(v)}" for v in values)
+    if HASH_COLUMN in values:
+        # The hash covers every other column
+        hashes = quote_ident(HASH_COLUMN)
+        changed = f"t.{hashes} IS DISTINCT FROM EXCLUDED.{hashes}"
+    else:
+        current = ", ".join(f"t.{quote_ident(v)}" for v in values)
+        incoming = ", ".join(f"EXCLUDED.{quote_ident(v)}" for v in values)
+        changed = f"ROW({current}) IS DISTINCT FROM ROW({incoming})"
+    return sql + f"DO UPDATE SET {assignments} WHERE {changed}"
+
+
+def history_table(table):
+    return f"{table}_history"
+
+
+def create_history_sql(table, key_columns):
+    """History of ``table``: one row per row added, changed or removed by a load.
+
+    ``key_columns`` ({name: type}) identify the row; ``Row`` holds its content
+    as loaded (as it was, for removed rows).
+    """
+    keys = "".join(f"{quote_ident(name)} {type_}, " for name, type_ in key_columns.items())
+    return (
+        f"CREATE TABLE IF NOT EXISTS {quote_ident(history_table(table))} ("
+        f'"ChangeId" BIGSERIAL PRIMARY KEY, {keys}"Change" TEXT NOT NULL, '
+        f'"RowHash" TEXT, "PreviousHash" TEXT, "Row" JSONB, '
+        f'"ChangedAt" TIMESTAMPTZ NOT NULL DEFAULT now())'
+    )
+
+
+def _history_insert(table, key):
+    names = "".join(f"{quote_ident(name)}, " for name in key)
+    return (
+        f"INSERT INTO {quote_ident(history_table(table))} "
+        f'({names}"Change", "RowHash", "PreviousHash", "Row") '
+    )
+
+
+def changed_rows_sql(table, key, stage):
+    """Record the staged rows that are new to ``table`` or whose hash differs."""
+    keys = ", ".join(quote_ident(name) for name in key)
+    staged_keys = ", ".join(f"s.{quote_ident(name)}" for name in key)
+    match = " AND ".join(f"t.{quote_ident(name)} = s.{quote_ident(name)}" for name in key)
+    hashes = quote_ident(HASH_COLUMN)
+    return (
+        _history_insert(table, key)
+        + f"SELECT {staged_keys}, CASE WHEN t.ctid IS NULL THEN 'added' ELSE 'changed' END, "
+        f"s.{hashes}, t.{hashes}, to_jsonb(s) - '{HASH_COLUMN}' "
+        f"FROM (SELECT DISTINCT ON ({keys}) * FROM {quote_ident(stage)} "
+        f"ORDER BY {keys}, ctid DESC) s "
+        f"LEFT JOIN {quote_ident(table)} t ON {match} "
+        f"WHERE t.ctid IS NULL OR t.{hashes} IS DISTINCT FROM s.{hashes}"
+    )
+
+
+def removed_rows_sql(table, key, stage):
+    """Delete the rows of ``table`` whose ``key`` is not staged, and record them."""
+    match = " AND ".join(f"s.{quote_ident(name)} = t.{quote_ident(name)}" for name in key)
+    where = f"NOT EXISTS (SELECT 1 FROM {quote_ident(stage)} s WHERE {match})"
+    keys = "".join(f"{quote_ident(name)}, " for name in key)
+    return (
+        f"WITH gone AS (DELETE FROM {quote_ident(table)} t WHERE {where} RETURNING t.*) "
+        + _history_insert(table, key)
+        + f"SELECT {keys}'removed', NULL, {quote_ident(HASH_COLUMN)}, "
+        f"to_jsonb(gone) - '{HASH_COLUMN}' FROM gone"
+    )
+
+
+def surplus_rows_sql(table, key, stage, scope):
+    """Delete the copies of a hash under ``scope = %s`` beyond those staged, and record them.
+
+    Rows without a key are counted per hash: a hash stored three times and
+    staged once loses two of its rows.
+    """
+    hashes = quote_ident(HASH_COLUMN)
+    keys = "".join(f"{quote_ident(name)}, " for name in key)
+    return (
+        f"WITH stored AS (SELECT ctid AS row_id, {hashes}, "
+        f"row_number() OVER (PARTITION BY {hashes} ORDER BY ctid) AS copy "
+        f"FROM {quote_ident(table)} WHERE {quote_ident(scope)} = %s), "
+        f"staged AS (SELECT {hashes}, count(*) AS copies FROM {quote_ident(stage)} "
+        f"GROUP BY {hashes}), "
+        f"gone AS (DELETE FROM {quote_ident(table)} t USING stored d "
+        f"LEFT JOIN staged c ON c.{hashes} = d.{hashes} "
+        f"WHERE t.ctid = d.row_id AND d.copy > COALESCE(c.copies, 0) RETURNING t.*) "
+        + _history_insert(table, key)
+        + f"SELECT {keys}'removed', NULL, {hashes}, "
+        f"to_jsonb(gone) - '{HASH_COLUMN}' FROM gone"
+    )
+
+
+def added_rows_sql(table, columns, stage, scope):
+    """Insert the staged copies of a hash beyond those under ``scope = %s``, and record them."""
+    names = ", ".join(quote_ident(name) for name in columns)
+    staged_names = ", ".join(f"s.{quote_ident(name)}" for name in columns)
+    hashes = quote_ident(HASH_COLUMN)
+    return (
+        f"WITH staged AS (SELECT *, "
+        f"row_number() OVER (PARTITION BY {hashes} ORDER BY ctid) AS _copy "
+        f"FROM {quote_ident(stage)}), "
+        f"stored AS (SELECT {hashes}, count(*) AS copies FROM {quote_ident(table)} "
+        f"WHERE {quote_ident(scope)} = %s GROUP BY {hashes}), "
+        f"added AS (INSERT INTO {quote_ident(table)} ({names}) "
+        f"SELECT {staged_names} FROM staged s LEFT JOIN stored c ON c.{hashes} = s.{hashes} "
+        f"WHERE s._copy > COALESCE(c.copies, 0) RETURNING *) "
+        + _history_insert(table, (scope,))
+        + f"SELECT {quote_ident(scope)}, 'added', {hashes}, NULL, "
+        f"to_jsonb(added) - '{HASH_COLUMN}' FROM added"
+    )
+
+
+def _ensure_unique_key(cursor, table, key):
+    """ON CONFLICT needs a unique index on the key; older tables lack one."""
+    cursor.execute(
+        "SELECT array_agg(a.attname::text ORDER BY a.attname) "
+        "FROM pg_index i JOIN pg_attribute a "
+        "ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+        "WHERE i.indrelid = to_regclass(%s) AND i.indisunique "
+        "GROUP BY i.indexrelid",
+        (quote_ident(table),),
+    )
+    if sorted(key) not in [row[0] for row in cursor.fetchall()]:
+        keys = ", ".join(quote_ident(name) for name in key)
+        index = quote_ident(f"{table}_natural_key")
+        cursor.execute(f"CREATE UNIQUE INDEX {index} ON {quote_ident(table)} ({keys})")
+
+
+def _ensure_history(cursor, table, key_columns):
+    """Add ``RowHash`` to tables loaded before rows were hashed, and create the history.
+
+    Rows stored without a hash count as changed (or, without a key, as
+    removed and added again) the first time they are loaded after this.
+    """
+    # Checked first: ALTER TABLE locks the table even when the column exists
+    cursor.execute(
+        "SELECT (SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(%s) "
+        "AND attname = %s AND NOT attisdropped), to_regclass(%s)",
+        (quote_ident(table), HASH_COLUMN, quote_ident(history_table(table))),
+    )
+    if None not in cursor.fetchone():
+        return
+    # Concurrent loads (the getCMCs workers) would race to create them
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (history_table(table),))
+    cursor.execute(
+        f"ALTER TABLE {quote_ident(table)} "
+        f"ADD COLUMN IF NOT EXISTS {quote_ident(HASH_COLUMN)} TEXT"
+    )
+    cursor.execute(create_history_sql(table, key_columns))
+
+
+def _prepare(cursor, table, columns, key_columns, stage, rows):
+    """Create the history of ``table`` if needed and COPY ``rows`` into ``stage``."""
+    _ensure_history(cursor, table, key_columns)
+    definitions = ", ".join(f"{quote_ident(n)} {t}" for n, t in columns.items())
+    cursor.execute(f"CREATE TEMP TABLE {quote_ident(stage)} ({definitions}) ON COMMIT DROP")
+    _copy(cursor, copy_sql(stage, columns), encode_rows(_counted(table, rows)))
+
+
+def upsert_rows(engine, table, columns, rows, key, snapshot=False):
+    """Stage ``rows`` with COPY and merge them into ``table`` on ``key``.
+
+    Rows are hashed, and the ones added or changed are recorded in the
+    table's history. ``snapshot=True`` says ``rows`` are the whole table:
+    stored rows whose key is not among them are deleted and recorded as
+    removed. Returns the number of rows inserted or changed.
+    """
+    stage = f"_stage_{table}"
+    columns, rows = hash_rows(columns, rows)
+    with metrics.timer("db_load_seconds", table=table), _transaction(engine) as cursor:
+        definitions = ", ".join(f"{quote_ident(n)} {t}" for n, t in columns.items())
+        key_definition = ", ".join(quote_ident(name) for name in key)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {quote_ident(table)} "
+            f"({definitions}, PRIMARY KEY ({key_definition}))"
+        )
+        _ensure_unique_key(cursor, table, key)
+        _prepare(cursor, table, columns, {name: columns[name] for name in key}, stage, rows)
+        cursor.execute(changed_rows_sql(table, key, stage))
+        if snapshot:
+            cursor.execute(removed_rows_sql(table, key, stage))
+        cursor.execute(upsert_sql(table, columns, key, stage))
+        return cursor.rowcount
+
+
+def _columns_and_rows(table, records):
+    if isinstance(records, Batch):
+        return batch_columns(table, records), records.padded_rows()
+    columns = record_columns(table, records)
+    return columns, record_rows(columns, records)
+
+
+def copy_records(engine, table, records, replace=False):
+    """COPY a ``records.Batch`` or a list of dicts, such as a decoded ``Data`` array."""
+    if not records:
+        return 0
+    columns, rows = _columns_and_rows(table, records)
+    copy_rows(engine, table, columns, rows, replace=replace)
+    return len(records)
+
+
+def upsert_records(engine, table, records, key=None, snapshot=False):
+    """Merge a ``records.Batch`` or a list of dicts into ``table`` on its natural key.
+
+    ``snapshot=True`` removes stored rows missing from ``records`` (see ``upsert_rows``).
+    """
+    if not records:
+        return 0
+    columns, rows = _columns_and_rows(table, records)
+    return upsert_rows(engine, table, columns, rows, key or TABLE_KEYS[table], snapshot)
+
+
+def load_records(engine, table, records):
+    """Upsert when ``table`` has a natural key, otherwise append."""
+    if table in TABLE_KEYS:
+        return upsert_records(engine, table, records)
+    return copy_records(engine, table, records)
+
+
+def replace_records(engine, table, records, column, value):
+    """Replace the rows of ``table`` where ``column = value`` in one transaction.
+
+    Used for tables without a natural key, where rerunning a unit of work
+    must not add its rows a second time. ``records`` may be an iterator; it
+    is COPYed as it is consumed (see ``peek_columns``). Returns the row count.
+
+    Without a key, rows are told apart by their hash alone and counted per
+    hash, so identical rows keep their number: stored copies beyond the
+    loaded count are deleted, loaded copies beyond the stored count are
+    inserted, and both are recorded in the history under ``column``. Rows
+    that did not change are left alone.
+    """
+    columns, records = peek_columns(table, records)
+    loaded = 0
+
+    def rows():
+        nonlocal loaded
+        for row in record_rows(columns, records):
+            loaded += 1
+            yield row
+
+    scope = {column: columns.get(column, "BIGINT")}
+    stored, hashed = hash_rows(columns or scope, rows())
+    stage = f"_stage_{table}"
+    with metrics.timer("db_load_seconds", table=table), _transaction(engine) as cursor:
+        cursor.execute(create_table_sql(table, stored))
+        _prepare(cursor, table, stored, scope, stage, hashed)
+        cursor.execute(surplus_rows_sql(table, (column,), stage, column), (value,))
+        cursor.execute(added_rows_sql(table, stored, stage, column), (value,))
+    return loaded
+
+
+def _dataframe_rows(table, df):
+    columns = dataframe_columns(table, df)
+    for name, type_ in columns.items():
+        # Integer columns with gaps come back from read_csv as float64
+        if type_ in ("BIGINT", "INTEGER") and df[name].dtype.kind == "f":
+            df = df.assign(**{name: df[name].astype("Int64")})
+    return columns, df.itertuples(index=False, name=None)
+
+
+def copy_dataframe(engine, table, df, replace=False):
+    """COPY a DataFrame, such as one read back from the crawl CSVs."""
+    columns, rows = _dataframe_rows(table, df)
+    copy_rows(engine, table, columns, rows, replace=replace)
+    return len(df)
+
+
+def upsert_dataframe(engine, table, df, key=None, snapshot=False):
+    """Merge a DataFrame into ``table`` on its natural key.
+
+    ``snapshot=True`` removes stored rows missing from ``df`` (see ``upsert_rows``).
+    """
+    columns, rows = _dataframe_rows(table, df)
+    return upsert_rows(engine, table, columns, rows, key or TABLE_KEYS[table], snapshot)
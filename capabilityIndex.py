@@ -0,0 +1,275 @@
+"""In-memory range index over the CMC capabilities, for lookups by nominal value.
+
+``getCMCs`` loads one row per capability range: a technique, a parameter,
+``[RangeMin, RangeMax]`` in ``Unit`` and the uncertainty there. A
+``CapabilityIndex`` keeps the ranges of each technique and parameter sorted
+by their lower bound, so "which capability covers 12.5 V" is a binary search
+instead of a scan of the table, and also knows which uncertainty budgets of
+a technique are active. An index is an immutable snapshot; ``IndexCache``
+hands out the current one and rebuilds it when it is older than
+``max_age`` or when a technique is invalidated, reloading only that
+technique's rows.
+
+    cache = IndexCache(engine)
+    cache.get().lookup(1000, "Parameter 1", 12.5, unit="V")
+    cache.invalidate(1000)  # e.g. after getCMCs replaced the technique
+"""
+
+import argparse
+import bisect
+import datetime
+import math
+import threading
+import time
+from qualerResources import database_url, new_engine
+from records import Capability
+from rowHash import HASH_COLUMN
+
+DEFAULT_MAX_AGE = 15 * 60
+
+# Columns of ``capabilities`` the index cannot work without; Unit,
+# Uncertainty and UncertaintyUnit are read when the table has them
+RANGE_COLUMNS = ("Parameter", "RangeMin", "RangeMax")
+
+
+def _key(parameter):
+    return " ".join(str(parameter).split()).casefold()
+
+
+def _bound(value, default):
+    return default if value is None or value != value else float(value)
+
+
+class _Ranges:
+    """The capabilities of one technique and parameter, sorted by RangeMin."""
+
+    __slots__ = ("lows", "reach", "rows")
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: _bound(row.get("RangeMin"), -math.inf))
+        self.lows = [_bound(row.get("RangeMin"), -math.inf) for row in self.rows]
+        # Highest RangeMax among rows[:i + 1], which bounds the backwards scan
+        self.reach = []
+        highest = -math.inf
+        for row in self.rows:
+            highest = max(highest, _bound(row.get("RangeMax"), math.inf))
+            self.reach.append(highest)
+
+    def matches(self, value, unit=None):
+        """Rows whose range holds ``value``, the highest RangeMin first."""
+        found = []
+        i = bisect.bisect_right(self.lows, value) - 1
+        while i >= 0 and self.reach[i] >= value:
+            row = self.rows[i]
+            if _bound(row.get("RangeMax"), math.inf) >= value and (
+                unit is None or row.get("Unit") == unit
+            ):
+                found.append(row)
+            i -= 1
+        return found
+
+
+class CapabilityIndex:
+    """Capability ranges per (technique, parameter) and budgets per technique."""
+
+    def __init__(self, ranges=None, budgets=None, built=None):
+        self._ranges = ranges or {}
+        self._budgets = budgets or {}
+        self.built = built or time.time()
+
+    @classmethod
+    def build(cls, capabilities, budgets=()):
+        """Index ``records.Capability`` rows and ``load_budgets`` tuples."""
+        groups = {}
+        for row in capabilities:
+            groups.setdefault((row.TechniqueId, _key(row.get("Parameter"))), []).append(row)
+        per_technique = {}
+        for techniqueId, *budget in budgets:
+            per_technique.setdefault(techniqueId, []).append(tuple(budget))
+        return cls({key: _Ranges(rows) for key, rows in groups.items()}, per_technique)
+
+    def replace_technique(self, techniqueId, capabilities, budgets=()):
+        """A new index with the rows of ``techniqueId`` replaced; this one is unchanged.
+
+        The new index keeps this one's build time, so it ages out as usual.
+        """
+        fresh = CapabilityIndex.build(capabilities, ((techniqueId, *b) for b in budgets))
+        ranges = {k: v for k, v in self._ranges.items() if k[0] != techniqueId}
+        ranges.update(fresh._ranges)
+        per_technique = dict(self._budgets)
+        per_technique.pop(techniqueId, None)
+        per_technique.update(fresh._budgets)
+        return CapabilityIndex(ranges, per_technique, self.built)
+
+    def __len__(self):
+        return sum(len(ranges.rows) for ranges in self._ranges.values())
+
+    def matches(self, techniqueId, parameter, value, unit=None):
+        """Every capability of the technique and parameter whose range holds ``value``."""
+        ranges = self._ranges.get((techniqueId, _key(parameter)))
+        return ranges.matches(float(value), unit) if ranges else []
+
+    def lookup(self, techniqueId, parameter, value, unit=None):
+        """The capability that applies to ``value``, or None.
+
+        Ranges are closed; where two share a bound the upper one applies.
+        ``unit`` restricts the match to ranges in that unit. Parameters match
+        regardless of case and spacing.
+        """
+        found = self.matches(techniqueId, parameter, value, unit)
+        return found[0] if found else None
+
+    def parameters(self, techniqueId):
+        """The parameters of a technique, as indexed (case-folded)."""
+        return sorted(key[1] for key in self._ranges if key[0] == techniqueId)
+
+    def budgets(self, techniqueId, on=None):
+        """IDs of the technique's budgets active on ``on`` (default: today)."""
+        day = (on or datetime.date.today()).isoformat()
+        return sorted(
+            budgetId
+            for budgetId, activation, expiration in self._budgets.get(techniqueId, ())
+            # ISO 8601 dates compare as text
+            if (not activation or str(activation)[:10] <= day)
+            and (not expiration or day < str(expiration)[:10])
+        )
+
+
+def load_capabilities(engine, techniqueId=None):
+    """``records.Capability`` rows from the ``capabilities`` table.
+
+    The table has whatever columns Qualer's replies had; a ValueError names
+    the ``RANGE_COLUMNS`` it lacks.
+    """
+    sql = "SELECT * FROM capabilities"
+    params = ()
+    if techniqueId is not None:
+        sql += ' WHERE "TechniqueId" = %s'
+        params = (techniqueId,)
+    names, rows = _query(engine, sql, params, ("capabilities",), names=True)
+    missing = [name for name in RANGE_COLUMNS if rows and name not in names]
+    if missing:
+        raise ValueError(f"capabilities has no {', '.join(missing)} column")
+    return [
+        Capability.from_json({k: v for k, v in zip(names, row) if k != HASH_COLUMN})
+        for row in rows
+    ]
+
+
+def load_budgets(engine, techniqueId=None):
+    """(TechniqueId, UncertaintyBudgetId, ActivationDate, ExpirationDate) per budget."""
+    sql = (
+        'SELECT t."TechniqueId", b."UncertaintyBudgetId", b."ActivationDate", '
+        'b."ExpirationDate" FROM uncertainty_budget_techniques t '
+        'JOIN uncertainty_budgets b ON b."UncertaintyBudgetId" = t."UncertaintyBudgetId"'
+    )
+    params = ()
+    if techniqueId is not None:
+        sql += ' WHERE t."TechniqueId" = %s'
+        params = (techniqueId,)
+    return _query(engine, sql, params, ("uncertainty_budget_techniques", "uncertainty_budgets"))
+
+
+def _query(engine, sql, params, tables, names=False):
+    """Rows of ``sql``; none while one of ``tables`` has not been created yet.
+
+    ``names=True`` returns ``(column names, rows)``.
+    """
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for table in tables:
+            cursor.execute("SELECT to_regclass(%s)", (f'"{table}"',))
+            if cursor.fetchone()[0] is None:
+                return ([], []) if names else []
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        if names:
+            return [column[0] for column in cursor.description], rows
+        return rows
+    finally:
+        connection.close()
+
+
+class IndexCache:
+    """Shares one ``CapabilityIndex`` snapshot between threads and keeps it fresh.
+
+    ``get`` rebuilds the snapshot from the database once it is ``max_age``
+    seconds old, and reloads the techniques passed to ``invalidate`` first.
+    Readers keep whatever snapshot they were given; it never changes.
+    """
+
+    def __init__(self, engine, max_age=DEFAULT_MAX_AGE):
+        self.engine = engine
+        self.max_age = max_age
+        self._index = None
+        self._stale = set()
+        self._lock = threading.Lock()
+
+    def get(self):
+        index = self._index
+        if index is not None and not self._stale and time.time() - index.built < self.max_age:
+            return index
+        with self._lock:
+            if self._index is None or time.time() - self._index.built >= self.max_age:
+                self._index = CapabilityIndex.build(
+                    load_capabilities(self.engine), load_budgets(self.engine)
+                )
+                self._stale.clear()
+            while self._stale:
+                techniqueId = self._stale.pop()
+                self._index = self._index.replace_technique(
+                    techniqueId,
+                    load_capabilities(self.engine, techniqueId),
+                    [row[1:] for row in load_budgets(self.engine, techniqueId)],
+                )
+            return self._index
+
+    def invalidate(self, techniqueId=None):
+        """Reload ``techniqueId`` on the next ``get``, or everything if None."""
+        with self._lock:
+            if techniqueId is None:
+                self._index = None
+                self._stale.clear()
+            else:
+                self._stale.add(techniqueId)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Look up the capability (CMC) that applies to a nominal value."
+    )
+    parser.add_argument("technique", type=int, help="TechniqueId")
+    parser.add_argument("parameter", help="Parameter name")
+    parser.add_argument("value", type=float, help="Nominal value")
+    parser.add_argument("--unit", help="Only match ranges in this unit")
+    parser.add_argument(
+        "--database-url",
+        default=database_url(),
+        help="Database to read (default: QUALER_DATABASE_URL or the Qualer mirror)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = IndexCache(new_engine(args.database_url)).get()
+    found = index.matches(args.technique, args.parameter, args.value, args.unit)
+    if not found:
+        print("No capability covers this value.")
+    for capability in found:
+        get = capability.get
+        print(
+            f"{get('Parameter')}: {get('RangeMin')} to {get('RangeMax')} {get('Unit')}, "
+            f"uncertainty {get('Uncertainty')} {get('UncertaintyUnit')}"
+        )
+    print(f"Active budgets: {index.budgets(args.technique) or 'none'}")
+
+
+def run(argv=None):
+    """Command-line entry point."""
+    main(argv)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,96 @@
+"""Read what the loads changed, from the ``<table>_history`` tables.
+
+``bulkLoad`` records every row a load adds, changes or removes, with a
+``ChangeId`` that only grows. A consumer keeps the last ChangeId it has
+processed and asks for the changes after it, instead of rereading the table:
+
+    changes = read_changes(engine, "uncertainty_budgets", after=last)
+    last = changes[-1]["ChangeId"] if changes else last
+
+Loads that run at the same time (the getCMCs workers) may commit their
+ChangeIds out of order, so a consumer following them live should read again
+from a little before its last ChangeId and skip what it has seen.
+"""
+
+import argparse
+import json
+from bulkLoad import history_table, quote_ident
+from qualerResources import database_url, new_engine
+
+CHANGES = ("added", "changed", "removed")
+
+
+def read_changes(engine, table, after=0, limit=None):
+    """Changes to ``table`` with a ChangeId above ``after``, oldest first, as dicts."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT to_regclass(%s)", (quote_ident(history_table(table)),))
+        if cursor.fetchone()[0] is None:
+            return []
+        sql = (
+            f"SELECT * FROM {quote_ident(history_table(table))} "
+            'WHERE "ChangeId" > %s ORDER BY "ChangeId"'
+        )
+        params = (after,)
+        if limit is not None:
+            sql += " LIMIT %s"
+            params += (limit,)
+        cursor.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def summarize(changes):
+    """{"added": n, "changed": n, "removed": n} for a list of changes."""
+    counts = dict.fromkeys(CHANGES, 0)
+    for change in changes:
+        counts[change["Change"]] += 1
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Print the rows a table's loads added, changed or removed."
+    )
+    parser.add_argument("table", help="Table whose history to read, e.g. uncertainty_budgets")
+    parser.add_argument(
+        "--after",
+        type=int,
+        default=0,
+        help="Only changes with a higher ChangeId (default: all)",
+    )
+    parser.add_argument("--limit", type=int, help="Print at most this many changes")
+    parser.add_argument(
+        "--summary",
+        action="store_true",
+        help="Print how many rows were added, changed and removed instead",
+    )
+    parser.add_argument(
+        "--database-url",
+        default=database_url(),
+        help="Database to read (default: QUALER_DATABASE_URL or the Qualer mirror)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    changes = read_changes(new_engine(args.database_url), args.table, args.after, args.limit)
+    if args.summary:
+        print(json.dumps(summarize(changes)))
+        return
+    for change in changes:
+        # One JSON object per line, for piping into other tools
+        print(json.dumps(change, default=str))
+
+
+def run(argv=None):
+    """Command-line entry point."""
+    main(argv)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,72 @@
+"""Checkpoint manifests so an interrupted crawl can resume where it stopped.
+
+Each completed unit of work (a ServiceGroup/Technique pair, a technique or a
+budget ID) is appended to a JSON-lines manifest and fsynced once its rows have
+been written. A rerun skips every unit in the manifest, so nothing finished is
+fetched or inserted twice. The manifest is removed once the crawl completes.
+"""
+
+import json
+import os
+import threading
+
+DEFAULT_DIR = os.path.join("cache", "checkpoints")
+
+
+class Checkpoint:
+    """Durable set of completed work units for one crawl."""
+
+    def __init__(self, name, directory=DEFAULT_DIR, restart=False):
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self.completed = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if restart and os.path.exists(self.path):
+            os.remove(self.path)
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self.completed.add(_key(json.loads(line)))
+                except json.JSONDecodeError:
+                    continue  # Partially written line from the interrupted run
+
+    @property
+    def resuming(self):
+        """True when a previous run of this crawl left completed work behind."""
+        return bool(self.completed)
+
+    def done(self, *key):
+        return _key(key) in self.completed
+
+    def mark(self, *key):
+        """Record ``key`` as committed. Call only after its rows are written."""
+        with self._lock:
+            self.completed.add(_key(key))
+            self._file.write(json.dumps(list(key)) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def complete(self):
+        """The crawl finished; the next run starts from scratch."""
+        self.close()
+        os.remove(self.path)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _key(parts):
+    return tuple(parts)
@@ -0,0 +1,352 @@
+"""Typed columnar export of the crawled tables, and a loader for it.
+
+Every table is streamed out of PostgreSQL with ``COPY ... TO STDOUT`` and
+written as a dataset of zstd-compressed Parquet files (or uncompressed Arrow
+IPC files, which map straight into memory), one directory per entity:
+
+    export/uncertainty_values/SiteId=96552/part-0.parquet
+
+Large entities are partitioned by site or technique, so a report that needs
+one site reads only that site's files. Columns keep their PostgreSQL types;
+the dates that the database keeps as TEXT (``schema.DATE_COLUMNS``) become
+timestamps (see ``parse_dates``). ``load`` reads an entity back through
+memory-mapped files without touching the database. Needs ``pyarrow``.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import metrics
+from bulkLoad import quote_ident
+from qualerResources import database_url, new_engine
+from recordSink import require_pyarrow
+from schema import DATE_COLUMNS
+
+FORMATS = ("parquet", "arrow")
+MANIFEST = "_export.json"
+
+_BUDGET_SITE = 'LEFT JOIN uncertainty_budgets b ON b."UncertaintyBudgetId" = '
+
+# Entity -> (query, partition column). Components and values are joined to
+# their budget to be partitioned by its site.
+ENTITIES = {
+    "uncertainty_budgets": ("SELECT * FROM uncertainty_budgets", "SiteId"),
+    "uncertainty_budget_service_groups": (
+        "SELECT * FROM uncertainty_budget_service_groups",
+        None,
+    ),
+    "uncertainty_budget_techniques": ("SELECT * FROM uncertainty_budget_techniques", None),
+    "service_capabilities": ("SELECT * FROM service_capabilities", None),
+    "techniques": ("SELECT * FROM techniques", None),
+    "capabilities": ("SELECT * FROM capabilities", "TechniqueId"),
+    "uncertainty_components": (
+        'SELECT c.*, b."SiteId" FROM uncertainty_components c '
+        + _BUDGET_SITE
+        + 'c."UncertaintyBudgetId"',
+        "SiteId",
+    ),
+    "uncertainty_values": (
+        'SELECT v.*, b."SiteId" FROM uncertainty_values v '
+        'LEFT JOIN uncertainty_components c ON c."Id" = v."UncertaintyComponentId" '
+        + _BUDGET_SITE
+        + 'c."UncertaintyBudgetId"',
+        "SiteId",
+    ),
+}
+
+# PostgreSQL type OIDs -> pyarrow type names
+_ARROW_TYPES = {
+    16: "bool_",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1700: "float64",  # numeric
+    1082: "date32",
+}
+
+# The zone of a Qualer date, after its time, and fraction digits past microseconds
+_DATE_ZONE = r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)\s*(?:Z|[+-]\d{2}(?::?\d{2})?)$"
+_DATE_FRACTION = r"(\.\d{6})\d+"
+
+
+def arrow_schema(description):
+    """Arrow schema for a query's ``cursor.description``."""
+    pa = require_pyarrow()
+    fields = []
+    for column in description:
+        name, oid = column[0], column[1]
+        if name in DATE_COLUMNS and oid in (25, 1043, 1114):
+            # Read as text and converted by parse_dates
+            type_ = pa.timestamp("us")
+        elif oid in (1114, 1184):
+            type_ = pa.timestamp("us", tz="UTC" if oid == 1184 else None)
+        else:
+            type_ = getattr(pa, _ARROW_TYPES.get(oid, "string"))()
+        fields.append(pa.field(name, type_))
+    return pa.schema(fields)
+
+
+def parse_dates(column):
+    """Naive microsecond timestamps for a column of Qualer's date strings.
+
+    .NET writes up to seven fraction digits (2023-04-11T13:45:12.3471234) and
+    sometimes a zone (``Z``, ``-05:00``), which Arrow's own parsing rejects.
+    The zone is dropped, keeping the time as written like the dates without
+    one, and the fraction is cut to microseconds. Empty strings become null.
+    """
+    pa = require_pyarrow()
+    import pyarrow.compute as pc
+
+    text = pc.replace_substring_regex(column, _DATE_ZONE, r"\1")
+    text = pc.replace_substring_regex(text, _DATE_FRACTION, r"\1")
+    text = pc.if_else(pc.equal(text, ""), pa.scalar(None, pa.string()), text)
+    return pc.cast(text, pa.timestamp("us"))
+
+
+def export_entity(engine, entity, directory, fmt="parquet"):
+    """Write one entity under ``directory/entity``.
+
+    Returns its row count and the type of the partition column, which the
+    directory names alone do not keep.
+    """
+    require_pyarrow()
+    query, partition = ENTITIES[entity]
+    with metrics.timer("export_seconds", entity=entity), tempfile.TemporaryDirectory() as spool:
+        csv_path = os.path.join(spool, f"{entity}.csv")
+        schema = _copy_out(engine, query, csv_path)
+        rows = write_dataset(csv_path, schema, os.path.join(directory, entity), partition, fmt)
+    metrics.count("export_rows_total", rows, entity=entity)
+    return rows, str(schema.field(partition).type) if partition else None
+
+
+def write_dataset(csv_path, schema, target, partition=None, fmt="parquet"):
+    """Convert a ``COPY ... CSV HEADER`` file to a dataset at ``target``; returns its rows.
+
+    The new files are written next to the old ones and swapped in at the end,
+    so a reader never sees a half-written export.
+    """
+    pa = require_pyarrow()
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as ds
+
+    staging = f"{target}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    # Text dates are read as strings and converted a batch at a time
+    dates = {
+        field.name
+        for field in schema
+        if field.name in DATE_COLUMNS and field.type == pa.timestamp("us")
+    }
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(block_size=16 << 20),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={
+                field.name: pa.string() if field.name in dates else field.type
+                for field in schema
+            },
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=["t"],
+            false_values=["f"],
+        ),
+    )
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        for batch in reader:
+            rows += batch.num_rows
+            columns = [
+                parse_dates(column) if name in dates else column
+                for name, column in zip(batch.schema.names, batch.columns)
+            ]
+            yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+    if partition:
+        partitioning = ds.partitioning(pa.schema([schema.field(partition)]), flavor="hive")
+    else:
+        partitioning = None
+    ds.write_dataset(
+        ds.Scanner.from_batches(batches(), schema=schema),
+        staging,
+        format="ipc" if fmt == "arrow" else "parquet",
+        file_options=_file_options(ds, fmt),
+        partitioning=partitioning,
+        max_partitions=1 << 16,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    if not os.path.isdir(staging):  # An empty table writes no files
+        os.makedirs(staging)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    return rows
+
+
+def export(engine, directory, entities=None, fmt="parquet"):
+    """Export ``entities`` (default: every table that exists) and write the manifest."""
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    existing = _existing_tables(engine)
+    for entity in entities or ENTITIES:
+        if _source_table(entity) not in existing:
+            print(f"Skipping {entity}: no such table.")
+            continue
+        rows, partition_type = export_entity(engine, entity, directory, fmt)
+        manifest[entity] = {
+            "rows": rows,
+            "format": fmt,
+            "partition": ENTITIES[entity][1],
+            "partition_type": partition_type,
+            "exported": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        print(f"{entity}: {rows} rows")
+        _write_manifest(directory, manifest)
+    return manifest
+
+
+def read_manifest(directory):
+    """{entity: {"rows", "format", "partition", ...}} of an export directory."""
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def open_dataset(directory, entity):
+    """The exported ``entity`` as a ``pyarrow.dataset.Dataset`` over memory-mapped files."""
+    pa = require_pyarrow()
+    import pyarrow.dataset as ds
+    from pyarrow.fs import LocalFileSystem
+
+    info = read_manifest(directory).get(entity)
+    if info is None:
+        raise KeyError(f"{entity} has not been exported to {directory}")
+    partitioning = None
+    if info["partition"]:
+        key = pa.field(info["partition"], pa.type_for_alias(info["partition_type"]))
+        partitioning = ds.partitioning(pa.schema([key]), flavor="hive")
+    return ds.dataset(
+        os.path.join(directory, entity),
+        format="ipc" if info["format"] == "arrow" else "parquet",
+        partitioning=partitioning,
+        filesystem=LocalFileSystem(use_mmap=True),
+    )
+
+
+def load(directory, entity, columns=None, **partitions):
+    """Read an exported entity as a ``pyarrow.Table``.
+
+    Keyword arguments select partitions or filter on any column, e.g.
+    ``load("export", "uncertainty_values", SiteId=96552)``; only the matching
+    files are read. Call ``.to_pandas()`` on the result for a DataFrame.
+    """
+    dataset = open_dataset(directory, entity)
+    import pyarrow.dataset as ds
+
+    condition = None
+    for name, value in partitions.items():
+        test = ds.field(name) == value
+        condition = test if condition is None else condition & test
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def _copy_out(engine, query, path):
+    """COPY the result of ``query`` to the CSV file ``path``; returns its Arrow schema."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT * FROM ({query}) q LIMIT 0")
+        schema = arrow_schema(cursor.description)
+        names = ", ".join(quote_ident(name) for name in schema.names)
+        sql = f"COPY (SELECT {names} FROM ({query}) q) TO STDOUT WITH (FORMAT csv, HEADER true)"
+        with open(path, "wb") as f:
+            if hasattr(cursor, "copy"):  # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for data in copy:
+                        f.write(data)
+            else:  # psycopg2
+                cursor.copy_expert(sql, f)
+        connection.rollback()
+    finally:
+        connection.close()
+    return schema
+
+
+def _file_options(ds, fmt):
+    if fmt == "arrow":
+        # Uncompressed, so the loader can map the buffers without copying them
+        return ds.IpcFileFormat().make_write_options()
+    return ds.ParquetFileFormat().make_write_options(compression="zstd")
+
+
+def _source_table(entity):
+    return ENTITIES[entity][0].split(" FROM ", 1)[1].split()[0]
+
+
+def _existing_tables(engine):
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT table_name FROM information_schema.tables "
+            "WHERE table_schema = current_schema()"
+        )
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        connection.close()
+
+
+def _write_manifest(directory, manifest):
+    tmp_path = os.path.join(directory, f"{MANIFEST}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the crawled tables to typed, partitioned columnar files."
+    )
+    parser.add_argument(
+        "--out", default="export", help="Export directory (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--entity",
+        choices=ENTITIES,
+        action="append",
+        help="Entity to export; repeat for several (default: all)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="parquet",
+        help="zstd Parquet, or uncompressed Arrow IPC for zero-copy reads "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--database-url",
+        default=database_url(),
+        help="Database to export (default: QUALER_DATABASE_URL or the Qualer mirror)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    export(new_engine(args.database_url), args.out, args.entity, args.format)
+
+
+def run(argv=None):
+    """Command-line entry point."""
+    main(argv)
+
+
+if __name__ == "__main__":
+    run()
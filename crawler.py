@@ -0,0 +1,99 @@
+"""Bounded-concurrency asyncio pipeline for crawl work units.
+
+Work items are streamed from an iterable through a single queue to a fixed
+number of workers, so one slow response only occupies its own slot instead of
+stalling a whole batch. The blocking fetch functions run on a thread pool the
+size of the concurrency limit so they can keep sharing the pooled
+``requests.Session``.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+_DONE = object()
+
+
+def crawl(
+    items,
+    fetch,
+    concurrency=10,
+    desc="Crawling",
+    unit="item",
+    total=None,
+    on_result=None,
+    on_error=None,
+    ordered=False,
+):
+    """Call ``fetch(item)`` for every item with at most ``concurrency`` in flight.
+
+    ``on_result(item, result)`` is called on the event loop thread, one call at
+    a time, so it may write to a shared sink. With ``ordered=True`` results are
+    delivered in input order regardless of completion order.
+
+    Without ``on_error`` the first exception raised by ``fetch`` stops the
+    crawl and is re-raised; with it, ``on_error(item, exception)`` is called and
+    the crawl carries on with the other items.
+    """
+    with tqdm(total=total, desc=desc, dynamic_ncols=True, unit=unit) as progress:
+        asyncio.run(
+            _crawl(items, fetch, concurrency, progress, on_result, on_error, ordered)
+        )
+
+
+async def _crawl(items, fetch, concurrency, progress, on_result, on_error, ordered):
+    loop = asyncio.get_running_loop()
+    # A small buffer keeps the workers fed without materialising the work set
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    # Ordered delivery holds finished results until the ones before them are
+    # done; the window caps how far ahead of the slowest item the crawl runs
+    window = asyncio.Semaphore(concurrency * 8)
+    finished = {}
+    next_index = 0
+
+    def emit(item, result, error):
+        if error is not None:
+            on_error(item, error)
+        elif on_result:
+            on_result(item, result)
+
+    def deliver(index, item, result, error):
+        nonlocal next_index
+        if not ordered:
+            emit(item, result, error)
+            return
+        finished[index] = (item, result, error)
+        while next_index in finished:
+            emit(*finished.pop(next_index))
+            window.release()
+            next_index += 1
+
+    async def produce():
+        for index, item in enumerate(items):
+            if ordered:
+                await window.acquire()
+            await queue.put((index, item))
+        for _ in range(concurrency):
+            await queue.put(_DONE)
+
+    async def work(executor):
+        while (entry := await queue.get()) is not _DONE:
+            index, item = entry
+            try:
+                result = await loop.run_in_executor(executor, fetch, item)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                deliver(index, item, None, e)
+            else:
+                deliver(index, item, result, None)
+            progress.update()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        tasks = [asyncio.ensure_future(produce())]
+        tasks += [asyncio.ensure_future(work(executor)) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,106 @@
+"""Write-behind database writer shared by the fetch workers.
+
+Workers hand their rows to a bounded queue instead of opening a connection
+each. A single background thread collects them and flushes one COPY per table
+(an upsert where the table has a natural key) once enough rows are pending
+or the flush interval has passed, so a crawl uses one connection and a few
+large transactions. A full queue blocks the workers, which keeps fetching
+from running ahead of the database.
+"""
+
+import queue
+import threading
+import time
+from bulkLoad import load_records
+from records import Batch
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Background thread that flushes queued rows in batches.
+
+    ``on_commit`` callbacks passed to ``put`` run on the writer thread after the
+    batch holding those rows has been committed, which is the point at which
+    a unit of work may be checkpointed.
+    """
+
+    def __init__(self, engine, batch_size=5000, flush_interval=5.0, max_pending=1000):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.commits = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="BatchWriter", daemon=True)
+        self._thread.start()
+
+    def put(self, table, rows, on_commit=None):
+        """Queue ``rows`` (a ``records.Batch`` or dicts) for ``table``.
+
+        Blocks while the queue is full.
+        """
+        while True:
+            if self.error:
+                raise RuntimeError("Database writer failed") from self.error
+            try:
+                self._queue.put((table, rows, on_commit), timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def close(self):
+        """Flush everything still queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self.error:
+            raise RuntimeError("Database writer failed") from self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        pending = []
+        pending_rows = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(pending)
+                return
+            if item is not None:
+                pending.append(item)
+                pending_rows += len(item[1])
+                deadline = deadline or time.monotonic() + self.flush_interval
+            if pending_rows >= self.batch_size or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                self._flush(pending)
+                pending = []
+                pending_rows = 0
+                deadline = None
+
+    def _flush(self, pending):
+        if self.error or not pending:
+            return  # After a failure queued rows are dropped so workers never block
+        tables = {}
+        try:
+            for table, rows, _ in pending:
+                tables.setdefault(table, Batch(table)).extend(rows)
+            for table, rows in tables.items():
+                if rows:
+                    load_records(self.engine, table, rows)
+                    self.commits += 1
+            for _, _, on_commit in pending:
+                if on_commit:
+                    on_commit()
+        except Exception as e:
+            self.error = e
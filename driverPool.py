@@ -0,0 +1,210 @@
+"""Pool of logged-in Chrome instances for the pages that still need a browser.
+
+A single WebDriver cannot be shared between worker threads, so each caller
+checks an instance out for the duration of one request. Only the first
+instance types the credentials; later ones are seeded with the auth cookies
+it harvested. An instance is quit and replaced after it raises, after
+``max_uses`` requests, or once its JavaScript heap grows past ``max_heap_mb``.
+"""
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+import metrics
+from qualerClient import BASE_URL
+
+DEFAULT_POOL_SIZE = int(os.getenv("QUALER_BROWSERS", 2))
+
+
+def new_driver(headless=True, page_load_timeout=30):
+    """Start one Chrome instance configured the way the crawlers use it."""
+    from selenium import webdriver
+
+    chrome_options = webdriver.ChromeOptions()
+    if headless:
+        chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--log-level=3")
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+def _heap_mb(driver):
+    """Used JavaScript heap of the current page in MiB (0 if unavailable)."""
+    try:
+        used = driver.execute_script(
+            "return window.performance.memory ? performance.memory.usedJSHeapSize : 0"
+        )
+        return (used or 0) / 2**20
+    except Exception:
+        return 0
+
+
+class _Instance:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.generation = 0  # Which login's cookies this instance carries
+
+
+class DriverPool:
+    """Up to ``size`` Chrome instances, started on demand and logged in once.
+
+    ``login(driver)`` signs a fresh browser in. Drivers are created lazily,
+    so building a pool does not start Chrome.
+    """
+
+    def __init__(
+        self,
+        login,
+        size=DEFAULT_POOL_SIZE,
+        headless=True,
+        max_uses=200,
+        max_heap_mb=512,
+        factory=None,
+        base_url=BASE_URL,
+    ):
+        self.login = login
+        self.size = size
+        self.max_uses = max_uses
+        self.max_heap_mb = max_heap_mb
+        self.factory = factory or partial(new_driver, headless=headless)
+        self.base_url = base_url
+        self.cookies = []
+        self.recycled = 0
+        self._generation = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._login_lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a logged-in driver; it is recycled if the block raises."""
+        with self._checkout() as instance:
+            yield instance.driver
+
+    def get(self, url):
+        """Load ``url`` and return the page source, logging in again if bounced."""
+        with self._checkout() as instance:
+            driver = instance.driver
+            generation = instance.generation
+            with metrics.timer("browser_seconds", endpoint=metrics.endpoint(url)):
+                driver.get(url)
+                if "login" in driver.current_url.lower():
+                    print("Session expired or reauthentication needed. Logging in again...")
+                    self._relogin(instance, generation)
+                    driver.get(url)
+                return driver.page_source
+
+    def authenticate(self):
+        """Log in on one instance and share the new cookies with the rest."""
+        with self._checkout(signed_in=False) as instance:
+            with self._login_lock:
+                self._sign_in(instance)
+        return self.cookies
+
+    def use_cookies(self, cookies):
+        """Seed instances with cookies from an earlier login instead of logging in."""
+        with self._lock:
+            if cookies and cookies != self.cookies:
+                self.cookies = list(cookies)
+                self._generation += 1
+
+    def close(self):
+        """Quit every idle driver."""
+        while True:
+            try:
+                instance = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(instance)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def _checkout(self, signed_in=True):
+        self._slots.acquire()
+        try:
+            instance = self._take()
+            try:
+                if signed_in:
+                    self._ensure_signed_in(instance)
+                yield instance
+            except BaseException:
+                self._recycle(instance)
+                raise
+            instance.uses += 1
+            if self._worn_out(instance):
+                self._recycle(instance)
+            else:
+                self._idle.put(instance)
+        finally:
+            self._slots.release()
+
+    def _take(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            # A slot is held, so starting another browser stays within ``size``
+            return _Instance(self.factory())
+
+    def _ensure_signed_in(self, instance):
+        if not self._generation:
+            self._relogin(instance, 0)
+        elif instance.generation != self._generation:
+            self._seed(instance)
+
+    def _relogin(self, instance, generation):
+        """Log in on ``instance`` unless another thread already has since ``generation``.
+
+        Threads bounced by the same expired login wait for the one that is
+        typing the credentials and take its cookies instead.
+        """
+        with self._login_lock:
+            if self._generation == generation:
+                self._sign_in(instance)
+            else:
+                self._seed(instance)
+
+    def _seed(self, instance):
+        """Copy the cookies of the latest login into ``instance``."""
+        with self._lock:
+            cookies, generation = list(self.cookies), self._generation
+        # The domain has to be loaded before Selenium accepts cookies for it
+        instance.driver.get(self.base_url)
+        instance.driver.delete_all_cookies()
+        for cookie in cookies:
+            instance.driver.add_cookie(cookie)
+        instance.generation = generation
+
+    def _sign_in(self, instance):
+        self.login(instance.driver)
+        cookies = instance.driver.get_cookies()
+        with self._lock:
+            self.cookies = cookies
+            self._generation += 1
+            instance.generation = self._generation
+
+    def _worn_out(self, instance):
+        if self.max_uses and instance.uses >= self.max_uses:
+            return True
+        return bool(self.max_heap_mb) and _heap_mb(instance.driver) > self.max_heap_mb
+
+    def _recycle(self, instance):
+        self.recycled += 1
+        metrics.count("browsers_recycled_total")
+        self._quit(instance)
+
+    @staticmethod
+    def _quit(instance):
+        try:
+            instance.driver.quit()
+        except Exception:
+            pass  # Chrome may already be gone
@@ -0,0 +1,118 @@
+"""Incremental decoding of the row arrays in Qualer's JSON replies.
+
+Listing endpoints wrap their rows in one top-level array, ``Data`` for the
+grids and ``views`` for ServiceCapabilities. ``iter_items`` yields the rows
+one at a time while the reply is still arriving, so a large listing is never
+held as text and as decoded rows at the same time. Members before the array
+are decoded and skipped; whatever follows it is read but not decoded.
+"""
+
+import codecs
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _Reader:
+    """A text buffer refilled from byte (or str) chunks as values are consumed."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def more(self):
+        """Append the next chunk; False once the input is exhausted."""
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            text = self._utf8.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            text = self._utf8.decode(chunk)
+        else:
+            text = chunk
+        # Drop what has been consumed so the buffer stays about a chunk long
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or "" at the end of the input."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(f"Expecting {chars!r}", self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            # A number at the end of the buffer may go on in the next chunk
+            if end == len(self.buffer) and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_items(chunks, key=None):
+    """Yield the items of the array under top-level ``key`` as ``chunks`` arrive.
+
+    With ``key=None`` the reply itself is the array. A missing ``key`` raises
+    ``KeyError`` and a ``null`` in its place yields nothing, like indexing the
+    decoded reply would. The input is read to the end, so a response cache
+    sees the whole reply and the connection goes back to the pool.
+    """
+    reader = _Reader(chunks)
+    try:
+        if key is not None and not _find_member(reader, key):
+            raise KeyError(key)
+        if reader.peek() == "n":
+            reader.value()
+            return
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.pos += 1
+            return
+        while True:
+            yield reader.value()
+            if reader.expect(",]") == "]":
+                return
+    finally:
+        for _ in reader.chunks:
+            pass
+
+
+def _find_member(reader, key):
+    """Advance ``reader`` to the value of ``key`` in the top-level object."""
+    reader.expect("{")
+    if reader.peek() == "}":
+        return False
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            return True
+        reader.value()
+        if reader.expect(",}") == "}":
+            return False
@@ -0,0 +1,277 @@
+"""Per-stage counters and latency histograms for a crawl.
+
+Instrumented code records into the process-wide ``registry`` through the
+module functions (``timer``, ``count``, ``observe``, ``gauge``). At the end
+of a run, and optionally every few seconds during it, an ``Exporter``
+writes the registry as a JSON summary and as a Prometheus text file that the
+node_exporter textfile collector can pick up. That shows whether a slow
+crawl is waiting on Qualer, on the login browser or on PostgreSQL.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+PREFIX = "qualer"
+# Seconds; wide enough for a 30 s request timeout and a multi-minute COPY
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, math.inf,
+)
+
+
+class Histogram:
+    """Bucketed distribution with exact count, sum, min and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate by interpolating inside the bucket holding the q-th value."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                low = self.buckets[i - 1] if i else 0.0
+                high = min(self.buckets[i], self.max)
+                low = max(low, self.min)
+                return low + (high - low) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0, "sum": 0.0}
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """Thread-safe store of counters, gauges and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.started = time.time()
+
+    def count(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe how long the block took into histogram ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counted(self, iterable, name, **labels):
+        """Yield from ``iterable`` and add the number of items to counter ``name``."""
+        items = 0
+        try:
+            for item in iterable:
+                items += 1
+                yield item
+        finally:
+            self.count(name, items, **labels)
+
+    def snapshot(self):
+        """Everything recorded so far as plain JSON-ready data."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((k, h.summary()) for k, h in self.histograms.items())
+        return {
+            "started": self.started,
+            "elapsed_seconds": time.time() - self.started,
+            "counters": [_entry(key, value=value) for key, value in counters],
+            "gauges": [_entry(key, value=value) for key, value in gauges],
+            "histograms": [_entry(key, **summary) for key, summary in histograms],
+        }
+
+    def prometheus(self):
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            declared = set()
+            for kind, entries in (("counter", counters), ("gauge", gauges)):
+                for (name, labels), value in entries:
+                    metric = f"{PREFIX}_{name}"
+                    if metric not in declared:
+                        declared.add(metric)
+                        lines.append(f"# TYPE {metric} {kind}")
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                metric = f"{PREFIX}_{name}"
+                if metric not in declared:
+                    declared.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    bucket_labels = _format_labels(labels + (("le", le),))
+                    lines.append(f"{metric}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class Exporter:
+    """Writes ``<name>.json`` and ``<name>.prom`` to ``directory``.
+
+    With an ``interval`` the files are also rewritten every ``interval``
+    seconds while the run is going; ``stop`` always writes a final copy.
+    """
+
+    def __init__(self, directory, name, interval=0, metrics=None):
+        self.directory = directory
+        self.name = name
+        self.interval = interval
+        self.metrics = metrics or registry
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.write()
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        summary = dict(self.metrics.snapshot(), run=self.name)
+        _write_atomic(
+            os.path.join(self.directory, f"{self.name}.json"),
+            json.dumps(summary, indent=2),
+        )
+        _write_atomic(
+            os.path.join(self.directory, f"{self.name}.prom"), self.metrics.prometheus()
+        )
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+
+def endpoint(url):
+    """The label for a request: its path without host or query."""
+    return urlsplit(url).path or "/"
+
+
+def add_arguments(parser):
+    """The metrics export options shared by the crawl scripts."""
+    parser.add_argument(
+        "--metrics-dir",
+        help="Directory for the JSON and Prometheus metrics files "
+        "(default: <cache-dir>/metrics)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=0,
+        help="Also write the metrics every this many seconds during the run "
+        "(default: only at the end)",
+    )
+
+
+def exporter(args, name):
+    """An ``Exporter`` configured from the parsed ``add_arguments`` options."""
+    directory = args.metrics_dir or os.path.join(args.cache_dir, "metrics")
+    return Exporter(directory, name, args.metrics_interval)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _entry(key, **fields):
+    name, labels = key
+    return dict(name=name, labels=dict(labels), **fields)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+registry = Metrics()
+count = registry.count
+gauge = registry.gauge
+observe = registry.observe
+timer = registry.timer
+counted = registry.counted
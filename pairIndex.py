@@ -0,0 +1,90 @@
+"""Persistent index of which ServiceGroup/Technique pairs hold uncertainty budgets.
+
+Most pairs in the ServiceGroup x Technique matrix return an empty ``Data``
+list. Every fetched pair is appended to a JSON-lines log together with the
+number of budgets it returned, so later crawls can skip pairs that were empty
+the last time they were checked, until that observation is older than the TTL.
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_PATH = os.path.join("cache", "pair_index.jsonl")
+DEFAULT_EMPTY_TTL_DAYS = 30
+
+
+class PairIndex:
+    """Append-only record of budget counts per (ServiceGroupId, TechniqueId)."""
+
+    def __init__(self, path=DEFAULT_PATH, empty_ttl_days=DEFAULT_EMPTY_TTL_DAYS, refresh=False):
+        self.path = path
+        self.empty_ttl = empty_ttl_days * 24 * 60 * 60
+        self.refresh = refresh
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written line from an interrupted run
+                lines += 1
+                key = (entry["ServiceGroupId"], entry["TechniqueId"])
+                self.entries[key] = (entry["count"], entry["checked"])
+        # Keep the log from growing without bound across runs
+        if lines > 2 * len(self.entries):
+            self._compact()
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (serviceGroupId, techniqueId), (count, checked) in self.entries.items():
+                f.write(_encode(serviceGroupId, techniqueId, count, checked))
+        os.replace(tmp_path, self.path)
+
+    def should_fetch(self, serviceGroupId, techniqueId, now=None):
+        """False only for pairs that were empty within the TTL."""
+        if self.refresh:
+            return True
+        entry = self.entries.get((serviceGroupId, techniqueId))
+        if entry is None:
+            return True
+        count, checked = entry
+        return count > 0 or (now or time.time()) - checked >= self.empty_ttl
+
+    def record(self, serviceGroupId, techniqueId, count):
+        """Store how many budgets the pair returned. Safe to call from workers."""
+        checked = time.time()
+        with self._lock:
+            self.entries[(serviceGroupId, techniqueId)] = (count, checked)
+            self._file.write(_encode(serviceGroupId, techniqueId, count, checked))
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _encode(serviceGroupId, techniqueId, count, checked):
+    entry = {
+        "ServiceGroupId": serviceGroupId,
+        "TechniqueId": techniqueId,
+        "count": count,
+        "checked": checked,
+    }
+    return json.dumps(entry) + "\n"
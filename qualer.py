@@ -0,0 +1,50 @@
+"""Command-line entry point for the crawl scripts.
+
+    python qualer.py collect-uncertainties --concurrency 20
+    python qualer.py collect-budgets --incremental
+    python qualer.py get-cmcs --help
+    python qualer.py export --out export
+
+Only the module of the chosen command is imported. Each script can still be
+run directly as well (``python getCMCs.py``).
+"""
+
+import argparse
+import importlib
+import sys
+
+COMMANDS = {
+    "collect-uncertainties": (
+        "collectUncertainties",
+        "Crawl every ServiceGroup x Technique uncertainty budget",
+    ),
+    "collect-budgets": (
+        "collectBudgets",
+        "Save the components and values of every uncertainty budget",
+    ),
+    "get-cmcs": ("getCMCs", "Load CMC capabilities per technique"),
+    "export": ("columnarExport", "Export the tables to partitioned Parquet/Arrow files"),
+    "evaluate": ("uncertaintyEngine", "Compute combined and expanded uncertainties locally"),
+    "lookup-cmc": ("capabilityIndex", "Find the capability that applies to a nominal value"),
+    "changes": ("changeLog", "Print the rows the loads added, changed or removed"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="qualer",
+        description="Collect uncertainty budgets and capabilities from Qualer.",
+        epilog="Run 'qualer <command> --help' for the options of a command.",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="<command>", required=True)
+    for name, (_, summary) in COMMANDS.items():
+        commands.add_parser(name, help=summary, add_help=False)
+    args, rest = parser.parse_known_args(argv)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    # The command's own parser names itself after argv[0] in its usage line
+    sys.argv[0] = f"qualer {args.command}"
+    module.run(rest)
+
+
+if __name__ == "__main__":
+    main()
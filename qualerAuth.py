@@ -0,0 +1,121 @@
+"""Qualer login shared by the crawl scripts.
+
+``login`` signs a browser in and returns as soon as Qualer has either left the
+login page or shown a validation error, instead of sleeping a fixed time.
+``LoginSession`` keeps the resulting auth cookies on disk between runs and
+makes sure that when they expire only one worker logs in again while the
+others wait for its cookies.
+"""
+
+import json
+import os
+import threading
+import time
+from getpass import getpass
+import metrics
+from qualerClient import BASE_URL
+
+DEFAULT_MAX_AGE_HOURS = 12
+_LOGIN_ERRORS = ".validation-summary-errors, .field-validation-error"
+
+
+def login(driver, timeout=20):
+    """Type the credentials into ``driver`` and wait for Qualer to answer."""
+    # Selenium is imported here so the crawl scripts load without it
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    # Get credentials from environment variables or prompt user
+    username = os.getenv("QUALER_USERNAME") or input("Enter Qualer Email: ")
+    password = os.getenv("QUALER_PASSWORD") or getpass("Enter Qualer Password: ")
+
+    with metrics.timer("login_seconds"):
+        driver.get(f"{BASE_URL}/login")
+        driver.find_element(By.ID, "Email").send_keys(username)
+        driver.find_element(By.ID, "Password").send_keys(password + Keys.RETURN)
+
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: "login" not in d.current_url.lower()
+                or d.find_elements(By.CSS_SELECTOR, _LOGIN_ERRORS)
+            )
+        except TimeoutException:
+            pass
+    if "login" in driver.current_url.lower():
+        print("Login failed. Check credentials.")
+        exit()
+
+
+def load_cookies(path, max_age_hours=DEFAULT_MAX_AGE_HOURS, now=None):
+    """Cookies saved by ``save_cookies``, or None if missing or expired."""
+    if not path or not os.path.exists(path):
+        return None
+    now = now or time.time()
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if now - saved.get("saved", 0) > max_age_hours * 3600:
+        return None
+    cookies = saved.get("cookies") or None
+    # A persistent cookie past its expiry means the login is gone as well
+    if cookies and any(cookie.get("expiry", now + 1) <= now for cookie in cookies):
+        return None
+    return cookies
+
+
+def save_cookies(cookies, path, now=None):
+    """Write the auth cookies readable by the current user only."""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"saved": now or time.time(), "cookies": cookies}, f)
+    os.replace(tmp_path, path)
+
+
+class LoginSession:
+    """Auth cookies shared by every worker, cached at ``path`` between runs.
+
+    ``authenticate()`` performs a browser login and returns the new cookies.
+    Callers note ``generation`` before a request; if the request bounces they
+    pass it to ``refresh`` so that a login which happened meanwhile is reused
+    instead of repeated.
+    """
+
+    def __init__(self, authenticate, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+        self.authenticate = authenticate
+        self.max_age_hours = max_age_hours
+        self.path = None
+        self.cookies = None
+        self.generation = 0
+        self.logins = 0
+        self._lock = threading.Lock()
+
+    def start(self, path=None):
+        """Reuse the cached cookies if still fresh, otherwise log in."""
+        self.path = path
+        with self._lock:
+            cookies = load_cookies(path, self.max_age_hours)
+            if cookies:
+                self.cookies = cookies
+                self.generation += 1
+                metrics.count("logins_total", reason="cached")
+                return cookies
+        return self.refresh(self.generation)
+
+    def refresh(self, generation):
+        """Log in again unless someone already did since ``generation``."""
+        with self._lock:
+            if self.generation == generation:
+                self.cookies = self.authenticate()
+                self.logins += 1
+                metrics.count("logins_total", reason="expired" if generation else "start")
+                self.generation += 1
+                save_cookies(self.cookies, self.path)
+            return self.cookies
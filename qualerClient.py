@@ -0,0 +1,200 @@
+"""HTTP transport for the Qualer JSON endpoints.
+
+Selenium is only needed to log in. Once the auth cookies have been harvested
+from the browser every JSON endpoint is fetched over a pooled, keep-alive
+``requests.Session`` instead of rendering the page in Chrome.
+"""
+
+import re
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from adaptiveLimiter import backoff_delay
+import metrics
+
+BASE_URL = "https://jgiquality.qualer.com"
+# Bytes read from the socket at a time when a reply is streamed
+CHUNK_BYTES = 64 * 1024
+
+_TOKEN_PATTERN = re.compile(
+    r'name="__RequestVerificationToken"[^>]*value="([^"]+)"'
+)
+
+
+# Replies that mean "too busy right now" rather than "wrong request"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class SessionExpired(Exception):
+    """Raised when Qualer redirects an API call to the login page."""
+
+
+class Overloaded(requests.HTTPError):
+    """Raised for a 429 or 5xx reply; ``retry_after`` is the server's hint in seconds."""
+
+    def __init__(self, message, response=None, retry_after=None):
+        super().__init__(message, response=response)
+        self.retry_after = retry_after
+
+
+# Failures worth retrying after a backoff; ChunkedEncodingError is a
+# connection dropped part way through a reply
+RETRYABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    Overloaded,
+)
+
+
+def with_retries(call, endpoint, retries=3):
+    """``call()``, retried on dropped connections and throttling.
+
+    Between attempts it waits an exponential backoff with jitter, or the
+    server's Retry-After; the last attempt's error is raised.
+    """
+    for attempt in range(retries):
+        try:
+            return call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries - 1:
+                raise
+            metrics.count("retries_total", endpoint=endpoint)
+            print(f"Request failed ({e}). Retrying ({attempt + 1}/{retries})...")
+            time.sleep(backoff_delay(attempt, getattr(e, "retry_after", None)))
+
+
+def create_session(cookies=(), pool_size=20):
+    """Build a keep-alive session with a connection pool sized for the workers."""
+    session = requests.Session()
+    set_pool_size(session, pool_size)
+    session.headers.update(
+        {
+            "accept": "application/json, text/javascript, */*",
+            "x-requested-with": "XMLHttpRequest",
+        }
+    )
+    update_cookies(session, cookies)
+    return session
+
+
+def set_pool_size(session, pool_size):
+    """Size the keep-alive pool so every concurrent worker gets a connection."""
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def update_cookies(session, cookies):
+    """Copy Selenium cookies (``driver.get_cookies()``) onto the session."""
+    for cookie in cookies:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+        )
+
+
+def get_json(session, url, timeout=30, method=None, data=None, limiter=None):
+    """Fetch ``url`` and decode the JSON body. ``data`` is POSTed as a form.
+
+    Raises ``SessionExpired`` when Qualer bounces the request to the login
+    page, so the caller can log in again and retry, and ``Overloaded`` for
+    429/5xx replies. With a ``limiter`` (see ``adaptiveLimiter``) the request
+    waits for a slot and reports its latency and outcome.
+    """
+    method = method or ("POST" if data is not None else "GET")
+    response = _send(session, method, url, timeout, limiter, data=data)
+    if "login" in response.url.lower():
+        raise SessionExpired(url)
+    response.raise_for_status()
+    with metrics.timer("decode_seconds", endpoint=metrics.endpoint(url)):
+        return response.json()
+
+
+def stream_json(
+    session, url, timeout=30, method=None, data=None, limiter=None, chunk_size=CHUNK_BYTES
+):
+    """Like ``get_json``, but return the body as an iterator of byte chunks.
+
+    The request is sent and checked before this returns; the body is read from
+    the socket only as the chunks are consumed, e.g. by ``jsonStream.iter_items``.
+    """
+    method = method or ("POST" if data is not None else "GET")
+    response = _send(session, method, url, timeout, limiter, data=data, stream=True)
+    try:
+        if "login" in response.url.lower():
+            raise SessionExpired(url)
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    return _iter_chunks(response, chunk_size, metrics.endpoint(url))
+
+
+def get_verification_token(session, url, timeout=30, limiter=None):
+    """Read the anti-forgery token the grid endpoints expect from an HTML page."""
+    response = _send(session, "GET", url, timeout, limiter)
+    if "login" in response.url.lower():
+        raise SessionExpired(url)
+    response.raise_for_status()
+    match = _TOKEN_PATTERN.search(response.text)
+    return match.group(1) if match else ""
+
+
+def retry_after_seconds(value):
+    """Parse a ``Retry-After`` header (seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _send(session, method, url, timeout, limiter, **kwargs):
+    if limiter is not None:
+        limiter.acquire()
+    start = time.monotonic()
+    response = None
+    try:
+        response = session.request(method, url, timeout=timeout, **kwargs)
+    finally:
+        latency = time.monotonic() - start
+        if limiter is not None:
+            ok = response is not None and response.status_code not in RETRYABLE_STATUS
+            limiter.release(latency, ok)
+        _record(url, response, latency, kwargs.get("stream", False))
+    if response.status_code in RETRYABLE_STATUS:
+        retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+        if retry_after and limiter is not None:
+            limiter.pause(retry_after)
+        response.close()
+        raise Overloaded(
+            f"{response.status_code} from {url}", response=response, retry_after=retry_after
+        )
+    return response
+
+
+def _iter_chunks(response, chunk_size, endpoint):
+    with response:
+        for chunk in response.iter_content(chunk_size):
+            metrics.count("response_bytes_total", len(chunk), endpoint=endpoint)
+            yield chunk
+
+
+def _record(url, response, latency, streamed):
+    endpoint = metrics.endpoint(url)
+    metrics.observe("request_seconds", latency, endpoint=endpoint)
+    if response is None:
+        metrics.count("requests_total", endpoint=endpoint, status="error")
+        return
+    metrics.count("requests_total", endpoint=endpoint, status=response.status_code)
+    if not streamed:  # Streamed bodies are counted as their chunks are read
+        metrics.count("response_bytes_total", len(response.content), endpoint=endpoint)
@@ -0,0 +1,229 @@
+"""Streaming writers for the component and value files of collectBudgets.
+
+A sink keeps its output open for the whole run and writes each record once.
+Records (dicts, ``records.Record``s or whole ``records.Batch``es) are
+buffered as one batch until the caller flushes, and everything buffered is on
+disk once ``flush`` returns, so the caller can checkpoint the work it covers.
+Three formats are supported:
+
+* ``csv``     - plain CSV, as before
+* ``csv.gz``  - gzip-compressed CSV (appends add a gzip member)
+* ``parquet`` - a directory of zstd-compressed Parquet files, one per flush;
+  needs ``pyarrow``
+
+Workers that share a crawl each write their own part (``part_base``), e.g.
+``UncertaintyValues-host1.csv``. Reading an output reads every part with it,
+and rewriting it merges them into the one file.
+"""
+
+import csv
+import glob
+import gzip
+import os
+import time
+from contextlib import contextmanager
+import metrics
+from records import Batch
+
+FORMATS = ("csv", "csv.gz", "parquet")
+
+
+def sink_path(base, fmt):
+    """``csv/UncertaintyValues`` + ``csv.gz`` -> ``csv/UncertaintyValues.csv.gz``"""
+    return f"{base}.{fmt}"
+
+
+def part_base(base, part):
+    """``csv/UncertaintyValues`` + ``host1`` -> ``csv/UncertaintyValues-host1``"""
+    return f"{base}-{part}"
+
+
+def output_paths(base, fmt):
+    """The paths of an output that exist: its own, then its parts by name."""
+    path = sink_path(base, fmt)
+    parts = sorted(glob.glob(sink_path(part_base(glob.escape(base), "*"), fmt)))
+    return ([path] if os.path.exists(path) else []) + parts
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+class CsvSink:
+    """Appends records to one (optionally gzipped) CSV file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows_written = 0
+        self._buffer = Batch()
+        self._columns = _existing_header(path)
+        self._dropped = set()
+        opener = gzip.open if path.endswith(".gz") else open
+        self._file = opener(path, "at", encoding="utf-8", newline="")
+        self._writer = None
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def write(self, record):
+        self._buffer.append(record)
+
+    def write_many(self, records):
+        self._buffer.extend(records)
+
+    def flush(self):
+        with _flushing(self.path, len(self._buffer)):
+            if self._buffer:
+                if self._writer is None:
+                    header = self._columns is None
+                    self._columns = self._columns or list(self._buffer.names)
+                    self._writer = csv.writer(self._file)
+                    if header:
+                        self._writer.writerow(self._columns)
+                # Columns the header lacks are left out, as csv.DictWriter would
+                _warn_dropped(self.path, self._buffer.names, self._columns, self._dropped)
+                self._writer.writerows(self._buffer.select(self._columns))
+                self.rows_written += len(self._buffer)
+                self._buffer = Batch()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetSink:
+    """Writes each flushed batch as a new Parquet file in the ``path`` directory."""
+
+    def __init__(self, path):
+        self.pa = require_pyarrow()
+        self.path = path
+        self.rows_written = 0
+        self._buffer = Batch()
+        self._schema = None
+        self._dropped = set()
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def write(self, record):
+        self._buffer.append(record)
+
+    def write_many(self, records):
+        self._buffer.extend(records)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with _flushing(self.path, len(self._buffer)):
+            if self._schema is None:
+                table = self.pa.table(self._buffer.columns())
+            else:
+                # Later parts keep the first part's columns and types
+                _warn_dropped(self.path, self._buffer.names, self._schema.names, self._dropped)
+                columns = self._buffer.columns(self._schema.names)
+                table = self.pa.table(columns, schema=self._schema)
+            self._schema = table.schema
+            name = f"part-{time.time_ns()}.parquet"
+            # Write to a hidden temporary name so a crash never leaves a truncated part
+            tmp_path = os.path.join(self.path, f".{name}.tmp")
+            self.pa.parquet.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, os.path.join(self.path, name))
+            self.rows_written += len(self._buffer)
+            self._buffer = Batch()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_sink(base, fmt="csv"):
+    path = sink_path(base, fmt)
+    if fmt == "parquet":
+        return ParquetSink(path)
+    return CsvSink(path)
+
+
+def read_output(base, fmt="csv"):
+    """Read a sink's output and its parts back as one DataFrame (empty if there are none)."""
+    import pandas as pd
+
+    paths = output_paths(base, fmt)
+    if not paths:
+        return pd.DataFrame()
+    if fmt == "parquet":
+        require_pyarrow()
+        frames = [pd.read_parquet(path) for path in paths]
+    else:
+        frames = [pd.read_csv(path, encoding="utf-8") for path in paths]
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def rewrite_output(df, base, fmt="csv"):
+    """Replace a sink's output and its parts with ``df``, as one file."""
+    remove_output(base, fmt)
+    path = sink_path(base, fmt)
+    if fmt == "parquet":
+        os.makedirs(path, exist_ok=True)
+        df.to_parquet(os.path.join(path, f"part-{time.time_ns()}.parquet"), index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8")
+
+
+def remove_output(base, fmt="csv"):
+    """Remove a sink's output and its parts."""
+    for path in output_paths(base, fmt):
+        if os.path.isdir(path):
+            for name in os.listdir(path):  # Parquet parts
+                os.remove(os.path.join(path, name))
+            os.rmdir(path)
+        else:
+            os.remove(path)
+
+
+@contextmanager
+def _flushing(path, rows):
+    sink = os.path.basename(path)
+    with metrics.timer("sink_flush_seconds", sink=sink):
+        yield
+    metrics.count("sink_rows_total", rows, sink=sink)
+
+
+def _warn_dropped(path, names, kept, dropped):
+    """Report columns a flush leaves out, once per column and sink."""
+    new = [name for name in names if name not in kept and name not in dropped]
+    if new:
+        dropped.update(new)
+        print(
+            f"Warning: {os.path.basename(path)} has no column for {', '.join(new)}; "
+            "those values are not written."
+        )
+
+
+def _existing_header(path):
+    """Columns of a CSV being appended to, or None for a new/empty file."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), None)
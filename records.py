@@ -0,0 +1,288 @@
+"""Typed records for the rows the crawlers fetch, and batches of them.
+
+A reply is decoded into dicts, but nothing downstream needs a dict per row.
+``Budget``, ``Component``, ``Value`` and ``Capability`` are slot classes
+with one attribute per declared column, built from a decoded row and tagged
+with the IDs it was fetched for. Only columns backed by a real reply (the
+budget listing in ``json/budgets.json`` and ``uncertainty_budgets.sql``)
+and the tag IDs are declared. A ``Batch`` holds the rows of one table as
+tuples in column order, which is what COPY, ``csv.writer`` and the database
+writer consume, so a fetched row is copied once on its way to the sink.
+
+Keys a record does not declare are kept in its ``extra`` dict and become
+extra columns of the batch, so a field Qualer sends is not lost; ``get``
+reads declared and extra columns alike.
+"""
+
+from dataclasses import dataclass, fields
+from operator import attrgetter
+
+
+class Record:
+    """Base of the row types; see ``_record``."""
+
+    __slots__ = ()
+    table = None
+    names = ()
+
+    @classmethod
+    def from_json(cls, data, **tags):
+        """Record for a decoded row; ``tags`` set the IDs the row was fetched for."""
+        record = cls(*map(data.get, cls.names))
+        for name, value in tags.items():
+            setattr(record, name, value)
+        if cls._keep_extra and not data.keys() <= cls._known:
+            record.extra = {k: v for k, v in data.items() if k not in cls._known}
+        return record
+
+    def row(self):
+        """Values in ``names`` order, without the extra ones."""
+        return self._values(self)
+
+    def get(self, name, default=None):
+        if name in self._index:
+            return getattr(self, name)
+        return (self.extra or {}).get(name, default)
+
+    def items(self):
+        yield from zip(self.names, self._values(self))
+        if self.extra:
+            yield from self.extra.items()
+
+    def values(self, names):
+        """Values for ``names``, such as the columns of a COPY."""
+        if not self.extra and names == self.names:
+            return self._values(self)
+        return [self.get(name) for name in names]
+
+
+def _record(table, tags=(), ignore=(), keep_extra=True):
+    """Make ``cls`` a slotted dataclass record of ``table``.
+
+    Its fields are the columns, in order, except the trailing ``extra``. The
+    last fields are the ``tags``: the IDs a row is fetched for rather than
+    read from it. Keys in ``ignore`` are dropped, and so is every undeclared
+    key unless ``keep_extra``.
+    """
+
+    def decorate(cls):
+        cls = dataclass(slots=True)(cls)
+        cls.table = table
+        cls.names = tuple(f.name for f in fields(cls) if f.name != "extra")
+        cls._fetched = cls.names[:len(cls.names) - len(tags)]
+        cls._index = frozenset(cls.names)
+        cls._known = cls._index | frozenset(ignore)
+        cls._keep_extra = keep_extra
+        values = attrgetter(*cls.names)
+        # attrgetter of a single name returns the value itself, not a tuple
+        cls._values = values if len(cls.names) > 1 else staticmethod(lambda r: (values(r),))
+        return cls
+
+    return decorate
+
+
+@_record("uncertainty_budgets", keep_extra=False)
+class Budget(Record):
+    """A ServiceGroupTechnique/UncertaintyBudgets or UncertaintyBudget_Read row.
+
+    Only the columns of ``uncertainty_budgets`` are kept; the listing's
+    TechniqueName and ParameterName are not stored.
+    """
+
+    UncertaintyBudgetId: int = None
+    BudgetName: str = None
+    ComponentsCount: int = None
+    ActivationDate: str = None
+    ExpirationDate: str = None
+    SiteId: int = None
+    extra: dict = None
+
+
+# No captured component, value or capability reply backs more than a
+# component's Id, so their other fields stay in ``extra`` under Qualer's names
+
+
+@_record("uncertainty_components", tags=("UncertaintyBudgetId",), ignore=("UncertaintyValues",))
+class Component(Record):
+    """An UncertaintyComponent/List row; its values are split off as ``Value``s."""
+
+    Id: int = None
+    UncertaintyBudgetId: int = None
+    extra: dict = None
+
+
+@_record("uncertainty_values", tags=("UncertaintyComponentId",))
+class Value(Record):
+    Id: int = None
+    UncertaintyComponentId: int = None
+    extra: dict = None
+
+
+@_record("capabilities", tags=("TechniqueId",))
+class Capability(Record):
+    """A Capabilities_Read row; its range and uncertainty fields are all in ``extra``."""
+
+    TechniqueId: int = None
+    extra: dict = None
+
+
+class Batch:
+    """Rows of one table as tuples in ``names`` order.
+
+    Rows may be shorter than ``names`` when a later row brought an extra
+    column; ``padded_rows`` fills them in with None.
+    """
+
+    __slots__ = ("table", "names", "rows", "_index", "_type")
+
+    def __init__(self, table=None, names=()):
+        self.table = table
+        self.names = list(names)
+        self.rows = []
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._type = None
+
+    @classmethod
+    def of(cls, record_type):
+        """Empty batch for records of ``record_type``."""
+        batch = cls(record_type.table, record_type.names)
+        batch._type = record_type
+        return batch
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, row):
+        """Append a tuple already in ``names`` order."""
+        self.rows.append(row)
+
+    def add_json(self, data, *tags):
+        """Append a decoded row as a record of the batch's type would store it.
+
+        Same as ``append(record_type.from_json(data, ...))`` with the tag
+        values given in order, but without building the record.
+        """
+        type_ = self._type
+        row = tuple(map(data.get, type_._fetched)) + tags
+        if type_._keep_extra and not data.keys() <= type_._known:
+            extra = {k: v for k, v in data.items() if k not in type_._known}
+            self._add_names(extra)
+            row += tuple(extra.get(name) for name in self.names[len(row):])
+        self.rows.append(row)
+
+    def append(self, record):
+        """Append a ``Record`` or a dict."""
+        if self._type is None and not self.names and isinstance(record, Record):
+            self._type = type(record)
+            self.table = self.table or record.table
+            self._add_names(record.names)
+        if type(record) is self._type:
+            row = record._values(record)
+            if record.extra:
+                self._add_names(record.extra)
+                extra = record.extra
+                row += tuple(extra.get(name) for name in self.names[len(row):])
+            self.rows.append(row)
+            return
+        self._add_names(name for name, _ in record.items())
+        self.rows.append(tuple(record.get(name) for name in self.names))
+
+    def extend(self, records):
+        """Append records, dicts or the rows of another ``Batch``."""
+        if not isinstance(records, Batch):
+            for record in records:
+                self.append(record)
+            return
+        if not self.names:
+            self.table = self.table or records.table
+            self._type = records._type
+        width = len(self.names)
+        if records.names[:width] == self.names:
+            # Same columns, or more on the end
+            self._add_names(records.names[width:])
+            self.rows.extend(records.rows)
+        elif self.names[:len(records.names)] == records.names:
+            self.rows.extend(records.rows)
+        else:
+            self._add_names(records.names)
+            positions = [records._index.get(name) for name in self.names]
+            for row in records.padded_rows():
+                self.rows.append(tuple(None if i is None else row[i] for i in positions))
+
+    def padded_rows(self):
+        width = len(self.names)
+        for row in self.rows:
+            yield row if len(row) == width else row + (None,) * (width - len(row))
+
+    def select(self, names):
+        """Rows with the values of ``names``, None where the batch lacks a column."""
+        if list(names) == self.names:
+            return self.padded_rows()
+        positions = [self._index.get(name) for name in names]
+        return (
+            tuple(None if i is None or i >= len(row) else row[i] for i in positions)
+            for row in self.rows
+        )
+
+    def columns(self, names=None):
+        """{name: list of values}, e.g. for ``pyarrow.table``."""
+        names = self.names if names is None else list(names)
+        if not self.rows:
+            return {name: [] for name in names}
+        return {name: list(values) for name, values in zip(names, zip(*self.select(names)))}
+
+    def dicts(self):
+        return [dict(zip(self.names, row)) for row in self.rows]
+
+    def _add_names(self, names):
+        for name in names:
+            if name not in self._index:
+                self._index[name] = len(self.names)
+                self.names.append(name)
+
+
+def budget_batches(rows, serviceGroupId=None, techniqueId=None):
+    """Split budget rows into batches for the tables of ``uncertainty_budgets.sql``.
+
+    Each row from ServiceGroupTechnique/UncertaintyBudgets becomes a budget row
+    plus one row in each join table. Rows fetched for a service group and
+    technique pass them in; otherwise each row's own ``ServiceGroupId`` and
+    ``TechniqueId`` are used, as in the crawl CSV.
+    """
+    budgets = Batch.of(Budget)
+    service_groups = Batch("service_groups", ("ServiceGroupId",))
+    budget_groups = Batch(
+        "uncertainty_budget_service_groups", ("UncertaintyBudgetId", "ServiceGroupId")
+    )
+    budget_techniques = Batch(
+        "uncertainty_budget_techniques", ("UncertaintyBudgetId", "TechniqueId")
+    )
+    seen_groups = set()
+    for row in rows:
+        budgets.add_json(row)
+        budgetId = row.get("UncertaintyBudgetId")
+        groupId = row.get("ServiceGroupId") if serviceGroupId is None else serviceGroupId
+        if groupId is not None:
+            if groupId not in seen_groups:
+                seen_groups.add(groupId)
+                service_groups.add((groupId,))
+            budget_groups.add((budgetId, groupId))
+        techId = row.get("TechniqueId") if techniqueId is None else techniqueId
+        if techId is not None:
+            budget_techniques.add((budgetId, techId))
+    return {
+        batch.table: batch
+        for batch in (budgets, service_groups, budget_groups, budget_techniques)
+    }
+
+
+def split_components(uncertaintyBudgetId, uncertaintyComponents):
+    """Component and value batches of one budget's UncertaintyComponent/List reply."""
+    components = Batch.of(Component)
+    values = Batch.of(Value)
+    for data in uncertaintyComponents:
+        components.add_json(data, uncertaintyBudgetId)
+        componentId = data.get("Id")
+        for value in data.get("UncertaintyValues") or ():
+            values.add_json(value, componentId)
+    return components, values
@@ -0,0 +1,297 @@
+"""On-disk cache of the raw JSON payloads fetched from Qualer.
+
+Payloads are stored gzip-compressed under the SHA-256 of their content, so
+the thousands of identical empty replies from the ServiceGroup x Technique
+matrix take one file. A JSON-lines index maps each request (URL plus form
+fields, minus the anti-forgery token) to the object holding its reply, the
+same append-and-compact scheme as ``pairIndex``.
+
+Modes:
+
+* ``off``    - no caching
+* ``record`` - always fetch, and store every reply (the default)
+* ``use``    - serve replies younger than the TTL, fetch and store the rest
+* ``replay`` - serve from the cache only; a miss raises ``CacheMiss``
+
+Replies consumed in chunks (``stream``) are stored as they arrive, byte for
+byte, and are only indexed once they have been read to the end.
+
+Entries older than the TTL are evicted when the cache is opened, and the
+oldest ones after that while the objects exceed ``max_mb``. A cache opened
+for ``replay`` is left as it is, however old, so a recording can be replayed
+again.
+"""
+
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import metrics
+
+MODES = ("off", "record", "use", "replay")
+DEFAULT_TTL_DAYS = 30
+CHUNK_BYTES = 64 * 1024
+# Form fields that change per request without changing the reply
+_VOLATILE_FIELDS = {"__RequestVerificationToken"}
+_stream_ids = itertools.count()
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def request_key(url, data=None):
+    """Canonical key for a GET of ``url`` or a POST of ``data`` to it."""
+    parts = urlsplit(url)
+    query = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    key = f"{parts.scheme}://{parts.netloc}{parts.path}?{urlencode(query)}"
+    if data is not None:
+        form = sorted((k, v) for k, v in data.items() if k not in _VOLATILE_FIELDS)
+        key = f"POST {key} {urlencode(form)}"
+    return key
+
+
+class ResponseCache:
+    """Content-addressed store of decoded JSON replies; safe to share between workers.
+
+    A cache starts closed (mode ``off``); ``open`` points it at a directory.
+    """
+
+    def __init__(self):
+        self.mode = "off"
+        self.directory = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def replay(self):
+        return self.mode == "replay"
+
+    def open(self, directory, mode="record", ttl_days=DEFAULT_TTL_DAYS, max_mb=None):
+        """Start caching under ``directory``; returns the cache for ``with``."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown response cache mode {mode!r}")
+        self.close()
+        if mode == "off":
+            return self
+        self.mode = mode
+        self.directory = directory
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.max_bytes = max_mb * 2**20 if max_mb else None
+        self.index_path = os.path.join(directory, "index.jsonl")
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._load()
+        self._file = open(self.index_path, "a", encoding="utf-8")
+        return self
+
+    def fetch(self, url, load, data=None):
+        """Payload for ``url`` (and form ``data``); ``load()`` fetches it on a miss."""
+        if self.mode == "off":
+            return load()
+        key = request_key(url, data)
+        if self.mode in ("use", "replay"):
+            payload = self.get(key, fresh=self.mode == "use")
+            if payload is not None:
+                self.hits += 1
+                metrics.count("response_cache_total", result="hit")
+                return payload
+            if self.replay:
+                raise CacheMiss(f"{key} is not in the response cache")
+        self.misses += 1
+        metrics.count("response_cache_total", result="miss")
+        payload = load()
+        self.put(key, payload)
+        return payload
+
+    def stream(self, url, load, data=None):
+        """Like ``fetch`` for a reply read in byte chunks; ``load()`` returns the chunks."""
+        if self.mode == "off":
+            yield from load()
+            return
+        key = request_key(url, data)
+        if self.mode in ("use", "replay"):
+            path = self._lookup(key, fresh=self.mode == "use")
+            if path is not None:
+                try:
+                    f = gzip.open(path, "rb")
+                except OSError:
+                    f = None  # Object removed; fetch it again
+                if f is not None:
+                    self.hits += 1
+                    metrics.count("response_cache_total", result="hit")
+                    with f:
+                        yield from iter(lambda: f.read(CHUNK_BYTES), b"")
+                    return
+            if self.replay:
+                raise CacheMiss(f"{key} is not in the response cache")
+        self.misses += 1
+        metrics.count("response_cache_total", result="miss")
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.directory, f".stream-{os.getpid()}-{next(_stream_ids)}.tmp")
+        try:
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                for chunk in load():
+                    digest.update(chunk)
+                    f.write(chunk)
+                    yield chunk
+        except BaseException:
+            # A reply that was not read to the end is not worth keeping
+            os.remove(tmp_path)
+            raise
+        self._store(key, digest.hexdigest(), tmp_path)
+
+    def get(self, key, fresh=True, now=None):
+        path = self._lookup(key, fresh, now)
+        if path is None:
+            return None
+        try:
+            with gzip.open(path, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None  # Object removed or truncated; fetch it again
+
+    def put(self, key, payload):
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        tmp_path = None
+        if not os.path.exists(self._object_path(digest)):
+            tmp_path = f"{self._object_path(digest)}.{threading.get_ident()}.tmp"
+            os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(body)
+        self._store(key, digest, tmp_path)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        self.mode = "off"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _lookup(self, key, fresh=True, now=None):
+        """Path of the object holding the reply to ``key``, or None if absent or stale."""
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        digest, stored = entry
+        if fresh and (now or time.time()) - stored >= self.ttl:
+            return None
+        return self._object_path(digest)
+
+    def _store(self, key, digest, tmp_path=None):
+        """Index ``key`` under ``digest``, moving the compressed ``tmp_path`` into place."""
+        path = self._object_path(digest)
+        if tmp_path is not None:
+            if os.path.exists(path):
+                os.remove(tmp_path)  # Identical content is already stored
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+        stored = time.time()
+        with self._lock:
+            self.entries[key] = (digest, stored)
+            self._file.write(_encode(key, digest, stored))
+            self._file.flush()
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.json.gz")
+
+    def _load(self, now=None):
+        self.entries = {}
+        lines = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Partially written line from an interrupted run
+                    lines += 1
+                    self.entries[entry["key"]] = (entry["object"], entry["stored"])
+        if self.replay:
+            return  # A recording is read, never pruned
+        evicted = self._evict(now or time.time())
+        if evicted or lines > 2 * len(self.entries):
+            self._compact()
+
+    def _evict(self, now):
+        """Drop expired entries, then the oldest while over ``max_bytes``."""
+        before = len(self.entries)
+        self.entries = {
+            key: (digest, stored)
+            for key, (digest, stored) in self.entries.items()
+            if now - stored < self.ttl
+        }
+        sizes = self._object_sizes()
+        references = Counter(digest for digest, _ in self.entries.values())
+        if self.max_bytes:
+            total = sum(sizes.get(digest, 0) for digest in references)
+            for key, (digest, _) in sorted(self.entries.items(), key=lambda e: e[1][1]):
+                if total <= self.max_bytes:
+                    break
+                del self.entries[key]
+                references[digest] -= 1
+                if not references[digest]:  # Only now does the object free space
+                    del references[digest]
+                    total -= sizes.get(digest, 0)
+        referenced = set(references)
+        for digest in set(sizes) - referenced:
+            os.remove(self._object_path(digest))
+        return len(self.entries) < before
+
+    def _object_sizes(self):
+        sizes = {}
+        objects = os.path.join(self.directory, "objects")
+        for prefix in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, prefix)):
+                if name.endswith(".json.gz"):
+                    path = os.path.join(objects, prefix, name)
+                    sizes[name[: -len(".json.gz")]] = os.path.getsize(path)
+        return sizes
+
+    def _compact(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, (digest, stored) in self.entries.items():
+                f.write(_encode(key, digest, stored))
+        os.replace(tmp_path, self.index_path)
+
+
+def _encode(key, digest, stored):
+    return json.dumps({"key": key, "object": digest, "stored": stored}) + "\n"
+
+
+def add_arguments(parser):
+    """The response cache options shared by the crawl scripts."""
+    parser.add_argument(
+        "--responses",
+        choices=MODES,
+        default="record",
+        help="Response cache mode: record replies, use fresh ones, or replay "
+        "from the cache without contacting Qualer (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--response-ttl-days",
+        type=float,
+        default=DEFAULT_TTL_DAYS,
+        help="Cached replies older than this are refetched and evicted (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--response-cache-mb",
+        type=float,
+        help="Evict the oldest cached replies beyond this size (default: no limit)",
+    )
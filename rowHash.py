@@ -0,0 +1,85 @@
+"""Stable content hashes of table rows, for telling what changed between loads.
+
+Every row the loaders upsert or replace carries a ``RowHash`` column: a
+BLAKE2b digest of its non-null ``column=value`` pairs, taken in column-name
+order. The hash therefore does not depend on column order, on a column being
+added with no values yet, or on whether a number arrived as ``12`` (JSON) or
+``12.0`` (a pandas column with gaps), so the same Qualer row hashes the same
+whichever crawl or CSV it was loaded from. Strings, numbers and booleans are
+tagged, so ``"12"`` and ``12`` do not collide.
+"""
+
+import hashlib
+import json
+import numbers
+
+HASH_COLUMN = "RowHash"
+
+
+def _canonical(value):
+    """Text for one non-null value, or None for a null of any flavour."""
+    kind = type(value)
+    if kind is str:
+        return "s" + value
+    if kind is bool:
+        return "b1" if value else "b0"
+    if kind is int:
+        return f"n{value}"
+    if kind is float:
+        if value != value:
+            return None
+        return f"n{int(value)}" if value.is_integer() else f"n{value!r}"
+    if kind is dict or kind is list:
+        return "j" + json.dumps(value, sort_keys=True)
+    # numpy/pandas scalars, as read back from the crawl CSVs
+    if getattr(getattr(value, "dtype", None), "kind", "") == "b":
+        return "b1" if value else "b0"
+    if isinstance(value, numbers.Integral):
+        return f"n{int(value)}"
+    if isinstance(value, numbers.Real):
+        return _canonical(float(value))
+    import pandas as pd
+
+    if pd.isna(value):
+        return None
+    return "s" + str(value)
+
+
+def _digest(names, values):
+    parts = []
+    for name, value in zip(names, values):
+        if value is not None:
+            text = _canonical(value)
+            if text is not None:
+                parts.append(f"{name}\x1e{text}")
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def row_hash(names, values):
+    """Hex digest of one row given as parallel ``names`` and ``values``."""
+    pairs = sorted(zip(names, values), key=lambda pair: pair[0])
+    return _digest([name for name, _ in pairs], [value for _, value in pairs])
+
+
+def hash_rows(columns, rows):
+    """Add ``RowHash`` to ``columns`` (a {name: type} dict) and to each row.
+
+    Returns the new columns and an iterator of rows with the hash appended.
+    A ``RowHash`` already in the input is recomputed, not trusted.
+    """
+    names = tuple(columns)
+    keep = [i for i, name in enumerate(names) if name != HASH_COLUMN]
+    order = sorted(keep, key=names.__getitem__)
+    order_names = [names[i] for i in order]
+    hashed = {names[i]: columns[names[i]] for i in keep}
+    hashed[HASH_COLUMN] = "TEXT"
+
+    def rows_with_hash():
+        for row in rows:
+            digest = _digest(order_names, [row[i] for i in order])
+            if len(keep) == len(names):
+                yield (*row, digest)
+            else:
+                yield (*(row[i] for i in keep), digest)
+
+    return hashed, rows_with_hash()
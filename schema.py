@@ -0,0 +1,74 @@
+"""Column types and natural keys for the tables the crawlers and loaders write.
+
+Types and keys follow ``uncertainty_budgets.sql`` (dates stay TEXT there) and
+the shapes saved under ``json/``. Columns that are not listed here are typed
+from the data when a table is first created.
+"""
+
+TABLE_COLUMNS = {
+    "uncertainty_budgets": {
+        "UncertaintyBudgetId": "BIGINT",
+        "BudgetName": "TEXT",
+        "ComponentsCount": "BIGINT",
+        "ActivationDate": "TEXT",
+        "ExpirationDate": "TEXT",
+        "SiteId": "BIGINT",
+    },
+    "uncertainty_budget_service_groups": {
+        "UncertaintyBudgetId": "BIGINT",
+        "ServiceGroupId": "BIGINT",
+    },
+    "uncertainty_budget_techniques": {
+        "UncertaintyBudgetId": "BIGINT",
+        "TechniqueId": "BIGINT",
+    },
+    "service_groups": {
+        "ServiceGroupId": "BIGINT",
+    },
+    "service_capabilities": {
+        "ServiceGroupId": "BIGINT",
+        "ServiceCategoryId": "BIGINT",
+        "RootCategoryId": "BIGINT",
+        "CategoryName": "TEXT",
+        "ServiceGroupName": "TEXT",
+        "Visibility": "INTEGER",
+        "IsServiceTemplate": "BOOLEAN",
+        "IsOrderTemplate": "BOOLEAN",
+        "ApplyAsMaster": "BOOLEAN",
+        "OrderItemCount": "INTEGER",
+        "ServiceLevelCount": "INTEGER",
+        "ServicePriceCount": "INTEGER",
+    },
+    "techniques": {
+        "TechniqueId": "BIGINT",
+    },
+    "capabilities": {
+        "TechniqueId": "BIGINT",
+    },
+    "uncertainty_components": {
+        "Id": "BIGINT",
+        "UncertaintyBudgetId": "BIGINT",
+    },
+    "uncertainty_values": {
+        "Id": "BIGINT",
+        "UncertaintyComponentId": "BIGINT",
+    },
+}
+
+# Dates kept as TEXT in PostgreSQL (ISO 8601, as Qualer sends them) that the
+# columnar export types as timestamps
+DATE_COLUMNS = ("ActivationDate", "ExpirationDate")
+
+# Natural keys used for ON CONFLICT upserts. Tables without one (capabilities)
+# are replaced per technique instead.
+TABLE_KEYS = {
+    "uncertainty_budgets": ("UncertaintyBudgetId",),
+    "uncertainty_budget_service_groups": ("UncertaintyBudgetId", "ServiceGroupId"),
+    "uncertainty_budget_techniques": ("UncertaintyBudgetId", "TechniqueId"),
+    "service_groups": ("ServiceGroupId",),
+    "service_capabilities": ("ServiceGroupId",),
+    "techniques": ("TechniqueId",),
+    "uncertainty_components": ("Id",),
+    "uncertainty_values": ("Id",),
+}
+
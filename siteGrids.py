@@ -0,0 +1,138 @@
+"""Qualer's site-level grid endpoints, read page by page.
+
+``Uncertainty/UncertaintyBudget_Read`` and
+``CertificationCapability/Capabilities_Read`` back Kendo UI grids. Given a
+``siteId`` and empty ``group`` and ``filter`` they answer the whole site in
+one reply, ``{"Data": [...], "Total": n}``, where the crawlers otherwise ask
+once per technique or per ServiceGroup/Technique pair. Given ``page`` and
+``pageSize`` as well they answer one page, still with the site total, so
+after the first page the others are fetched side by side. Pages are cut by
+offset, so they are read under a fixed ``sort``. A server that ignores the
+paging answers everything on the first page, which ends the read there.
+
+A read is complete when its rows add up to the total. Only a complete read
+of every site may stand in for the per-unit reads of what it does not list;
+``site_ids`` says whether the sites are known to be all of them.
+
+The grids name techniques rather than giving their IDs, so rows are tied
+back to ``TechniquesList`` by name.
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from qualerClient import with_retries
+
+# The lab's site, as in getAllBudgets.sh and cmcs.sh
+SITE_ID = 96552
+DEFAULT_PAGE_SIZE = 500
+BUDGET_LISTING_PATH = "/Uncertainty/UncertaintyBudget_Read"
+# Kendo sort strings ("Field-dir~Field-dir") that keep the pages of a read apart
+BUDGET_SORT = "UncertaintyBudgetId-asc"
+CAPABILITY_SORT = "TechniqueName-asc~Parameter-asc~RangeMin-asc~RangeMax-asc"
+
+
+def grid_form(page=None, page_size=None, sort=""):
+    """Form fields for one page of a grid, or for all of it without ``page_size``."""
+    form = {"sort": sort, "group": "", "filter": ""}
+    if page_size:
+        form.update(page=page, pageSize=page_size)
+    return form
+
+
+def read_pages(fetch_page, page_size, concurrency=4, sort=""):
+    """``(rows, complete)``: the rows of every page, in order, and whether they add up to the total.
+
+    ``fetch_page(form)`` returns a decoded reply. The first page gives the
+    total; the rest are fetched ``concurrency`` at a time.
+    """
+    first = fetch_page(grid_form(1, page_size, sort))
+    rows = list(first.get("Data") or [])
+    total = first.get("Total")
+    if page_size and total is not None and page_size <= len(rows) < total:
+        pages = range(2, math.ceil(total / page_size) + 1)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for reply in executor.map(
+                lambda page: fetch_page(grid_form(page, page_size, sort)), pages
+            ):
+                rows.extend(reply.get("Data") or [])
+    return rows, total is not None and len(rows) == total
+
+
+def read_budget_listing(
+    base_url, siteId, post_form, page_size=DEFAULT_PAGE_SIZE, concurrency=4, retries=3
+):
+    """``(rows, complete)`` of a site's ``UncertaintyBudget_Read`` listing, read page by page.
+
+    ``post_form(url, form, token_url)`` posts ``form`` with the anti-forgery
+    token of the page at ``token_url`` and returns the decoded reply. Each
+    page is retried on its own.
+    """
+    url = f"{base_url}{BUDGET_LISTING_PATH}?siteId={siteId}"
+    token_url = f"{base_url}/Uncertainty/UncertaintyBudgets?siteId={siteId}"
+
+    def fetch_page(form):
+        return with_retries(partial(post_form, url, form, token_url), BUDGET_LISTING_PATH, retries)
+
+    return read_pages(fetch_page, page_size, concurrency, BUDGET_SORT)
+
+
+def technique_ids_by_name(techniques):
+    """{name: [TechniqueId, ...]} for a TechniquesList reply; names may repeat."""
+    ids = {}
+    for technique in techniques:
+        ids.setdefault(technique.get("Name"), []).append(technique["TechniqueId"])
+    return ids
+
+
+def query_site_ids(engine):
+    """The sites that own stored uncertainty budgets; none before the first load."""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT to_regclass('uncertainty_budgets')")
+        if cursor.fetchone()[0] is None:
+            return []
+        cursor.execute(
+            'SELECT DISTINCT "SiteId" FROM uncertainty_budgets '
+            'WHERE "SiteId" IS NOT NULL ORDER BY "SiteId"'
+        )
+        return [siteId for (siteId,) in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def site_ids(args, engine):
+    """``(sites, complete)``: the sites to read the grids of, and whether they are all of them.
+
+    Sites given with ``--site-id`` are taken as complete. Otherwise they are
+    the sites that own stored budgets, else QUALER_SITE_ID or ``SITE_ID``
+    before the first load; either may lack a site that is new since then.
+    """
+    if args.site_id:
+        return args.site_id, True
+    return query_site_ids(engine) or [int(os.getenv("QUALER_SITE_ID", SITE_ID))], False
+
+
+def add_arguments(parser):
+    """``--site-id``, ``--page-size`` and ``--no-bulk`` options of the crawl scripts."""
+    parser.add_argument(
+        "--site-id",
+        type=int,
+        action="append",
+        help="Site to read the site-level grids for; the sites given are taken as all of them "
+        f"(default: the sites in the database, else QUALER_SITE_ID or {SITE_ID})",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="Rows per page of a site-level grid; 0 reads it in one request "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-bulk",
+        action="store_true",
+        help="Skip the site-level grids and ask for every unit on its own",
+    )
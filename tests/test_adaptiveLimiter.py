@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from adaptiveLimiter import AdaptiveLimiter, backoff_delay
+from qualerClient import Overloaded, get_json, retry_after_seconds
+
+
+def _response(status, headers=None):
+    response = MagicMock(status_code=status, url="https://jgiquality.qualer.com/x")
+    response.headers = headers or {}
+    response.json.return_value = {"Data": []}
+    return response
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_starts_halfway_and_climbs_to_the_ceiling(self):
+        limiter = AdaptiveLimiter(ceiling=8)
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(200):
+            limiter.acquire()
+            limiter.release(0.05)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_errors_and_slow_replies_halve_the_limit(self):
+        limiter = AdaptiveLimiter(ceiling=8, slow_seconds=1)
+        limiter.acquire()
+        limiter.release(0.05, ok=False)
+        self.assertEqual(limiter.limit, 2)
+
+        limiter._last_decrease = 0  # A round trip later
+        limiter.acquire()
+        limiter.release(5.0)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_a_burst_of_errors_cuts_once(self):
+        limiter = AdaptiveLimiter(ceiling=8)
+        for _ in range(4):
+            limiter.acquire()
+        for _ in range(4):
+            limiter.release(0.05, ok=False)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.decreases, 1)
+
+    def test_never_below_the_floor(self):
+        limiter = AdaptiveLimiter(ceiling=2, floor=1)
+        for _ in range(5):
+            limiter._last_decrease = 0
+            limiter.acquire()
+            limiter.release(0.05, ok=False)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_in_flight_requests_stay_within_the_limit(self):
+        limiter = AdaptiveLimiter(ceiling=3)
+        limiter.limit = 2
+        peak = 0
+        lock = threading.Lock()
+
+        def request():
+            nonlocal peak
+            limiter.acquire()
+            with lock:
+                peak = max(peak, limiter.in_flight)
+            time.sleep(0.01)
+            limiter.release(0.01)
+
+        threads = [threading.Thread(target=request) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The limit grows with each success, but never past the ceiling
+        self.assertLessEqual(peak, 3)
+
+    def test_pause_holds_new_requests(self):
+        limiter = AdaptiveLimiter(ceiling=4)
+        limiter.pause(0.2)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_backoff_delay(self):
+        for attempt in range(5):
+            delay = backoff_delay(attempt)
+            self.assertGreaterEqual(delay, 2**attempt / 2)
+            self.assertLessEqual(delay, 2**attempt)
+        self.assertEqual(backoff_delay(0, retry_after=7), 7)
+        self.assertLessEqual(backoff_delay(10), 60)
+
+
+class TestThrottledReplies(unittest.TestCase):
+
+    def test_429_raises_overloaded_and_pauses_the_limiter(self):
+        session = MagicMock()
+        session.request.return_value = _response(429, {"Retry-After": "3"})
+        limiter = AdaptiveLimiter(ceiling=4)
+
+        with self.assertRaises(Overloaded) as raised:
+            get_json(session, "https://jgiquality.qualer.com/x", limiter=limiter)
+
+        self.assertEqual(raised.exception.retry_after, 3)
+        self.assertGreater(limiter._resume_at, time.monotonic() + 2)
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_healthy_reply_raises_the_limit(self):
+        session = MagicMock()
+        session.request.return_value = _response(200)
+        limiter = AdaptiveLimiter(ceiling=4)
+
+        payload = get_json(session, "https://jgiquality.qualer.com/x", limiter=limiter)
+        self.assertEqual(payload, {"Data": []})
+        self.assertGreater(limiter.limit, 2)
+
+    def test_retry_after_formats(self):
+        self.assertEqual(retry_after_seconds("12"), 12)
+        self.assertIsNone(retry_after_seconds(None))
+        self.assertIsNone(retry_after_seconds("soon"))
+        self.assertEqual(retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
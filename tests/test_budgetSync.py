@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from budgetSync import load_state, plan_sync, save_state, synced_metadata
+
+NOW = datetime(2025, 3, 1)
+
+
+def load_listing():
+    with open(os.path.join("json", "budgets.json"), encoding="utf-8") as f:
+        return json.load(f)["Data"]
+
+
+class TestBudgetSync(unittest.TestCase):
+
+    def test_first_sync_fetches_everything(self):
+        listing = load_listing()
+        to_fetch, removed = plan_sync(listing, {}, now=NOW)
+
+        self.assertEqual(len(to_fetch), len({b["UncertaintyBudgetId"] for b in listing}))
+        self.assertEqual(set(to_fetch.values()), {"new"})
+        self.assertEqual(removed, set())
+
+    def test_unchanged_budgets_are_skipped(self):
+        listing = load_listing()
+        state = {b["UncertaintyBudgetId"]: synced_metadata(b, NOW) for b in listing}
+
+        to_fetch, removed = plan_sync(listing, state, now=NOW)
+
+        self.assertEqual(to_fetch, {})
+        self.assertEqual(removed, set())
+
+    def test_changed_expiring_and_removed(self):
+        listing = [
+            {"UncertaintyBudgetId": 1, "ActivationDate": "2024-01-01T00:00:00",
+             "ExpirationDate": "2030-01-01T00:00:00"},
+            {"UncertaintyBudgetId": 2, "ActivationDate": "2024-01-01T00:00:00",
+             "ExpirationDate": "2025-03-10T00:00:00"},
+            {"UncertaintyBudgetId": 3, "ActivationDate": "2024-01-01T00:00:00",
+             "ExpirationDate": "2030-01-01T00:00:00", "ComponentsCount": 5},
+        ]
+        state = {
+            1: synced_metadata(listing[0], datetime(2024, 6, 1)),
+            2: synced_metadata(listing[1], datetime(2024, 6, 1)),
+            3: {**synced_metadata(listing[2], datetime(2024, 6, 1)), "ComponentsCount": 4},
+            4: synced_metadata(listing[0], datetime(2024, 6, 1)),
+        }
+
+        to_fetch, removed = plan_sync(listing, state, expiring_days=30, now=NOW)
+
+        self.assertEqual(to_fetch, {2: "expiring", 3: "changed"})
+        self.assertEqual(removed, {4})
+
+        # Once synced inside the window an expiring budget is left alone
+        state[2] = synced_metadata(listing[1], NOW)
+        to_fetch, _ = plan_sync(listing, state, expiring_days=30, now=NOW)
+        self.assertNotIn(2, to_fetch)
+
+    def test_state_round_trip(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "state.json")
+            self.assertEqual(load_state(path), {})
+            save_state({7: {"ExpirationDate": "2030-01-01T00:00:00"}}, path)
+            self.assertEqual(load_state(path), {7: {"ExpirationDate": "2030-01-01T00:00:00"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+from unittest.mock import MagicMock
+import pandas as pd
+from bulkLoad import (
+    _ensure_history,
+    added_rows_sql,
+    changed_rows_sql,
+    copy_sql,
+    create_history_sql,
+    create_table_sql,
+    dataframe_columns,
+    encode_field,
+    encode_rows,
+    peek_columns,
+    record_columns,
+    removed_rows_sql,
+    surplus_rows_sql,
+    upsert_sql,
+)
+
+
+class TestBulkLoad(unittest.TestCase):
+
+    def test_encode_field_distinguishes_null_and_empty(self):
+        self.assertEqual(encode_field(None), "")
+        self.assertEqual(encode_field(float("nan")), "")
+        self.assertEqual(encode_field(pd.NA), "")
+        self.assertEqual(encode_field(""), '""')
+        self.assertEqual(encode_field('a "b", c'), '"a ""b"", c"')
+        self.assertEqual(encode_field(True), "True")
+        self.assertEqual(encode_field(12), "12")
+        self.assertEqual(encode_field(0.1), "0.1")
+
+    def test_encode_rows_chunks(self):
+        chunks = list(encode_rows(([i, "x"] for i in range(5)), chunk_rows=2))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0], '0,"x"\n1,"x"\n')
+
+    def test_record_columns_prefer_declared_types(self):
+        records = [
+            {"UncertaintyBudgetId": 1, "ComponentsCount": None, "Extra": None},
+            {"UncertaintyBudgetId": 2, "ComponentsCount": 3, "Extra": 1.5},
+        ]
+        self.assertEqual(
+            record_columns("uncertainty_budgets", records),
+            {
+                "UncertaintyBudgetId": "BIGINT",
+                "ComponentsCount": "BIGINT",
+                "Extra": "DOUBLE PRECISION",
+            },
+        )
+
+    def test_peek_columns_reads_only_the_sample(self):
+        consumed = []
+
+        def rows():
+            for i in range(10):
+                consumed.append(i)
+                yield {"Id": i, "Name": None if i < 3 else "x"}
+
+        columns, records = peek_columns("capabilities", rows(), sample_rows=4)
+        self.assertEqual(columns, {"Id": "BIGINT", "Name": "TEXT"})
+        self.assertEqual(len(consumed), 4)
+        self.assertEqual([r["Id"] for r in records], list(range(10)))
+
+    def test_dataframe_columns(self):
+        df = pd.DataFrame({"Id": [1.0, None], "Name": ["a", "b"], "Flag": [True, False]})
+        self.assertEqual(
+            dataframe_columns("uncertainty_components", df),
+            {"Id": "BIGINT", "Name": "TEXT", "Flag": "BOOLEAN"},
+        )
+
+    def test_sql(self):
+        columns = {"Id": "BIGINT", 'Odd"Name': "TEXT"}
+        self.assertEqual(
+            create_table_sql("t", columns),
+            'CREATE TABLE IF NOT EXISTS "t" ("Id" BIGINT, "Odd""Name" TEXT)',
+        )
+        self.assertEqual(
+            copy_sql("t", columns),
+            'COPY "t" ("Id", "Odd""Name") FROM STDIN WITH (FORMAT csv)',
+        )
+
+    def test_upsert_compares_hashes(self):
+        sql = upsert_sql("t", {"Id": "BIGINT", "Name": "TEXT", "RowHash": "TEXT"}, ("Id",), "s")
+        self.assertTrue(sql.endswith('WHERE t."RowHash" IS DISTINCT FROM EXCLUDED."RowHash"'))
+        sql = upsert_sql("t", {"Id": "BIGINT", "Name": "TEXT"}, ("Id",), "s")
+        self.assertTrue(sql.endswith('WHERE ROW(t."Name") IS DISTINCT FROM ROW(EXCLUDED."Name")'))
+
+    def test_keyless_diff_counts_copies(self):
+        # Rows are numbered within their hash and compared with the other side's count
+        columns = {"TechniqueId": "BIGINT", "Name": "TEXT", "RowHash": "TEXT"}
+        removed = surplus_rows_sql("t", ("TechniqueId",), "s", "TechniqueId")
+        added = added_rows_sql("t", columns, "s", "TechniqueId")
+        for sql in (removed, added):
+            self.assertIn('row_number() OVER (PARTITION BY "RowHash" ORDER BY ctid)', sql)
+            self.assertIn("count(*) AS copies", sql)
+            self.assertEqual(sql.count("%s"), 1)
+        self.assertIn("WHERE t.ctid = d.row_id AND d.copy > COALESCE(c.copies, 0)", removed)
+        self.assertIn("WHERE s._copy > COALESCE(c.copies, 0)", added)
+        self.assertIn('SELECT s."TechniqueId", s."Name", s."RowHash" FROM staged s', added)
+
+    def test_history_sql(self):
+        self.assertEqual(
+            create_history_sql("t", {"Id": "BIGINT"}),
+            'CREATE TABLE IF NOT EXISTS "t_history" ("ChangeId" BIGSERIAL PRIMARY KEY, '
+            '"Id" BIGINT, "Change" TEXT NOT NULL, "RowHash" TEXT, "PreviousHash" TEXT, '
+            '"Row" JSONB, "ChangedAt" TIMESTAMPTZ NOT NULL DEFAULT now())',
+        )
+        history = 'INSERT INTO "t_history" ("A", "B", "Change", "RowHash", "PreviousHash", "Row") '
+
+        changed = changed_rows_sql("t", ("A", "B"), "s")
+        self.assertTrue(changed.startswith(history))
+        # The last staged copy of a key is the one upserted, so it is the one recorded
+        self.assertIn(
+            '(SELECT DISTINCT ON ("A", "B") * FROM "s" ORDER BY "A", "B", ctid DESC)', changed
+        )
+        self.assertIn("CASE WHEN t.ctid IS NULL THEN 'added' ELSE 'changed' END", changed)
+        self.assertIn('LEFT JOIN "t" t ON t."A" = s."A" AND t."B" = s."B"', changed)
+        self.assertTrue(
+            changed.endswith('WHERE t.ctid IS NULL OR t."RowHash" IS DISTINCT FROM s."RowHash"')
+        )
+
+        removed = removed_rows_sql("t", ("A", "B"), "s")
+        self.assertTrue(
+            removed.startswith(
+                'WITH gone AS (DELETE FROM "t" t WHERE NOT EXISTS '
+                '(SELECT 1 FROM "s" s WHERE s."A" = t."A" AND s."B" = t."B") RETURNING t.*) '
+                + history
+            )
+        )
+        self.assertTrue(
+            removed.endswith(
+                "SELECT \"A\", \"B\", 'removed', NULL, \"RowHash\", "
+                "to_jsonb(gone) - 'RowHash' FROM gone"
+            )
+        )
+        self.assertNotIn("%s", removed)
+
+        added = added_rows_sql("t", {"A": "BIGINT", "RowHash": "TEXT"}, "s", "A")
+        self.assertIn(
+            'INSERT INTO "t_history" ("A", "Change", "RowHash", "PreviousHash", "Row")', added
+        )
+        self.assertTrue(
+            added.endswith(
+                "SELECT \"A\", 'added', \"RowHash\", NULL, to_jsonb(added) - 'RowHash' FROM added"
+            )
+        )
+
+    def test_ensure_history(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (1, "t_history")
+        _ensure_history(cursor, "t", {"Id": "BIGINT"})
+        # Both exist: checked without taking a lock
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertEqual(cursor.execute.call_args[0][1], ('"t"', "RowHash", '"t_history"'))
+
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (None, None)
+        _ensure_history(cursor, "t", {"Id": "BIGINT"})
+        statements = [call[0][0] for call in cursor.execute.call_args_list]
+        self.assertEqual(statements[1], "SELECT pg_advisory_xact_lock(hashtext(%s))")
+        self.assertEqual(statements[2], 'ALTER TABLE "t" ADD COLUMN IF NOT EXISTS "RowHash" TEXT')
+        self.assertEqual(statements[3], create_history_sql("t", {"Id": "BIGINT"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
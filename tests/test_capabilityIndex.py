@@ -0,0 +1,128 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+from capabilityIndex import CapabilityIndex, IndexCache, load_capabilities
+from records import Capability
+
+
+def _capability(low, high, uncertainty, unit="V", parameter="DC Voltage", techniqueId=1):
+    row = {
+        "Parameter": parameter,
+        "RangeMin": low,
+        "RangeMax": high,
+        "Unit": unit,
+        "Uncertainty": uncertainty,
+        "UncertaintyUnit": "%",
+    }
+    return Capability.from_json(row, TechniqueId=techniqueId)
+
+
+CAPABILITIES = [
+    _capability(10.0, 100.0, 0.02),
+    _capability(0.0, 10.0, 0.01),
+    _capability(100.0, None, 0.05),
+    _capability(0.0, 1000.0, 0.5, unit="mV"),
+    _capability(0.0, 50.0, 0.1, parameter="AC Voltage"),
+    _capability(0.0, 50.0, 0.3, techniqueId=2),
+]
+BUDGETS = [
+    (1, 7, "2019-03-12T00:00:00", "2034-03-12T00:00:00"),
+    (1, 8, "2019-03-12T00:00:00", "2020-03-12T00:00:00"),
+    (1, 9, None, None),
+]
+
+
+class TestCapabilityIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = CapabilityIndex.build(CAPABILITIES, BUDGETS)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.lookup(1, "DC Voltage", 5, unit="V").get("Uncertainty"), 0.01)
+        self.assertEqual(self.index.lookup(1, "dc  voltage", 50, unit="V").get("Uncertainty"), 0.02)
+        # Open upper bound
+        self.assertEqual(self.index.lookup(1, "DC Voltage", 1e6).get("Uncertainty"), 0.05)
+        self.assertIsNone(self.index.lookup(1, "DC Voltage", -1, unit="V"))
+        self.assertIsNone(self.index.lookup(3, "DC Voltage", 5))
+
+    def test_shared_bound_and_overlaps(self):
+        self.assertEqual(self.index.lookup(1, "DC Voltage", 10, unit="V").get("Uncertainty"), 0.02)
+        found = self.index.matches(1, "DC Voltage", 10)
+        self.assertEqual(found[0].get("Uncertainty"), 0.02)
+        self.assertEqual(sorted(c.get("Uncertainty") for c in found), [0.01, 0.02, 0.5])
+        self.assertEqual(len(self.index.matches(1, "DC Voltage", 10, unit="mV")), 1)
+
+    def test_parameters_and_active_budgets(self):
+        self.assertEqual(self.index.parameters(1), ["ac voltage", "dc voltage"])
+        self.assertEqual(self.index.budgets(1, on=datetime.date(2025, 1, 1)), [7, 9])
+        self.assertEqual(self.index.budgets(1, on=datetime.date(2019, 6, 1)), [7, 8, 9])
+
+    def test_replace_technique_leaves_the_snapshot_alone(self):
+        replaced = self.index.replace_technique(1, [_capability(0.0, 10.0, 0.9)])
+        self.assertEqual(replaced.lookup(1, "DC Voltage", 5).get("Uncertainty"), 0.9)
+        self.assertIsNone(replaced.lookup(1, "AC Voltage", 5))
+        self.assertEqual(replaced.lookup(2, "DC Voltage", 5).get("Uncertainty"), 0.3)
+        self.assertEqual(self.index.lookup(1, "DC Voltage", 5, unit="V").get("Uncertainty"), 0.01)
+        self.assertEqual(replaced.budgets(1), [])
+
+
+def _engine(names, rows):
+    """An engine whose queries describe ``names`` and return ``rows``."""
+    cursor = MagicMock(description=[(name,) for name in names])
+    cursor.fetchone.return_value = ("capabilities",)
+    cursor.fetchall.return_value = rows
+    engine = MagicMock()
+    engine.raw_connection.return_value.cursor.return_value = cursor
+    return engine
+
+
+class TestLoadCapabilities(unittest.TestCase):
+
+    def test_rows_keep_the_columns_the_table_has(self):
+        names = ["Parameter", "RangeMin", "RangeMax", "Tolerance", "TechniqueId", "RowHash"]
+        (row,) = load_capabilities(_engine(names, [("DC Voltage", 0.0, 10.0, 0.2, 1, "ab")]))
+
+        self.assertEqual(row.TechniqueId, 1)
+        self.assertEqual(row.get("Tolerance"), 0.2)
+        self.assertIsNone(row.get("Unit"))
+        self.assertIsNone(row.get("RowHash"))
+
+    def test_missing_range_columns_are_named(self):
+        engine = _engine(["Parameter", "Low", "High", "TechniqueId"], [("DC Voltage", 0, 1, 1)])
+        with self.assertRaisesRegex(ValueError, "RangeMin, RangeMax"):
+            load_capabilities(engine)
+
+
+class TestIndexCache(unittest.TestCase):
+
+    @patch("capabilityIndex.load_budgets", return_value=[])
+    @patch("capabilityIndex.load_capabilities")
+    def test_invalidate_reloads_one_technique(self, load_capabilities, load_budgets):
+        load_capabilities.return_value = CAPABILITIES
+        cache = IndexCache(engine=None)
+        first = cache.get()
+        self.assertIs(cache.get(), first)
+        load_capabilities.assert_called_once_with(None)
+
+        load_capabilities.return_value = [_capability(0.0, 10.0, 0.9, techniqueId=2)]
+        cache.invalidate(2)
+        second = cache.get()
+        load_capabilities.assert_called_with(None, 2)
+        self.assertEqual(second.lookup(2, "DC Voltage", 5).get("Uncertainty"), 0.9)
+        self.assertEqual(second.lookup(1, "DC Voltage", 5, unit="V").get("Uncertainty"), 0.01)
+
+        cache.invalidate()
+        cache.get()
+        load_capabilities.assert_called_with(None)
+
+    @patch("capabilityIndex.load_budgets", return_value=[])
+    @patch("capabilityIndex.load_capabilities", return_value=[])
+    def test_snapshot_expires(self, load_capabilities, load_budgets):
+        cache = IndexCache(engine=None, max_age=0)
+        cache.get()
+        cache.get()
+        self.assertEqual(load_capabilities.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
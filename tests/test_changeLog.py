@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import MagicMock
+from changeLog import read_changes, summarize
+
+
+def _engine(exists, names=(), rows=()):
+    """An engine whose history table exists or not and returns ``rows``."""
+    cursor = MagicMock(description=[(name,) for name in names])
+    cursor.fetchone.return_value = ("t_history" if exists else None,)
+    cursor.fetchall.return_value = list(rows)
+    engine = MagicMock()
+    engine.raw_connection.return_value.cursor.return_value = cursor
+    return engine, cursor
+
+
+class TestChangeLog(unittest.TestCase):
+
+    def test_read_changes_after_a_change_id(self):
+        engine, cursor = _engine(True, ["ChangeId", "Change"], [(4, "added"), (5, "removed")])
+        changes = read_changes(engine, "t", after=3, limit=2)
+
+        self.assertEqual(
+            changes, [{"ChangeId": 4, "Change": "added"}, {"ChangeId": 5, "Change": "removed"}]
+        )
+        cursor.execute.assert_called_with(
+            'SELECT * FROM "t_history" WHERE "ChangeId" > %s ORDER BY "ChangeId" LIMIT %s', (3, 2)
+        )
+        engine.raw_connection.return_value.close.assert_called_once()
+
+    def test_no_history_yet(self):
+        engine, cursor = _engine(False)
+        self.assertEqual(read_changes(engine, "t"), [])
+        cursor.execute.assert_called_once_with("SELECT to_regclass(%s)", ('"t_history"',))
+
+    def test_summarize(self):
+        changes = [{"Change": "added"}, {"Change": "added"}, {"Change": "removed"}]
+        self.assertEqual(summarize(changes), {"added": 2, "changed": 0, "removed": 1})
+        self.assertEqual(summarize([]), {"added": 0, "changed": 0, "removed": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from checkpoint import Checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_marked_units_survive_a_restart(self):
+        with Checkpoint("crawl", self.tempdir.name) as checkpoint:
+            checkpoint.mark(1, 2)
+            checkpoint.mark(42)
+
+        with Checkpoint("crawl", self.tempdir.name) as checkpoint:
+            self.assertTrue(checkpoint.resuming)
+            self.assertTrue(checkpoint.done(1, 2))
+            self.assertTrue(checkpoint.done(42))
+            self.assertFalse(checkpoint.done(2, 1))
+
+    def test_restart_discards_the_manifest(self):
+        with Checkpoint("crawl", self.tempdir.name) as checkpoint:
+            checkpoint.mark(1)
+
+        with Checkpoint("crawl", self.tempdir.name, restart=True) as checkpoint:
+            self.assertFalse(checkpoint.resuming)
+
+    def test_complete_removes_the_manifest(self):
+        checkpoint = Checkpoint("crawl", self.tempdir.name)
+        checkpoint.mark(1)
+        checkpoint.complete()
+
+        self.assertFalse(os.path.exists(checkpoint.path))
+        with Checkpoint("crawl", self.tempdir.name) as checkpoint:
+            self.assertFalse(checkpoint.done(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
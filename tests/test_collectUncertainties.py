@@ -1,92 +1,141 @@
 import unittest
 from unittest.mock import patch, MagicMock
+import collectUncertainties
 from collectUncertainties import (
     driver_get,
+    fetch_and_save_technique_ids,
     getServiceCapabilities,
     getTechniquesList,
     getUncertaintyBudgets,
     main,
+    parse_args,
+    session_get,
 )
 import json
 import os
 import tempfile
-import pandas as pd
+from contextlib import redirect_stdout
+from io import StringIO
+from driverPool import DriverPool
+from qualerAuth import LoginSession
+
+
+def _response(payload, url="https://jgiquality.qualer.com/somepage"):
+    """Build a fake requests.Response that decodes to ``payload``."""
+    response = MagicMock(url=url)
+    response.json.return_value = payload
+    return response
+
+
+def _pool(driver):
+    """A pool whose only browser is ``driver``, logged in through the patched login()."""
+    return DriverPool(
+        lambda driver: collectUncertainties.login(driver),
+        size=1,
+        max_heap_mb=0,
+        factory=lambda: driver,
+    )
+
+
+def _auth():
+    """A login session with no cookies cached yet."""
+    return LoginSession(lambda: collectUncertainties.pool.authenticate())
 
 
 class TestCollectUncertainties(unittest.TestCase):
 
-    @patch("collectUncertainties.driver")
     @patch("collectUncertainties.login")
-    def test_driver_get_relogin(self, mock_login, mock_driver):
+    def test_driver_get_relogin(self, mock_login):
         # Mock the driver's current_url to simulate re-login scenario
-        mock_driver.current_url = "https://jgiquality.qualer.com/login"
+        mock_driver = MagicMock(current_url="https://jgiquality.qualer.com/login")
 
-        # Call the function
-        driver_get("https://jgiquality.qualer.com/somepage")
+        with patch("collectUncertainties.pool", _pool(mock_driver)):
+            driver_get("https://jgiquality.qualer.com/somepage")
 
-        # Check if login was called
-        mock_login.assert_called_once()
+        # Logged in when the browser started and again after the bounce
+        self.assertEqual(mock_login.call_count, 2)
 
         # Check if driver.get was called twice (initial call and after re-login)
         self.assertEqual(mock_driver.get.call_count, 2)
 
-    @patch("collectUncertainties.driver")
-    def test_driver_get_no_relogin(self, mock_driver):
+    @patch("collectUncertainties.login")
+    def test_driver_get_no_relogin(self, mock_login):
         # Mock the driver's current_url to simulate no re-login needed
-        mock_driver.current_url = "https://jgiquality.qualer.com/somepage"
+        mock_driver = MagicMock(current_url="https://jgiquality.qualer.com/somepage")
+        mock_driver.page_source = "<html></html>"
 
-        # Call the function
-        driver_get("https://jgiquality.qualer.com/somepage")
+        with patch("collectUncertainties.pool", _pool(mock_driver)):
+            result = driver_get("https://jgiquality.qualer.com/somepage")
 
-        # Check if driver.login was not called
+        # Only the initial login; the page is loaded once
+        mock_login.assert_called_once()
         mock_driver.get.assert_called_once_with(
             "https://jgiquality.qualer.com/somepage"
         )
+        self.assertEqual(result, "<html></html>")
+
+    @patch("collectUncertainties.session")
+    def test_session_get_relogin(self, mock_session):
+        # First response is a redirect to the login page, second is the data
+        expired = MagicMock(url="https://jgiquality.qualer.com/login?ReturnUrl=x")
+        ok = MagicMock(url="https://jgiquality.qualer.com/somepage")
+        ok.json.return_value = {"views": []}
+        mock_session.request.side_effect = [expired, ok]
+
+        mock_driver = MagicMock()
+        mock_driver.get_cookies.return_value = [{"name": "a", "value": "b"}]
+        with patch("collectUncertainties.login") as mock_login, patch(
+            "collectUncertainties.pool", _pool(mock_driver)
+        ), patch("collectUncertainties.auth", _auth()):
+            result = session_get("https://jgiquality.qualer.com/somepage")
 
-    @patch("collectUncertainties.driver_get")
-    @patch("collectUncertainties.driver")
-    def test_getServiceCapabilities(self, mock_driver, mock_driver_get):
-        # Mock the data returned by the driver
-        mock_driver.find_element.return_value.text = json.dumps(
+        mock_login.assert_called_once()
+        self.assertEqual(mock_session.request.call_count, 2)
+        self.assertEqual(result, {"views": []})
+
+    @patch("collectUncertainties.session")
+    def test_getServiceCapabilities(self, mock_session):
+        # Mock the data returned by the HTTP session
+        mock_session.request.return_value = _response(
             {"views": [{"key1": "value1"}, {"key2": "value2"}]}
         )
 
         # Call the function
         result = getServiceCapabilities()
 
-        # Check if driver_get was called with the correct URL
-        mock_driver_get.assert_called_once_with(
-            "https://jgiquality.qualer.com/ServiceType/ServiceCapabilities"
+        # Check if the session was called with the correct URL
+        self.assertEqual(
+            mock_session.request.call_args.args[1],
+            "https://jgiquality.qualer.com/ServiceType/ServiceCapabilities",
         )
 
         # Check if the result is as expected
         self.assertEqual(result, [{"key1": "value1"}, {"key2": "value2"}])
 
-    @patch("collectUncertainties.driver_get")
-    @patch("collectUncertainties.driver")
-    def test_getServiceCapabilities_no_views(self, mock_driver, mock_driver_get):
+    @patch("collectUncertainties.session")
+    def test_getServiceCapabilities_no_views(self, mock_session):
         # Simulate a JSON response that omits 'views'
-        mock_driver.find_element.return_value.text = json.dumps({"wrongKey": []})
+        mock_session.request.return_value = _response({"wrongKey": []})
 
         # We expect a KeyError when 'views' is missing
         with self.assertRaises(KeyError):
             getServiceCapabilities()
 
-    @patch("collectUncertainties.driver_get")
-    @patch("collectUncertainties.driver")
-    def test_getServiceCapabilities_invalid_json(self, mock_driver, mock_driver_get):
+    @patch("collectUncertainties.session")
+    def test_getServiceCapabilities_invalid_json(self, mock_session):
         # Simulate invalid JSON
-        mock_driver.find_element.return_value.text = "not valid json"
+        response = _response(None)
+        response.json.side_effect = json.JSONDecodeError("Expecting value", "", 0)
+        mock_session.request.return_value = response
 
         # We expect a JSONDecodeError
         with self.assertRaises(json.JSONDecodeError):
             getServiceCapabilities()
 
-    @patch("collectUncertainties.driver_get")
-    @patch("collectUncertainties.driver")
-    def test_getTechniquesList(self, mock_driver, mock_driver_get):
-        # Mock the data returned by the driver
-        mock_driver.find_element.return_value.text = json.dumps(
+    @patch("collectUncertainties.session")
+    def test_getTechniquesList(self, mock_session):
+        # Mock the data returned by the HTTP session
+        mock_session.request.return_value = _response(
             [
                 {"TechniqueId": 1, "Name": "Technique1"},
                 {"TechniqueId": 2, "Name": "Technique2"},
@@ -96,9 +145,10 @@ class TestCollectUncertainties(unittest.TestCase):
         # Call the function
         result = getTechniquesList()
 
-        # Check if driver_get was called with the correct URL
-        mock_driver_get.assert_called_once_with(
-            "https://jgiquality.qualer.com/ServiceGroupTechnique/TechniquesList"
+        # Check if the session was called with the correct URL
+        self.assertEqual(
+            mock_session.request.call_args.args[1],
+            "https://jgiquality.qualer.com/ServiceGroupTechnique/TechniquesList",
         )
 
         # Check if the result is as expected
@@ -110,11 +160,10 @@ class TestCollectUncertainties(unittest.TestCase):
             ],
         )
 
-    @patch("collectUncertainties.driver_get")
-    @patch("collectUncertainties.driver")
-    def test_getUncertaintyBudgets(self, mock_driver, mock_driver_get):
-        # Mock the data returned by the driver
-        mock_driver.find_element.return_value.text = json.dumps(
+    @patch("collectUncertainties.session")
+    def test_getUncertaintyBudgets(self, mock_session):
+        # Mock the data returned by the HTTP session
+        mock_session.request.return_value = _response(
             {
                 "Data": [
                     {"BudgetId": 1, "Value": "Budget1"},
@@ -126,9 +175,10 @@ class TestCollectUncertainties(unittest.TestCase):
         # Call the function
         result = getUncertaintyBudgets(1, 1)
 
-        # Check if driver_get was called with the correct URL
-        mock_driver_get.assert_called_once_with(
-            "https://jgiquality.qualer.com/ServiceGroupTechnique/UncertaintyBudgets?serviceGroupId=1&techniqueId=1"
+        # Check if the session was called with the correct URL
+        self.assertEqual(
+            mock_session.request.call_args.args[1],
+            "https://jgiquality.qualer.com/ServiceGroupTechnique/UncertaintyBudgets?serviceGroupId=1&techniqueId=1",
         )
 
         # Check if the result is as expected
@@ -140,70 +190,151 @@ class TestCollectUncertainties(unittest.TestCase):
             ],
         )
 
-    @patch("collectUncertainties.driver_get")
-    @patch("collectUncertainties.driver")
-    def test_getUncertaintyBudgets_missing_data(self, mock_driver, mock_driver_get):
+    @patch("collectUncertainties.session")
+    def test_getUncertaintyBudgets_missing_data(self, mock_session):
         # Simulate a JSON response that omits 'Data'
-        mock_driver.find_element.return_value.text = json.dumps({"OtherKey": []})
+        mock_session.request.return_value = _response({"OtherKey": []})
 
         # Expect KeyError when 'Data' is missing
         with self.assertRaises(KeyError):
             getUncertaintyBudgets(1, 1)
 
-    @patch("collectUncertainties.requests.Session")
+    @patch("dbWriter.load_records")
     @patch("collectUncertainties.getServiceCapabilities")
     @patch("collectUncertainties.getTechniquesList")
     @patch("collectUncertainties.getUncertaintyBudgets")
     @patch("collectUncertainties.login")
-    @patch("collectUncertainties.driver")
     def test_main(
         self,
-        mock_driver,
         mock_login,
         mock_getUncertaintyBudgets,
         mock_getTechniquesList,
         mock_getServiceCapabilities,
-        mock_requests_session,
+        mock_load_records,
     ):
         # Mock the service capabilities and techniques list
         mock_getServiceCapabilities.return_value = [{"ServiceGroupId": 1}]
         mock_getTechniquesList.return_value = [{"TechniqueId": 1}]
 
         # Mock the uncertainty budgets
-        mock_getUncertaintyBudgets.return_value = [{"BudgetId": 1, "Value": "Budget1"}]
-
-        # Mock the requests session
-        mock_session = MagicMock()
-        mock_requests_session.return_value = mock_session
-
-        # Use a temporary directory to avoid clutter
-        with tempfile.TemporaryDirectory() as tempdir:
-            with patch("collectUncertainties.output_dir", tempdir):
-                main()
-
-                # Ensure files exist in tempdir
-                self.assertTrue(
-                    os.path.exists(os.path.join(tempdir, "ServiceCapabilities.csv"))
-                )
-                self.assertTrue(
-                    os.path.exists(os.path.join(tempdir, "TechniquesList.csv"))
-                )
-                self.assertTrue(
-                    os.path.exists(os.path.join(tempdir, "AllUncertaintyBudgets.csv"))
-                )
-
-                # Validate that CSVs are non-empty
-                df_service = pd.read_csv(
-                    os.path.join(tempdir, "ServiceCapabilities.csv")
-                )
-                df_techniques = pd.read_csv(os.path.join(tempdir, "TechniquesList.csv"))
-                df_uncert = pd.read_csv(
-                    os.path.join(tempdir, "AllUncertaintyBudgets.csv")
-                )
-
-                self.assertFalse(df_service.empty)
-                self.assertFalse(df_techniques.empty)
-                self.assertFalse(df_uncert.empty)
+        mock_getUncertaintyBudgets.return_value = [
+            {"UncertaintyBudgetId": 7, "BudgetName": "Budget1", "SiteId": 3}
+        ]
+        mock_driver = MagicMock()
+        mock_driver.get_cookies.return_value = []
+
+        with tempfile.TemporaryDirectory() as tempdir, patch(
+            "collectUncertainties.pool", _pool(mock_driver)
+        ), patch("collectUncertainties.auth", _auth()):
+            main(["--cache-dir", tempdir, "--no-bulk"])
+
+        # Every (service group, technique) pair is fetched and inserted
+        mock_login.assert_called_once()
+        mock_getUncertaintyBudgets.assert_called_once_with(1, 1)
+        loaded = {
+            call.args[1]: call.args[2].dicts() for call in mock_load_records.call_args_list
+        }
+        self.assertEqual(loaded["uncertainty_budgets"][0]["UncertaintyBudgetId"], 7)
+        self.assertEqual(
+            loaded["uncertainty_budget_service_groups"],
+            [{"UncertaintyBudgetId": 7, "ServiceGroupId": 1}],
+        )
+        self.assertEqual(
+            loaded["uncertainty_budget_techniques"],
+            [{"UncertaintyBudgetId": 7, "TechniqueId": 1}],
+        )
+    @patch("dbWriter.load_records")
+    @patch("collectUncertainties.getServiceCapabilities")
+    @patch("collectUncertainties.getTechniquesList")
+    @patch("collectUncertainties.getBudgetListing")
+    @patch("collectUncertainties.getUncertaintyBudgets")
+    @patch("collectUncertainties.login")
+    def test_main_bulk(
+        self,
+        mock_login,
+        mock_getUncertaintyBudgets,
+        mock_getBudgetListing,
+        mock_getTechniquesList,
+        mock_getServiceCapabilities,
+        mock_load_records,
+    ):
+        mock_getServiceCapabilities.return_value = [{"ServiceGroupId": 1}, {"ServiceGroupId": 2}]
+        mock_getTechniquesList.return_value = [
+            {"TechniqueId": 1, "Name": "Caliper"},
+            {"TechniqueId": 2, "Name": "Torque"},
+        ]
+        mock_getBudgetListing.return_value = (
+            [
+                {"UncertaintyBudgetId": 7, "TechniqueName": "Torque"},
+                {"UncertaintyBudgetId": 8, "TechniqueName": "Torque"},
+            ],
+            True,
+        )
+        mock_getUncertaintyBudgets.return_value = []
+        mock_driver = MagicMock()
+        mock_driver.get_cookies.return_value = []
+
+        with tempfile.TemporaryDirectory() as tempdir, patch(
+            "collectUncertainties.pool", _pool(mock_driver)
+        ), patch("collectUncertainties.auth", _auth()):
+            main([
+                "--cache-dir", tempdir, "--site-id", "5", "--page-size", "100", "--concurrency", "4"
+            ])
+
+        # Only the pairs of the technique the listing has budgets for
+        mock_getBudgetListing.assert_called_once_with(5, 100, 4)
+        self.assertEqual(
+            sorted(call.args for call in mock_getUncertaintyBudgets.call_args_list),
+            [(1, 2), (2, 2)],
+        )
+
+    @patch("collectUncertainties.getServiceCapabilities")
+    @patch("collectUncertainties.login")
+    def test_failed_run_writes_its_metrics(self, mock_login, mock_getServiceCapabilities):
+        mock_getServiceCapabilities.side_effect = ConnectionError("dropped")
+        mock_driver = MagicMock()
+        mock_driver.get_cookies.return_value = []
+
+        with tempfile.TemporaryDirectory() as tempdir, patch(
+            "collectUncertainties.pool", _pool(mock_driver)
+        ), patch("collectUncertainties.auth", _auth()):
+            with self.assertRaises(ConnectionError):
+                main(["--cache-dir", tempdir, "--no-bulk"])
+            self.assertTrue(os.path.exists(f"{tempdir}/metrics/collectUncertainties.json"))
+
+    @patch("siteGrids.query_site_ids", return_value=[5])
+    @patch("collectUncertainties.getBudgetListing")
+    @patch("collectUncertainties.getTechniquesList")
+    def test_techniques_are_only_narrowed_by_a_complete_listing(
+        self, mock_getTechniquesList, mock_getBudgetListing, mock_query_site_ids
+    ):
+        mock_getTechniquesList.return_value = [
+            {"TechniqueId": 1, "Name": "Caliper"},
+            {"TechniqueId": 2, "Name": "Torque"},
+        ]
+        mock_getBudgetListing.return_value = ([{"TechniqueName": "Torque"}], True)
+        with redirect_stdout(StringIO()):
+            self.assertEqual(fetch_and_save_technique_ids(parse_args(["--site-id", "5"])), [2])
+            # Sites from the database may lack a new one
+            self.assertEqual(fetch_and_save_technique_ids(parse_args([])), [1, 2])
+            self.assertEqual(mock_getBudgetListing.call_count, 1)
+            # A listing short of its total may lack a technique
+            mock_getBudgetListing.return_value = ([{"TechniqueName": "Torque"}], False)
+            self.assertEqual(fetch_and_save_technique_ids(parse_args(["--site-id", "5"])), [1, 2])
+
+    def test_budgeted_technique_ids(self):
+        techniques = [
+            {"TechniqueId": 1, "Name": "Caliper"},
+            {"TechniqueId": 2, "Name": "Torque"},
+            {"TechniqueId": 3, "Name": "Torque"},
+        ]
+        listing = [{"TechniqueName": "Torque"}, {"TechniqueName": "Torque"}]
+        self.assertEqual(collectUncertainties.budgeted_technique_ids(listing, techniques), [2, 3])
+        # A technique the list does not know could hide behind any pair
+        for row in ({"TechniqueName": "Pressure"}, {"TechniqueName": None}, {}):
+            self.assertIsNone(
+                collectUncertainties.budgeted_technique_ids(listing + [row], techniques)
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+import columnarExport
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# cursor.description of uncertainty_budgets: (name, type OID)
+BUDGET_COLUMNS = [
+    ("UncertaintyBudgetId", 20),
+    ("BudgetName", 25),
+    ("ComponentsCount", 20),
+    ("ActivationDate", 25),
+    ("ExpirationDate", 25),
+    ("IsActive", 16),
+    ("SiteId", 20),
+]
+
+# As written by COPY ... WITH (FORMAT csv, HEADER true)
+BUDGETS_CSV = """\
+UncertaintyBudgetId,BudgetName,ComponentsCount,ActivationDate,ExpirationDate,IsActive,SiteId
+6685,"Micrometer, 0 to 1 in",4,2019-03-12T00:00:00,2034-03-12T00:00:00,t,1
+6686,"",4,2019-03-12T00:00:00,,f,1
+6687,Caliper,3,2020-01-01T00:00:00,,t,96552
+6688,Torque,2,2023-04-11T13:45:12.347,2033-04-11T13:45:12.3471234Z,t,96552
+"""
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+class TestColumnarExport(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = self.tempdir.name
+        self.csv_path = os.path.join(self.directory, "budgets.csv")
+        with open(self.csv_path, "w", encoding="utf-8") as f:
+            f.write(BUDGETS_CSV)
+        self.schema = columnarExport.arrow_schema(BUDGET_COLUMNS)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def export(self, fmt):
+        target = os.path.join(self.directory, "uncertainty_budgets")
+        rows = columnarExport.write_dataset(self.csv_path, self.schema, target, "SiteId", fmt)
+        columnarExport._write_manifest(self.directory, {
+            "uncertainty_budgets": {
+                "rows": rows, "format": fmt, "partition": "SiteId", "partition_type": "int64",
+            },
+        })
+        return rows
+
+    def test_schema_types_text_dates_as_timestamps(self):
+        types = {field.name: str(field.type) for field in self.schema}
+        self.assertEqual(types["UncertaintyBudgetId"], "int64")
+        self.assertEqual(types["BudgetName"], "string")
+        self.assertEqual(types["ActivationDate"], "timestamp[us]")
+        self.assertEqual(types["IsActive"], "bool")
+
+    def test_partitioned_round_trip(self):
+        for fmt in columnarExport.FORMATS:
+            with self.subTest(fmt=fmt):
+                self.assertEqual(self.export(fmt), 4)
+                sites = sorted(os.listdir(os.path.join(self.directory, "uncertainty_budgets")))
+                self.assertEqual(sites, ["SiteId=1", "SiteId=96552"])
+
+                table = columnarExport.load(self.directory, "uncertainty_budgets")
+                self.assertEqual(table.num_rows, 4)
+                self.assertEqual(str(table.schema.field("SiteId").type), "int64")
+                site = columnarExport.load(self.directory, "uncertainty_budgets", SiteId=1)
+                records = sorted(site.to_pylist(), key=lambda r: r["UncertaintyBudgetId"])
+                self.assertEqual(records[0]["BudgetName"], "Micrometer, 0 to 1 in")
+                self.assertEqual(records[0]["ActivationDate"], datetime.datetime(2019, 3, 12))
+                self.assertIs(records[0]["IsActive"], True)
+                # COPY writes NULL unquoted and the empty string quoted
+                self.assertEqual(records[1]["BudgetName"], "")
+                self.assertIsNone(records[1]["ExpirationDate"])
+                site = columnarExport.load(self.directory, "uncertainty_budgets", SiteId=96552)
+                records = sorted(site.to_pylist(), key=lambda r: r["UncertaintyBudgetId"])
+                self.assertEqual(
+                    records[1]["ActivationDate"], datetime.datetime(2023, 4, 11, 13, 45, 12, 347000)
+                )
+                self.assertEqual(
+                    records[1]["ExpirationDate"], datetime.datetime(2033, 4, 11, 13, 45, 12, 347123)
+                )
+
+    def test_dotnet_dates(self):
+        import pyarrow as pa
+
+        column = pa.array([
+            "2023-04-11T13:45:12.3471234",
+            "2023-04-11T13:45:12.3470000",
+            "2023-04-11T13:45:12Z",
+            "2023-04-11T13:45:12.347-05:00",
+            "2023-04-11T13:45:12.1234567+0530",
+            "2023-04-11",
+            "",
+            None,
+        ])
+        self.assertEqual(
+            columnarExport.parse_dates(column).to_pylist(),
+            [
+                datetime.datetime(2023, 4, 11, 13, 45, 12, 347123),
+                datetime.datetime(2023, 4, 11, 13, 45, 12, 347000),
+                datetime.datetime(2023, 4, 11, 13, 45, 12),
+                datetime.datetime(2023, 4, 11, 13, 45, 12, 347000),
+                datetime.datetime(2023, 4, 11, 13, 45, 12, 123456),
+                datetime.datetime(2023, 4, 11),
+                None,
+                None,
+            ],
+        )
+
+    def test_unexported_entity(self):
+        with self.assertRaises(KeyError):
+            columnarExport.load(self.directory, "capabilities")
+
+
+if __name__ == "__main__":
+    unittest.main()
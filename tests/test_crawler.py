@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+from crawler import crawl
+
+
+class TestCrawler(unittest.TestCase):
+
+    def test_crawl_processes_every_item(self):
+        seen = []
+        lock = threading.Lock()
+
+        def fetch(item):
+            with lock:
+                seen.append(item)
+
+        crawl(iter(range(50)), fetch, concurrency=4, total=50)
+
+        self.assertEqual(sorted(seen), list(range(50)))
+
+    def test_crawl_bounds_in_flight_requests(self):
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def fetch(item):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.01)
+            with lock:
+                in_flight -= 1
+
+        crawl(range(30), fetch, concurrency=3)
+
+        self.assertLessEqual(peak, 3)
+
+    def test_crawl_raises_fetch_errors(self):
+        def fetch(item):
+            if item == 5:
+                raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            crawl(range(10), fetch, concurrency=2)
+
+    def test_ordered_results_follow_input_order(self):
+        results = []
+
+        def fetch(item):
+            # Later items finish first
+            time.sleep((20 - item) * 0.002)
+            return item * 2
+
+        crawl(
+            range(20),
+            fetch,
+            concurrency=5,
+            on_result=lambda item, result: results.append((item, result)),
+            ordered=True,
+        )
+
+        self.assertEqual(results, [(i, i * 2) for i in range(20)])
+
+    def test_errors_are_isolated_per_item(self):
+        results = []
+        errors = []
+
+        def fetch(item):
+            if item % 3 == 0:
+                raise ValueError(item)
+            return item
+
+        crawl(
+            range(10),
+            fetch,
+            concurrency=3,
+            on_result=lambda item, result: results.append(item),
+            on_error=lambda item, error: errors.append(item),
+            ordered=True,
+        )
+
+        self.assertEqual(results, [1, 2, 4, 5, 7, 8])
+        self.assertEqual(errors, [0, 3, 6, 9])
+
+
+if __name__ == "__main__":
+    unittest.main()
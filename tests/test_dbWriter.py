@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from dbWriter import BatchWriter
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    @patch("dbWriter.load_records")
+    def test_rows_are_batched_per_table(self, mock_load_records):
+        committed = []
+        with BatchWriter(None, batch_size=100, flush_interval=60) as writer:
+            for i in range(10):
+                writer.put("a", [{"i": i}], lambda i=i: committed.append(i))
+            writer.put("b", [{"i": 0}])
+            writer.put("a", [])
+
+        # Everything fits in one batch: one COPY per table
+        self.assertEqual(mock_load_records.call_count, 2)
+        tables = {call.args[1]: call.args[2] for call in mock_load_records.call_args_list}
+        self.assertEqual(len(tables["a"]), 10)
+        self.assertEqual(committed, list(range(10)))
+        self.assertEqual(writer.commits, 2)
+
+    @patch("dbWriter.load_records")
+    def test_flush_by_size(self, mock_load_records):
+        with BatchWriter(None, batch_size=5, flush_interval=60) as writer:
+            for i in range(20):
+                writer.put("a", [{"i": i}])
+        self.assertEqual(mock_load_records.call_count, 4)
+
+    @patch("dbWriter.load_records")
+    def test_flush_by_time(self, mock_load_records):
+        flushed = threading.Event()
+        with BatchWriter(None, batch_size=1000, flush_interval=0.05) as writer:
+            writer.put("a", [{"i": 1}], flushed.set)
+            self.assertTrue(flushed.wait(2))
+
+    @patch("dbWriter.load_records", side_effect=ValueError("db down"))
+    def test_errors_reach_the_workers(self, mock_load_records):
+        writer = BatchWriter(None, batch_size=1, flush_interval=60)
+        writer.put("a", [{"i": 1}])
+        time.sleep(0.1)
+        with self.assertRaises(RuntimeError):
+            writer.put("a", [{"i": 2}])
+        with self.assertRaises(RuntimeError):
+            writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
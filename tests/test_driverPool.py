@@ -0,0 +1,148 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from driverPool import DriverPool
+
+
+class TestDriverPool(unittest.TestCase):
+
+    def setUp(self):
+        self.started = []
+        self.logins = []
+
+    def factory(self):
+        driver = MagicMock(current_url="https://jgiquality.qualer.com/page")
+        driver.get_cookies.return_value = [{"name": "auth", "value": "1"}]
+        self.started.append(driver)
+        return driver
+
+    def login(self, driver):
+        self.logins.append(driver)
+
+    def pool(self, **kwargs):
+        kwargs.setdefault("max_heap_mb", 0)
+        return DriverPool(self.login, factory=self.factory, **kwargs)
+
+    def test_building_a_pool_does_not_start_chrome(self):
+        self.pool(size=4)
+        self.assertEqual(self.started, [])
+
+    def test_only_the_first_instance_logs_in(self):
+        pool = self.pool(size=2)
+        barrier = threading.Barrier(2)
+
+        def use():
+            with pool.checkout():
+                barrier.wait(timeout=5)  # Forces two instances to exist
+
+        threads = [threading.Thread(target=use) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.started), 2)
+        self.assertEqual(len(self.logins), 1)
+        seeded = next(driver for driver in self.started if driver not in self.logins)
+        seeded.add_cookie.assert_called_once_with({"name": "auth", "value": "1"})
+
+    def test_checkouts_never_exceed_size(self):
+        pool = self.pool(size=2)
+        in_use = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def use():
+            nonlocal in_use, peak
+            with pool.checkout():
+                with lock:
+                    in_use += 1
+                    peak = max(peak, in_use)
+                time.sleep(0.01)
+                with lock:
+                    in_use -= 1
+
+        threads = [threading.Thread(target=use) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(peak, 2)
+        self.assertLessEqual(len(self.started), 2)
+
+    def test_instance_is_recycled_after_an_error(self):
+        pool = self.pool(size=1)
+        with self.assertRaises(ValueError):
+            with pool.checkout() as driver:
+                raise ValueError("crashed")
+
+        driver.quit.assert_called_once()
+        with pool.checkout() as replacement:
+            self.assertIsNot(replacement, driver)
+        self.assertEqual(pool.recycled, 1)
+
+    def test_instance_is_recycled_after_max_uses(self):
+        pool = self.pool(size=1, max_uses=2)
+        for _ in range(3):
+            pool.get("https://jgiquality.qualer.com/page")
+
+        self.assertEqual(len(self.started), 2)
+        self.started[0].quit.assert_called_once()
+
+    def test_instance_is_recycled_when_heap_grows(self):
+        pool = self.pool(size=1, max_heap_mb=100)
+        with pool.checkout() as driver:
+            driver.execute_script.return_value = 200 * 2**20
+
+        driver.quit.assert_called_once()
+
+    def test_bounced_requests_share_one_relogin(self):
+        pool = self.pool(size=3)
+        pool.use_cookies([{"name": "auth", "value": "stale"}])
+        # All three requests are bounced to the login page at the same time
+        barrier = threading.Barrier(3)
+
+        def factory():
+            driver = self.factory()
+            driver.current_url = "https://jgiquality.qualer.com/login"
+
+            def get(url):
+                if url.endswith("/page") and not self.logins:
+                    barrier.wait(timeout=5)
+
+            driver.get.side_effect = get
+            return driver
+
+        pool.factory = factory
+        threads = [
+            threading.Thread(target=pool.get, args=("https://jgiquality.qualer.com/page",))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.logins), 1)
+
+    def test_use_cookies_skips_the_first_login(self):
+        pool = self.pool(size=1)
+        pool.use_cookies([{"name": "auth", "value": "cached"}])
+        with pool.checkout() as driver:
+            pass
+
+        self.assertEqual(self.logins, [])
+        driver.add_cookie.assert_called_once_with({"name": "auth", "value": "cached"})
+
+    def test_close_quits_idle_instances(self):
+        pool = self.pool(size=1)
+        with pool.checkout() as driver:
+            pass
+        pool.close()
+        driver.quit.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from benchmarks.fakeQualer import AUTH_COOKIE, FakeCatalog, FakeQualer
+from jsonStream import iter_items
+from qualerClient import SessionExpired, create_session, get_json, stream_json
+
+
+class TestFakeQualer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog = FakeCatalog(components_per_budget=2, values_per_component=3)
+        cls.fake = FakeQualer(cls.catalog).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.fake.stop()
+
+    def setUp(self):
+        self.session = create_session([AUTH_COOKIE])
+
+    def test_requests_without_the_auth_cookie_are_bounced_to_login(self):
+        with self.assertRaises(SessionExpired):
+            get_json(create_session(), f"{self.fake.url}/ServiceGroupTechnique/TechniquesList")
+
+    def test_catalogue_is_seeded_from_the_saved_json(self):
+        views = get_json(self.session, f"{self.fake.url}/ServiceType/ServiceCapabilities")["views"]
+        techniques = get_json(self.session, f"{self.fake.url}/ServiceGroupTechnique/TechniquesList")
+
+        self.assertEqual(len(views), len(self.catalog.service_capabilities))
+        self.assertTrue(techniques)
+        self.assertEqual(len(self.catalog.budgets), 2312)
+
+    def test_budgets_and_components_are_consistent(self):
+        (groupId, techniqueId), budgetIds = next(iter(self.catalog._pairs.items()))
+        budgets = get_json(
+            self.session,
+            f"{self.fake.url}/ServiceGroupTechnique/UncertaintyBudgets"
+            f"?serviceGroupId={groupId}&techniqueId={techniqueId}",
+        )["Data"]
+        self.assertEqual([b["UncertaintyBudgetId"] for b in budgets], budgetIds)
+
+        components = get_json(
+            self.session,
+            f"{self.fake.url}/UncertaintyComponent/List?UncertaintyBudgetId={budgetIds[0]}",
+        )["uncertaintyComponents"]
+        self.assertEqual(len(components), 2)
+        self.assertEqual(len(components[0]["UncertaintyValues"]), 3)
+        # Generated deterministically, so a rerun sees the same rows
+        self.assertEqual(components, self.catalog.uncertainty_components(budgetIds[0]))
+
+    def test_streamed_listing_matches_the_decoded_one(self):
+        techniqueId = self.catalog.techniques[0]["TechniqueId"]
+        url = (
+            f"{self.fake.url}/CertificationCapability/Capabilities_Read"
+            f"?sort=&group=&filter=&techniqueId={techniqueId}&certificationId=284"
+        )
+        rows = list(iter_items(stream_json(self.session, url, chunk_size=256), "Data"))
+        self.assertTrue(rows)
+        self.assertEqual(rows, get_json(self.session, url)["Data"])
+
+        with self.assertRaises(SessionExpired):
+            stream_json(create_session(), url)
+
+    def test_site_grids_are_paged(self):
+        url = f"{self.fake.url}/Uncertainty/UncertaintyBudget_Read?siteId=1"
+        whole = get_json(self.session, url, data={"sort": "", "group": "", "filter": ""})
+        page = get_json(self.session, url, data={"page": 2, "pageSize": 100})
+
+        self.assertEqual(whole["Total"], 2312)
+        self.assertEqual(page["Total"], 2312)
+        self.assertEqual(page["Data"], whole["Data"][100:200])
+        self.assertIn("TechniqueName", page["Data"][0])
+
+        newest = get_json(self.session, url, data={"sort": "UncertaintyBudgetId-desc"})["Data"]
+        ids = [row["UncertaintyBudgetId"] for row in newest]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_site_capabilities_name_their_technique(self):
+        rows = get_json(
+            self.session, f"{self.fake.url}/CertificationCapability/Capabilities_Read?siteId=1"
+        )["Data"]
+        technique = self.catalog.techniques[0]
+
+        self.assertEqual(len(rows), len(self.catalog.techniques) * 20)
+        self.assertEqual(
+            [{k: v for k, v in row.items() if k != "TechniqueName"}
+             for row in rows if row["TechniqueName"] == technique["Name"]],
+            self.catalog.capabilities(technique["TechniqueId"]),
+        )
+
+    def test_injected_errors(self):
+        fake = FakeQualer(self.catalog, error_rate=1.0).start()
+        try:
+            with self.assertRaises(Exception):
+                get_json(self.session, f"{fake.url}/ServiceGroupTechnique/TechniquesList")
+        finally:
+            fake.stop()
+        self.assertEqual(fake.errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
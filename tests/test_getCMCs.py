@@ -0,0 +1,89 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+from getCMCs import (
+    getSiteCapabilities,
+    group_site_capabilities,
+    insert_site_capabilities,
+    parse_args,
+    read_site_capabilities,
+)
+from siteGrids import CAPABILITY_SORT
+
+TECHNIQUES = [
+    {"TechniqueId": 1, "Name": "Caliper"},
+    {"TechniqueId": 2, "Name": "Torque"},
+    {"TechniqueId": 3, "Name": "Torque"},
+]
+
+
+class TestSiteCapabilities(unittest.TestCase):
+
+    def test_rows_are_grouped_by_technique(self):
+        rows = [
+            {"Parameter": "Length", "TechniqueName": "Caliper"},
+            {"Parameter": "Torque", "TechniqueId": 3},
+            {"Parameter": "Depth", "TechniqueName": "Caliper"},
+        ]
+        grouped = group_site_capabilities(rows, TECHNIQUES)
+
+        self.assertEqual([row["Parameter"] for row in grouped[1]], ["Length", "Depth"])
+        self.assertEqual([row["Parameter"] for row in grouped[3]], ["Torque"])
+
+    def test_rows_that_cannot_be_placed_give_up_the_site_read(self):
+        # Shared, unknown and missing names cannot be told apart
+        for row in ({"TechniqueName": "Torque"}, {"TechniqueName": "Pressure"}, {}):
+            self.assertIsNone(group_site_capabilities([row], TECHNIQUES))
+
+    @patch("getCMCs.replace_records")
+    def test_each_technique_is_replaced_with_its_rows(self, mock_replace):
+        mock_replace.side_effect = lambda engine, table, records, column, value: list(records)
+        grouped = group_site_capabilities(
+            [{"Parameter": "Length", "RangeMin": 0, "TechniqueName": "Caliper"}], TECHNIQUES
+        )
+
+        (capability,) = insert_site_capabilities(grouped, 1)
+        self.assertEqual(capability.TechniqueId, 1)
+        self.assertEqual(capability.extra, {"Parameter": "Length", "RangeMin": 0})
+
+    @patch("getCMCs.replace_records", return_value=0)
+    def test_techniques_the_site_read_lacks_are_emptied(self, mock_replace):
+        # A complete read says they have no capabilities left at the sites
+        self.assertEqual(insert_site_capabilities({1: [{"Parameter": "Length"}]}, 2), 0)
+        engine, table, records, column, value = mock_replace.call_args.args
+        self.assertEqual(
+            (table, list(records), column, value), ("capabilities", [], "TechniqueId", 2)
+        )
+
+    @patch("getCMCs.getSiteCapabilities")
+    @patch("getCMCs.siteGrids.query_site_ids", return_value=[1])
+    def test_only_a_complete_site_read_is_used(self, mock_sites, mock_read):
+        mock_read.return_value = ([{"Parameter": "Length", "TechniqueName": "Caliper"}], True)
+        with redirect_stdout(StringIO()):
+            # Sites taken from the database may not be all of them
+            self.assertIsNone(read_site_capabilities(parse_args([]), TECHNIQUES))
+            mock_read.assert_not_called()
+
+            args = parse_args(["--site-id", "1", "--site-id", "2"])
+            self.assertEqual(list(read_site_capabilities(args, TECHNIQUES)), [1])
+
+            # Pages short of the Total leave the techniques to be fetched on their own
+            mock_read.side_effect = [mock_read.return_value, ([], False)]
+            self.assertIsNone(read_site_capabilities(args, TECHNIQUES))
+
+    @patch("getCMCs.session_get")
+    def test_site_read_keeps_the_certification_and_a_fixed_order(self, mock_session_get):
+        mock_session_get.return_value = {"Data": [{"Parameter": "Length"}], "Total": 1}
+        rows, complete = getSiteCapabilities(5, page_size=10)
+
+        self.assertEqual((rows, complete), ([{"Parameter": "Length"}], True))
+        query = parse_qs(urlsplit(mock_session_get.call_args.args[0]).query)
+        self.assertEqual(query["siteId"], ["5"])
+        self.assertEqual(query["certificationId"], ["284"])
+        self.assertEqual(query["sort"], [CAPABILITY_SORT])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import unittest
+from jsonStream import iter_items
+
+SNAPSHOT = os.path.join(os.path.dirname(__file__), "..", "json", "budgets.json")
+
+
+def _chunks(raw, size):
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+class TestIterItems(unittest.TestCase):
+
+    def test_matches_json_loads_at_any_chunk_size(self):
+        with open(SNAPSHOT, "rb") as f:
+            raw = f.read()
+        expected = json.loads(raw)["Data"]
+        for size in (7, 4096, 65536):
+            self.assertEqual(list(iter_items(_chunks(raw, size), "Data")), expected)
+
+    def test_skips_members_before_the_array(self):
+        raw = '{"Success": true, "Errors": {"a": [1, "]"]}, "views": [{"Id": 1}, {"Id": 2}]}'
+        self.assertEqual(
+            list(iter_items(_chunks(raw.encode(), 3), "views")), [{"Id": 1}, {"Id": 2}]
+        )
+
+    def test_multibyte_characters_split_across_chunks(self):
+        raw = '{"Data": [{"Name": "244.5 to 593 °C"}]}'.encode()
+        self.assertEqual(
+            list(iter_items(_chunks(raw, 1), "Data")), [{"Name": "244.5 to 593 °C"}]
+        )
+
+    def test_numbers_split_across_chunks(self):
+        self.assertEqual(list(iter_items([b"[1", b"23, 4", b"5]"])), [123, 45])
+
+    def test_missing_null_and_empty(self):
+        with self.assertRaises(KeyError):
+            list(iter_items([b'{"Other": []}'], "Data"))
+        self.assertEqual(list(iter_items([b'{"Data": null}'], "Data")), [])
+        self.assertEqual(list(iter_items([b'{"Data": [ ]}'], "Data")), [])
+
+    def test_truncated_reply_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_items([b'{"Data": [{"Id": 1}, {"Id"'], "Data"))
+
+    def test_reads_the_input_to_the_end(self):
+        chunks = iter([b'{"Data": [1]', b', "Total": 1', b"}"])
+        self.assertEqual(list(iter_items(chunks, "Data")), [1])
+        self.assertIsNone(next(chunks, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+import metrics
+from metrics import Exporter, Histogram, Metrics
+from qualerClient import get_json
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_summary(self):
+        histogram = Histogram()
+        for value in (0.002, 0.02, 0.02, 0.2, 3.0):
+            histogram.observe(value)
+        summary = histogram.summary()
+        self.assertEqual(summary["count"], 5)
+        self.assertAlmostEqual(summary["sum"], 3.242)
+        self.assertEqual(summary["max"], 3.0)
+        self.assertGreaterEqual(summary["p50"], 0.01)
+        self.assertLessEqual(summary["p50"], 0.025)
+        self.assertLessEqual(summary["p99"], 3.0)
+
+    def test_counters_add_up_per_label_set(self):
+        registry = Metrics()
+        registry.count("requests_total", endpoint="/a", status=200)
+        registry.count("requests_total", endpoint="/a", status=200)
+        registry.count("requests_total", endpoint="/b", status=500)
+        counters = {
+            tuple(sorted(c["labels"].items())): c["value"]
+            for c in registry.snapshot()["counters"]
+        }
+        self.assertEqual(counters[(("endpoint", "/a"), ("status", "200"))], 2)
+        self.assertEqual(counters[(("endpoint", "/b"), ("status", "500"))], 1)
+
+    def test_counted_counts_rows_as_they_stream(self):
+        registry = Metrics()
+        rows = registry.counted(range(7), "db_rows_total", table="t")
+        self.assertEqual(list(rows), list(range(7)))
+        self.assertEqual(registry.counters[("db_rows_total", (("table", "t"),))], 7)
+
+    def test_prometheus_text(self):
+        registry = Metrics()
+        registry.count("retries_total", endpoint='/x"y')
+        registry.gauge("concurrency_limit", 4)
+        with registry.timer("db_load_seconds", table="values"):
+            pass
+        text = registry.prometheus()
+        self.assertIn('qualer_retries_total{endpoint="/x\\"y"} 1', text)
+        self.assertIn("# TYPE qualer_concurrency_limit gauge", text)
+        self.assertIn("# TYPE qualer_db_load_seconds histogram", text)
+        self.assertIn('qualer_db_load_seconds_bucket{table="values",le="+Inf"} 1', text)
+        self.assertIn('qualer_db_load_seconds_count{table="values"} 1', text)
+
+    def test_exporter_writes_json_and_prometheus(self):
+        registry = Metrics()
+        registry.count("logins_total", reason="cached")
+        with tempfile.TemporaryDirectory() as directory:
+            exporter = Exporter(directory, "crawl", interval=0.05, metrics=registry).start()
+            time.sleep(0.15)
+            self.assertTrue(os.path.exists(os.path.join(directory, "crawl.prom")))
+            registry.count("logins_total", reason="cached")
+            exporter.stop()
+            with open(os.path.join(directory, "crawl.json"), encoding="utf-8") as f:
+                summary = json.load(f)
+        self.assertEqual(summary["run"], "crawl")
+        self.assertEqual(summary["counters"][0]["value"], 2)
+
+    def test_requests_are_recorded_per_endpoint(self):
+        metrics.registry.reset()
+        response = MagicMock(status_code=200, url="https://jgiquality.qualer.com/a/List")
+        response.content = b'{"Data": []}'
+        response.json.return_value = {"Data": []}
+        session = MagicMock()
+        session.request.return_value = response
+
+        get_json(session, "https://jgiquality.qualer.com/a/List?Id=1")
+
+        key = ("request_seconds", (("endpoint", "/a/List"),))
+        self.assertEqual(metrics.registry.histograms[key].count, 1)
+        self.assertEqual(
+            metrics.registry.counters[("response_bytes_total", (("endpoint", "/a/List"),))], 12
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
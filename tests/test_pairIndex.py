@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+import unittest
+from pairIndex import PairIndex
+
+
+class TestPairIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "pairs.jsonl")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_unknown_pairs_are_fetched(self):
+        with PairIndex(self.path) as index:
+            self.assertTrue(index.should_fetch(1, 2))
+
+    def test_recent_empty_pairs_are_skipped_after_reload(self):
+        with PairIndex(self.path) as index:
+            index.record(1, 2, 0)
+            index.record(1, 3, 4)
+
+        with PairIndex(self.path) as index:
+            self.assertFalse(index.should_fetch(1, 2))
+            self.assertTrue(index.should_fetch(1, 3))
+
+    def test_empty_pairs_expire_after_ttl(self):
+        with PairIndex(self.path, empty_ttl_days=1) as index:
+            index.record(1, 2, 0)
+            self.assertTrue(index.should_fetch(1, 2, now=time.time() + 2 * 86400))
+
+    def test_refresh_fetches_everything(self):
+        with PairIndex(self.path) as index:
+            index.record(1, 2, 0)
+        with PairIndex(self.path, refresh=True) as index:
+            self.assertTrue(index.should_fetch(1, 2))
+
+    def test_log_is_compacted(self):
+        with PairIndex(self.path) as index:
+            for count in range(5):
+                index.record(1, 2, count)
+        with PairIndex(self.path) as index:
+            self.assertEqual(index.entries[(1, 2)][0], 4)
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from qualerAuth import LoginSession, load_cookies, login, save_cookies
+
+COOKIES = [{"name": ".ASPXAUTH", "value": "abc", "domain": "jgiquality.qualer.com"}]
+
+
+class TestCookieCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, "qualer_cookies.json")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_round_trip(self):
+        save_cookies(COOKIES, self.path)
+        self.assertEqual(load_cookies(self.path), COOKIES)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_missing_file(self):
+        self.assertIsNone(load_cookies(self.path))
+
+    def test_old_cookies_are_ignored(self):
+        save_cookies(COOKIES, self.path, now=time.time() - 13 * 3600)
+        self.assertIsNone(load_cookies(self.path, max_age_hours=12))
+
+    def test_expired_cookie_invalidates_the_set(self):
+        expired = [dict(COOKIES[0], expiry=int(time.time()) - 60)]
+        save_cookies(expired, self.path)
+        self.assertIsNone(load_cookies(self.path))
+
+
+class TestLoginSession(unittest.TestCase):
+
+    def test_start_reuses_cached_cookies(self):
+        authenticate = MagicMock(return_value=COOKIES)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "qualer_cookies.json")
+            save_cookies(COOKIES, path)
+            cookies = LoginSession(authenticate).start(path)
+
+        self.assertEqual(cookies, COOKIES)
+        authenticate.assert_not_called()
+
+    def test_start_logs_in_and_caches(self):
+        authenticate = MagicMock(return_value=COOKIES)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, "qualer_cookies.json")
+            LoginSession(authenticate).start(path)
+            self.assertEqual(load_cookies(path), COOKIES)
+
+        authenticate.assert_called_once()
+
+    def test_concurrent_refreshes_log_in_once(self):
+        def authenticate():
+            time.sleep(0.05)
+            return COOKIES
+
+        auth = LoginSession(authenticate)
+        generation = auth.generation
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(auth.refresh(generation)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(auth.logins, 1)
+        self.assertEqual(results, [COOKIES] * 8)
+
+
+class TestLogin(unittest.TestCase):
+
+    @patch.dict(os.environ, {"QUALER_USERNAME": "user", "QUALER_PASSWORD": "pass"})
+    def test_returns_once_the_login_page_is_left(self):
+        driver = MagicMock(current_url="https://jgiquality.qualer.com/login")
+        password = MagicMock()
+
+        def submit(keys):
+            driver.current_url = "https://jgiquality.qualer.com/"
+
+        password.send_keys.side_effect = submit
+        driver.find_element.side_effect = [MagicMock(), password]
+
+        started = time.monotonic()
+        login(driver)
+        self.assertLess(time.monotonic() - started, 1)
+
+    @patch.dict(os.environ, {"QUALER_USERNAME": "user", "QUALER_PASSWORD": "bad"})
+    def test_exits_on_validation_error(self):
+        driver = MagicMock(current_url="https://jgiquality.qualer.com/login")
+        driver.find_elements.return_value = [MagicMock()]
+
+        with self.assertRaises(SystemExit):
+            login(driver)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import requests
+from qualerClient import Overloaded, with_retries
+
+
+class TestWithRetries(unittest.TestCase):
+
+    @patch("qualerClient.time.sleep")
+    def test_retryable_errors_are_retried_with_backoff(self, sleep):
+        errors = [requests.ConnectionError("dropped"), Overloaded("busy", retry_after=3)]
+        call = MagicMock(side_effect=[*errors, "ok"])
+
+        self.assertEqual(with_retries(call, "/x"), "ok")
+        self.assertEqual(call.call_count, 3)
+        # The server's Retry-After is honoured
+        self.assertEqual(sleep.call_args[0][0], 3)
+
+    @patch("qualerClient.time.sleep")
+    def test_the_last_error_is_raised(self, sleep):
+        call = MagicMock(side_effect=requests.Timeout("slow"))
+        with self.assertRaises(requests.Timeout):
+            with_retries(call, "/x", retries=2)
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+
+    def test_other_errors_are_not_retried(self):
+        call = MagicMock(side_effect=KeyError("Data"))
+        with self.assertRaises(KeyError):
+            with_retries(call, "/x")
+        call.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
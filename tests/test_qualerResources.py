@@ -0,0 +1,64 @@
+import subprocess
+import sys
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+import qualer
+from qualerResources import Lazy, resolve
+
+
+class TestLazy(unittest.TestCase):
+
+    def test_factory_runs_once_on_first_use(self):
+        factory = MagicMock()
+        factory.return_value.request.return_value = "reply"
+        lazy = Lazy(factory)
+        factory.assert_not_called()
+
+        self.assertEqual(lazy.request("GET", "/"), "reply")
+        self.assertEqual(lazy.request("GET", "/"), "reply")
+        factory.assert_called_once()
+        self.assertIs(resolve(lazy), factory.return_value)
+
+    def test_concurrent_first_use_builds_one_object(self):
+        built = []
+        lazy = Lazy(lambda: built.append(object()) or built[-1])
+        threads = [threading.Thread(target=resolve, args=(lazy,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(built), 1)
+
+    def test_resolve_passes_other_objects_through(self):
+        engine = MagicMock()
+        self.assertIs(resolve(engine), engine)
+
+
+class TestFastImport(unittest.TestCase):
+
+    def test_importing_a_crawler_loads_no_browser_orm_or_pandas(self):
+        code = (
+            "import sys, collectUncertainties, collectBudgets, getCMCs; "
+            "print(sorted(m for m in ('pandas', 'selenium', 'sqlalchemy') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def test_dispatches_to_the_command_module(self):
+        with patch("getCMCs.run") as run, patch.object(sys, "argv", ["qualer.py"]):
+            qualer.main(["get-cmcs", "--restart", "--concurrency", "4"])
+        run.assert_called_once_with(["--restart", "--concurrency", "4"])
+
+    def test_unknown_command(self):
+        with self.assertRaises(SystemExit), patch("sys.stderr"):
+            qualer.main(["collect-everything"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from recordSink import open_sink, part_base, read_output, remove_output, rewrite_output
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+class TestRecordSink(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.tempdir.name, "UncertaintyValues")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write_two_runs(self, fmt):
+        with open_sink(self.base, fmt) as sink:
+            sink.write_many([{"Id": 1, "Value": 0.5}, {"Id": 2, "Value": 1.5}])
+            self.assertEqual(sink.pending, 2)
+            sink.flush()
+            self.assertEqual(sink.pending, 0)
+            sink.write({"Id": 3, "Value": 2.5})
+        # A resumed run appends to the same output
+        with open_sink(self.base, fmt) as sink:
+            sink.write({"Id": 4, "Value": 3.5})
+        return read_output(self.base, fmt)
+
+    def test_csv_writes_each_record_once_with_one_header(self):
+        df = self.write_two_runs("csv")
+        self.assertEqual(sorted(df["Id"]), [1, 2, 3, 4])
+
+    def test_gzip_csv(self):
+        df = self.write_two_runs("csv.gz")
+        self.assertEqual(sorted(df["Id"]), [1, 2, 3, 4])
+        self.assertTrue(os.path.exists(self.base + ".csv.gz"))
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet(self):
+        df = self.write_two_runs("parquet")
+        self.assertEqual(sorted(df["Id"]), [1, 2, 3, 4])
+
+    def test_columns_the_header_lacks_are_reported(self):
+        output = StringIO()
+        with redirect_stdout(output), open_sink(self.base, "csv") as sink:
+            sink.write({"Id": 1, "Value": 0.5})
+            sink.flush()
+            sink.write({"Id": 2, "Value": 1.5, "Unit": "mV"})
+            sink.flush()
+            sink.write({"Id": 3, "Value": 2.5, "Unit": "V"})
+
+        self.assertEqual(output.getvalue().count("no column for Unit"), 1)
+        self.assertEqual(list(read_output(self.base, "csv").columns), ["Id", "Value"])
+
+    def test_rewrite_and_remove(self):
+        df = self.write_two_runs("csv")
+        rewrite_output(df[df["Id"] > 2], self.base, "csv")
+        self.assertEqual(sorted(read_output(self.base, "csv")["Id"]), [3, 4])
+        remove_output(self.base, "csv")
+        self.assertTrue(read_output(self.base, "csv").empty)
+
+    def test_worker_parts_are_read_with_the_output(self):
+        with open_sink(self.base, "csv") as sink:
+            sink.write({"Id": 1, "Value": 0.5})
+        for worker, ids in (("host1", [2, 3]), ("host2", [4])):
+            with open_sink(part_base(self.base, worker), "csv") as sink:
+                sink.write_many([{"Id": i, "Value": 1.5} for i in ids])
+        # Another output or format is not a part
+        with open_sink(self.base + "Extra", "csv") as sink:
+            sink.write({"Id": 5, "Value": 2.5})
+        with open_sink(part_base(self.base, "host3"), "csv.gz") as sink:
+            sink.write({"Id": 6, "Value": 2.5})
+
+        self.assertEqual(list(read_output(self.base, "csv")["Id"]), [1, 2, 3, 4])
+        # Rewriting merges the parts into the output's own file
+        df = read_output(self.base, "csv")
+        rewrite_output(df[df["Id"] != 3], self.base, "csv")
+        self.assertEqual(list(read_output(self.base, "csv")["Id"]), [1, 2, 4])
+        self.assertFalse(os.path.exists(part_base(self.base, "host1") + ".csv"))
+        remove_output(self.base, "csv")
+        self.assertTrue(read_output(self.base, "csv").empty)
+        self.assertEqual(list(read_output(self.base, "csv.gz")["Id"]), [6])
+
+
+if __name__ == "__main__":
+    unittest.main()
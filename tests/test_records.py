@@ -0,0 +1,90 @@
+import unittest
+from bulkLoad import batch_columns, record_rows
+from records import Batch, Capability, Component, Value, budget_batches, split_components
+
+COMPONENTS = [
+    {
+        "Id": 101,
+        "Name": "Resolution",
+        "DistributionType": "Rectangular",
+        "Divisor": 1.7320508075688772,
+        "UncertaintyValues": [
+            {"Id": 10101, "Value": 0.5, "Unit": "mV", "IsPercent": False},
+            {"Id": 10102, "Value": 0.1, "Unit": "%", "IsPercent": True},
+        ],
+    },
+    {"Id": 102, "Name": "Drift", "Notes": "added later", "UncertaintyValues": None},
+]
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_from_json_tags_and_keeps_undeclared_keys(self):
+        component = Component.from_json(COMPONENTS[1], UncertaintyBudgetId=7)
+        self.assertEqual(component.UncertaintyBudgetId, 7)
+        self.assertIsNone(component.get("Divisor"))
+        self.assertEqual(component.extra, {"Name": "Drift", "Notes": "added later"})
+        # The nested values are split off, not kept as an extra column
+        self.assertNotIn("UncertaintyValues", Component.from_json(COMPONENTS[0]).extra)
+
+    def test_records_have_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            Capability().__dict__
+
+    def test_split_components(self):
+        components, values = split_components(7, COMPONENTS)
+        self.assertEqual(len(components), 2)
+        self.assertEqual(components.names[-1], "Notes")
+        rows = components.dicts()
+        self.assertEqual(rows[0]["UncertaintyBudgetId"], 7)
+        self.assertNotIn("Notes", rows[0])
+        self.assertEqual(list(components.padded_rows())[0][-1], None)
+        self.assertEqual(
+            [(v["Id"], v["UncertaintyComponentId"]) for v in values.dicts()],
+            [(10101, 101), (10102, 101)],
+        )
+
+    def test_budget_batches(self):
+        rows = [
+            {"UncertaintyBudgetId": 7, "BudgetName": "A", "TechniqueName": "x"},
+            {"UncertaintyBudgetId": 8, "BudgetName": "B"},
+        ]
+        tables = budget_batches(rows, serviceGroupId=1, techniqueId=2)
+        budgets = tables["uncertainty_budgets"]
+        self.assertEqual(budgets.names[:2], ["UncertaintyBudgetId", "BudgetName"])
+        self.assertNotIn("TechniqueName", budgets.names)
+        self.assertEqual(tables["service_groups"].rows, [(1,)])
+        self.assertEqual(tables["uncertainty_budget_service_groups"].rows, [(7, 1), (8, 1)])
+        self.assertEqual(tables["uncertainty_budget_techniques"].rows, [(7, 2), (8, 2)])
+
+    def test_extend_merges_batches_and_dicts(self):
+        merged = Batch("uncertainty_values")
+        merged.extend(split_components(7, COMPONENTS)[1])
+        merged.extend([{"Id": 1, "Value": 2.0, "Source": "csv"}])
+        other = Batch("uncertainty_values", ("Value", "Id"))
+        other.add((3.0, 2))
+        merged.extend(other)
+        self.assertEqual(len(merged), 4)
+        self.assertEqual(merged.names[-1], "Source")
+        self.assertEqual(merged.dicts()[3]["Id"], 2)
+        self.assertEqual(merged.columns(["Id", "Source"])["Source"], [None, None, "csv", None])
+
+    def test_bulk_load_columns_and_rows(self):
+        components, _ = split_components(7, COMPONENTS)
+        columns = batch_columns("uncertainty_components", components)
+        self.assertEqual(columns["Id"], "BIGINT")
+        self.assertEqual(columns["Divisor"], "DOUBLE PRECISION")
+        # Only fields the replies had become columns
+        self.assertNotIn("ComponentType", columns)
+        capability = Capability.from_json({"Parameter": "P", "RangeMin": 0.0}, TechniqueId=3)
+        names = ("Parameter", "TechniqueId")
+        self.assertEqual(list(record_rows(names, [capability])), [["P", 3]])
+        self.assertEqual(list(record_rows(Capability.names, [capability]))[0][-1], 3)
+        # A record of one declared column still has rows and items
+        self.assertEqual(Capability(TechniqueId=3).row(), (3,))
+        self.assertEqual(list(capability.items())[0], ("TechniqueId", 3))
+        self.assertIsInstance(Value.from_json({"Id": 1}), Value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+from responseCache import CacheMiss, ResponseCache, request_key
+
+URL = "https://jgiquality.qualer.com/UncertaintyComponent/List?UncertaintyBudgetId=7"
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tempdir.name, "responses")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def objects(self):
+        return sum(len(files) for _, _, files in os.walk(os.path.join(self.directory, "objects")))
+
+    def test_key_ignores_parameter_order_and_token(self):
+        self.assertEqual(
+            request_key("https://q/x?b=2&a=1"), request_key("https://q/x?a=1&b=2")
+        )
+        self.assertEqual(
+            request_key("https://q/x", {"sort": "", "__RequestVerificationToken": "t1"}),
+            request_key("https://q/x", {"sort": "", "__RequestVerificationToken": "t2"}),
+        )
+        self.assertNotEqual(request_key("https://q/x"), request_key("https://q/x", {}))
+
+    def test_off_always_loads(self):
+        load = MagicMock(return_value={"Data": []})
+        cache = ResponseCache()
+        cache.fetch(URL, load)
+        cache.fetch(URL, load)
+        self.assertEqual(load.call_count, 2)
+
+    def test_replay_serves_recorded_replies_without_loading(self):
+        payload = {"uncertaintyComponents": [{"Id": 1, "Name": "Résolution"}]}
+        with ResponseCache().open(self.directory, "record") as cache:
+            cache.fetch(URL, lambda: payload)
+
+        with ResponseCache().open(self.directory, "replay") as cache:
+            load = MagicMock()
+            self.assertEqual(cache.fetch(URL, load), payload)
+            load.assert_not_called()
+            with self.assertRaises(CacheMiss):
+                cache.fetch(URL + "0", load)
+
+    def test_use_refetches_stale_replies(self):
+        with ResponseCache().open(self.directory, "use", ttl_days=1) as cache:
+            cache.fetch(URL, lambda: {"Data": [1]})
+            key = request_key(URL)
+            digest, stored = cache.entries[key]
+            cache.entries[key] = (digest, stored - 2 * 86400)
+            self.assertEqual(cache.fetch(URL, lambda: {"Data": [2]}), {"Data": [2]})
+            self.assertEqual(cache.fetch(URL, lambda: {"Data": [3]}), {"Data": [2]})
+
+    def test_streamed_replies_are_stored_once_read_to_the_end(self):
+        body = [b'{"Data": [', b'{"Id": 1}', b"]}"]
+        with ResponseCache().open(self.directory, "record") as cache:
+            abandoned = cache.stream(URL + "0", lambda: iter(body))
+            next(abandoned)
+            abandoned.close()
+            self.assertEqual(list(cache.stream(URL, lambda: iter(body))), body)
+        self.assertEqual(list(cache.entries), [request_key(URL)])
+
+        with ResponseCache().open(self.directory, "replay") as cache:
+            load = MagicMock()
+            self.assertEqual(b"".join(cache.stream(URL, load)), b"".join(body))
+            load.assert_not_called()
+            # A reply recorded whole can be streamed as well
+            cache.put(request_key(URL, {}), {"Data": []})
+            self.assertEqual(b"".join(cache.stream(URL, load, {})), b'{"Data":[]}')
+            with self.assertRaises(CacheMiss):
+                list(cache.stream(URL + "0", load))
+        self.assertEqual(
+            [name for name in os.listdir(self.directory) if name.endswith(".tmp")], []
+        )
+
+    def test_identical_replies_share_one_object(self):
+        with ResponseCache().open(self.directory, "record") as cache:
+            for i in range(50):
+                cache.fetch(f"{URL}{i}", lambda: {"Data": []})
+        self.assertEqual(self.objects(), 1)
+
+    def test_expired_entries_are_evicted_on_open(self):
+        with ResponseCache().open(self.directory, "record", ttl_days=1) as cache:
+            cache.fetch(URL, lambda: {"Data": [1]})
+            cache.fetch(URL + "0", lambda: {"Data": [2]})
+        with ResponseCache().open(self.directory, "record", ttl_days=1) as cache:
+            cache._load(now=time.time() + 2 * 86400)
+
+        self.assertEqual(cache.entries, {})
+        self.assertEqual(self.objects(), 0)
+
+    def test_replay_keeps_old_recordings(self):
+        with ResponseCache().open(self.directory, "record", ttl_days=1) as cache:
+            cache.fetch(URL, lambda: {"Data": [1]})
+        with open(os.path.join(self.directory, "index.jsonl"), encoding="utf-8") as f:
+            entry = json.loads(f.readline())
+        entry["stored"] -= 40 * 86400
+        with open(os.path.join(self.directory, "index.jsonl"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        for _ in range(2):
+            with ResponseCache().open(self.directory, "replay", ttl_days=30) as cache:
+                self.assertEqual(cache.fetch(URL, MagicMock()), {"Data": [1]})
+        self.assertEqual(self.objects(), 1)
+
+    def test_size_limit_evicts_oldest_first(self):
+        with ResponseCache().open(self.directory, "record") as cache:
+            for i in range(5):
+                cache.fetch(f"{URL}{i}", lambda i=i: {"Data": [os.urandom(512).hex(), i]})
+                time.sleep(0.01)
+
+        with ResponseCache().open(self.directory, "use", max_mb=2000 / 2**20) as cache:
+            self.assertLess(len(cache.entries), 5)
+            # The newest reply survives
+            self.assertEqual(cache.fetch(f"{URL}4", MagicMock())["Data"][1], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
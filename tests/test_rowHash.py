@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+import pandas as pd
+from rowHash import HASH_COLUMN, hash_rows, row_hash
+
+
+class TestRowHash(unittest.TestCase):
+
+    def test_hash_ignores_column_order_and_nulls(self):
+        digest = row_hash(["Id", "Name"], [1, "a"])
+        self.assertEqual(row_hash(["Name", "Id"], ["a", 1]), digest)
+        self.assertEqual(row_hash(["Id", "Name", "Notes"], [1, "a", None]), digest)
+        self.assertEqual(row_hash(["Id", "Name", "Notes"], [1, "a", float("nan")]), digest)
+        self.assertEqual(row_hash(["Id", "Name", "Notes"], [1, "a", pd.NA]), digest)
+        self.assertNotEqual(row_hash(["Id", "Name"], [1, "b"]), digest)
+        self.assertNotEqual(row_hash(["Id", "Label"], [1, "a"]), digest)
+
+    def test_numbers_hash_the_same_from_json_and_pandas(self):
+        digest = row_hash(["Id", "Value", "IsPercent"], [12, 0.5, True])
+        self.assertEqual(
+            row_hash(["Id", "Value", "IsPercent"], [12.0, np.float64(0.5), np.bool_(True)]),
+            digest,
+        )
+        self.assertEqual(row_hash(["Id", "Value", "IsPercent"], [np.int64(12), 0.5, True]), digest)
+        # A string is not the number it spells
+        self.assertNotEqual(row_hash(["Id"], ["12"]), row_hash(["Id"], [12]))
+        self.assertNotEqual(row_hash(["Flag"], [True]), row_hash(["Flag"], [1]))
+
+    def test_hash_rows_appends_the_hash(self):
+        columns, rows = hash_rows({"Id": "BIGINT", "Name": "TEXT"}, [(1, "a"), [2, None]])
+        self.assertEqual(list(columns), ["Id", "Name", HASH_COLUMN])
+        rows = list(rows)
+        self.assertEqual(rows[0], (1, "a", row_hash(["Id", "Name"], [1, "a"])))
+        self.assertEqual(rows[1][2], row_hash(["Id"], [2]))
+
+    def test_hash_rows_recomputes_a_stored_hash(self):
+        columns, rows = hash_rows({HASH_COLUMN: "TEXT", "Id": "BIGINT"}, [("stale", 1)])
+        self.assertEqual(list(columns), ["Id", HASH_COLUMN])
+        self.assertEqual(list(rows), [(1, row_hash(["Id"], [1]))])
+
+
+if __name__ == "__main__":
+    unittest.main()
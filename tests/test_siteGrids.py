@@ -0,0 +1,131 @@
+import unittest
+from argparse import Namespace
+from unittest.mock import MagicMock, patch
+import requests
+from siteGrids import (
+    BUDGET_SORT,
+    SITE_ID,
+    grid_form,
+    query_site_ids,
+    read_budget_listing,
+    read_pages,
+    site_ids,
+    technique_ids_by_name,
+)
+
+
+def _grid(rows, requested):
+    """A fetch_page that serves ``rows`` like a paging grid and records the forms."""
+
+    def fetch_page(form):
+        requested.append(form)
+        if "pageSize" not in form:
+            return {"Data": rows, "Total": len(rows)}
+        start = (form["page"] - 1) * form["pageSize"]
+        return {"Data": rows[start:start + form["pageSize"]], "Total": len(rows)}
+
+    return fetch_page
+
+
+class TestSiteGrids(unittest.TestCase):
+
+    def test_grid_form(self):
+        self.assertEqual(grid_form(), {"sort": "", "group": "", "filter": ""})
+        self.assertEqual(grid_form(3, 50)["page"], 3)
+        self.assertEqual(grid_form(3, 50)["pageSize"], 50)
+        self.assertEqual(grid_form(3, 50, "Id-asc")["sort"], "Id-asc")
+
+    def test_pages_are_read_in_order(self):
+        requested = []
+        rows, complete = read_pages(_grid(list(range(25)), requested), 10, 3, "Id-asc")
+
+        self.assertEqual(rows, list(range(25)))
+        self.assertTrue(complete)
+        self.assertEqual(sorted(form["page"] for form in requested), [1, 2, 3])
+        # Every page is cut from the same order
+        self.assertEqual({form["sort"] for form in requested}, {"Id-asc"})
+
+    def test_without_page_size_the_grid_is_read_at_once(self):
+        requested = []
+        rows, complete = read_pages(_grid(list(range(25)), requested), 0)
+
+        self.assertEqual(rows, list(range(25)))
+        self.assertTrue(complete)
+        self.assertEqual(requested, [grid_form()])
+
+    def test_a_server_that_ignores_paging_is_read_once(self):
+        requested = []
+        fetch_page = _grid(list(range(25)), requested)
+        rows, complete = read_pages(lambda form: fetch_page(grid_form()), 10)
+
+        self.assertEqual(rows, list(range(25)))
+        self.assertTrue(complete)
+        self.assertEqual(len(requested), 1)
+
+    def test_rows_short_of_the_total_are_incomplete(self):
+        fetch_page = _grid(list(range(25)), [])
+
+        def shifting(form):
+            # Rows moved between pages while they were read
+            reply = fetch_page(form)
+            return dict(reply, Data=reply["Data"][1:]) if form["page"] == 2 else reply
+
+        self.assertEqual(read_pages(shifting, 10)[1], False)
+        self.assertEqual(read_pages(lambda form: {"Data": [1, 2]}, 10), ([1, 2], False))
+
+    @patch("qualerClient.time.sleep")
+    def test_budget_listing_pages_are_posted_and_retried(self, sleep):
+        posted = []
+        fetch_page = _grid(list(range(5)), [])
+
+        def post_form(url, form, token_url):
+            posted.append((url, form.get("page"), token_url))
+            self.assertEqual(form["sort"], BUDGET_SORT)
+            if len(posted) == 2:
+                raise requests.ConnectionError("dropped")
+            return fetch_page(form)
+
+        rows, complete = read_budget_listing("http://q", 7, post_form, page_size=2, concurrency=1)
+
+        self.assertEqual(rows, list(range(5)))
+        self.assertTrue(complete)
+        url = "http://q/Uncertainty/UncertaintyBudget_Read?siteId=7"
+        token_url = "http://q/Uncertainty/UncertaintyBudgets?siteId=7"
+        self.assertEqual(posted[:3], [(url, 1, token_url)] + [(url, 2, token_url)] * 2)
+        sleep.assert_called_once()
+
+    def test_technique_ids_by_name(self):
+        techniques = [
+            {"TechniqueId": 1, "Name": "Caliper"},
+            {"TechniqueId": 2, "Name": "Torque"},
+            {"TechniqueId": 3, "Name": "Caliper"},
+        ]
+        self.assertEqual(technique_ids_by_name(techniques), {"Caliper": [1, 3], "Torque": [2]})
+
+    @patch("siteGrids.query_site_ids")
+    def test_site_ids(self, mock_query):
+        mock_query.return_value = [2, 3]
+        self.assertEqual(site_ids(Namespace(site_id=[4, 5]), None), ([4, 5], True))
+        # The database may not know every site yet
+        self.assertEqual(site_ids(Namespace(site_id=None), None), ([2, 3], False))
+        mock_query.return_value = []
+        with patch.dict("os.environ", {"QUALER_SITE_ID": "7"}):
+            self.assertEqual(site_ids(Namespace(site_id=None), None), ([7], False))
+        with patch.dict("os.environ", clear=True):
+            self.assertEqual(site_ids(Namespace(site_id=None), None), ([SITE_ID], False))
+
+    def test_query_site_ids(self):
+        cursor = MagicMock()
+        cursor.fetchone.return_value = ("uncertainty_budgets",)
+        cursor.fetchall.return_value = [(2,), (3,)]
+        engine = MagicMock()
+        engine.raw_connection.return_value.cursor.return_value = cursor
+        self.assertEqual(query_site_ids(engine), [2, 3])
+
+        # Before the first load there is no table to read
+        cursor.fetchone.return_value = (None,)
+        self.assertEqual(query_site_ids(engine), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
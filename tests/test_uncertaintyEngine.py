@@ -0,0 +1,90 @@
+import math
+import unittest
+import numpy as np
+from uncertaintyEngine import RESULT_COLUMNS, evaluate, to_batch, unevaluable_budgets
+
+COMPONENTS = {
+    "Id": [11, 12, 21],
+    "UncertaintyBudgetId": [1, 1, 2],
+    "Divisor": [math.sqrt(3), 2.0, None],
+    "SensitivityCoefficient": [1.0, -0.5, None],
+    "DegreesOfFreedom": [None, 9, 4],
+}
+VALUES = {
+    "Id": [111, 112, 121, 211, 999],
+    "UncertaintyComponentId": [11, 11, 12, 21, 404],
+    "Value": [0.3, 0.6, 1.0, 0.2, 5.0],
+    "RangeMin": [0.0, 10.0, None, None, 0.0],
+    "RangeMax": [10.0, 20.0, None, None, 1.0],
+    "IsPercent": [False, False, True, False, False],
+}
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def setUp(self):
+        self.results, self.contributions = evaluate(COMPONENTS, VALUES, coverage_factor=2.0)
+
+    def point(self, budgetId, x):
+        rows = to_batch("r", self.results, RESULT_COLUMNS).dicts()
+        for row in rows:
+            same = row["TestPoint"] == x or (math.isnan(row["TestPoint"]) and math.isnan(x))
+            if row["UncertaintyBudgetId"] == budgetId and same:
+                return row
+        self.fail(f"No result for budget {budgetId} at {x}")
+
+    def test_test_points_are_the_range_bounds(self):
+        self.assertEqual(self.results["UncertaintyBudgetId"].tolist(), [1, 1, 1, 2])
+        self.assertEqual(self.results["TestPoint"][:3].tolist(), [0.0, 10.0, 20.0])
+        # A budget without range bounds is evaluated once, over the whole range
+        self.assertTrue(math.isnan(self.results["TestPoint"][3]))
+
+    def test_combined_and_expanded(self):
+        # At 20: rectangular 0.6 and 0.5 * 1% of 20 over divisor 2
+        u1, u2 = 0.6 / math.sqrt(3), 0.5 * 0.2 / 2
+        row = self.point(1, 20.0)
+        self.assertEqual(row["Components"], 2)
+        self.assertAlmostEqual(row["CombinedUncertainty"], math.hypot(u1, u2))
+        self.assertAlmostEqual(row["ExpandedUncertainty"], 2 * math.hypot(u1, u2))
+        # Welch-Satterthwaite: only the component with 9 degrees of freedom counts
+        self.assertAlmostEqual(row["EffectiveDegreesOfFreedom"], (u1**2 + u2**2) ** 2 / (u2**4 / 9))
+
+    def test_shared_bound_takes_the_larger_value(self):
+        row = self.point(1, 10.0)
+        u1, u2 = 0.6 / math.sqrt(3), 0.5 * 0.1 / 2
+        self.assertAlmostEqual(row["CombinedUncertainty"], math.hypot(u1, u2))
+        at_zero = self.contributions["TestPoint"] == 0.0
+        self.assertEqual(self.contributions["UncertaintyComponentId"][at_zero].tolist(), [11, 12])
+        self.assertEqual(self.contributions["StandardUncertainty"][at_zero][1], 0.0)
+
+    def test_defaults_for_missing_divisor_and_sensitivity(self):
+        row = self.point(2, float("nan"))
+        self.assertAlmostEqual(row["CombinedUncertainty"], 0.2)
+        self.assertAlmostEqual(row["EffectiveDegreesOfFreedom"], 4.0)
+
+    def test_missing_columns_are_refused(self):
+        values = {name: column for name, column in VALUES.items() if name != "Value"}
+        with self.assertRaisesRegex(KeyError, "Value"):
+            evaluate(COMPONENTS, values)
+        components = {name: column for name, column in COMPONENTS.items() if name != "Divisor"}
+        with self.assertRaisesRegex(KeyError, "Divisor"):
+            evaluate(components, VALUES)
+
+    def test_percent_values_without_bounds_are_left_out(self):
+        values = {name: list(column) for name, column in VALUES.items()}
+        values["IsPercent"][3] = True
+        self.assertEqual(unevaluable_budgets(COMPONENTS, values).tolist(), [2])
+
+        results, contributions = evaluate(COMPONENTS, values)
+        self.assertEqual(results["UncertaintyBudgetId"].tolist(), [1, 1, 1])
+        self.assertFalse(np.isnan(results["CombinedUncertainty"]).any())
+        self.assertEqual(unevaluable_budgets(COMPONENTS, VALUES).tolist(), [])
+
+    def test_chunks_give_the_same_results(self):
+        chunked, _ = evaluate(COMPONENTS, VALUES, chunk_pairs=1)
+        for name in RESULT_COLUMNS:
+            np.testing.assert_array_equal(chunked[name], self.results[name])
+
+
+if __name__ == "__main__":
+    unittest.main()
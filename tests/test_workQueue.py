@@ -0,0 +1,62 @@
+import json
+import unittest
+from unittest.mock import patch
+from workQueue import WorkQueue
+
+
+class FakeQueue(WorkQueue):
+    """A WorkQueue whose statements are recorded and answered from a script."""
+
+    def __init__(self, replies=(), **kwargs):
+        self.statements = []
+        self.replies = list(replies)
+        super().__init__(engine=None, name="crawl/run", worker="host-1", **kwargs)
+
+    def _execute(self, sql, params=None, fetch=False):
+        self.statements.append((sql, params))
+        if fetch:
+            return self.replies.pop(0)
+        return 0
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def test_enqueue_sends_units_as_json_lists(self):
+        queue = FakeQueue()
+        queue.enqueue([(1, 2), 7])
+        sql, params = queue.statements[-1]
+        self.assertIn("ON CONFLICT", sql)
+        self.assertEqual(params, ("crawl/run", json.dumps([[1, 2], [7]])))
+        self.assertEqual(queue.enqueue([]), 0)
+
+    def test_claimed_units_come_back_as_enqueued(self):
+        queue = FakeQueue(replies=[[([1, 2],), ([7],)], []])
+        self.assertEqual(list(queue.claimed(2)), [(1, 2), 7])
+        claim = queue.statements[-1]
+        self.assertIn("FOR UPDATE SKIP LOCKED", claim[0])
+        self.assertEqual(claim[1]["worker"], "host-1")
+        self.assertEqual(claim[1]["limit"], 2)
+
+    def test_mark_and_fail_match_the_stored_unit(self):
+        queue = FakeQueue()
+        queue.mark(1, 2)
+        self.assertEqual(queue.statements[-1][1], ("crawl/run", "[1, 2]"))
+        queue.fail(7, ValueError("bad"))
+        self.assertEqual(queue.statements[-1][1][-1], "[7]")
+
+    def test_drain_waits_for_units_held_elsewhere(self):
+        # First pass claims one unit; then a dead worker's unit comes free
+        queue = FakeQueue(replies=[[([1],)], [], [(1, 1)], [([2],)], [], [(0, 0)]], poll=0)
+        processed = []
+        queue.drain(lambda units: processed.extend(units))
+        self.assertEqual(processed, [1, 2])
+
+    def test_wait_polls_while_others_hold_units(self):
+        queue = FakeQueue(replies=[[(0, 3)], [(0, 1)], [(0, 0)]], poll=0)
+        with patch("workQueue.time.sleep") as sleep:
+            self.assertFalse(queue.wait())
+        self.assertEqual(sleep.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,395 @@
+"""Evaluate uncertainty budgets locally from their components and values.
+
+Each UncertaintyValue is one contribution of its component over the range
+``[RangeMin, RangeMax]`` of the reading (a missing bound is open). A budget
+is evaluated at every range bound of its values, its test points. At a test
+point each component contributes the standard uncertainty
+
+    u_i = |SensitivityCoefficient| * Value / Divisor
+
+where a percent ``Value`` is taken of the test point. When several values of
+a component cover the point (adjacent ranges share a bound) the largest is
+used. The combined uncertainty is the root sum of squares of the u_i, the
+effective degrees of freedom follow Welch-Satterthwaite, and the expanded
+uncertainty is ``k`` times the combined one. A budget without any range
+bound is evaluated once, over the whole range, unless it has percent values:
+with no test point to take them of, it is left out and reported.
+
+All budgets are evaluated together with NumPy, in chunks of at most
+``CHUNK_PAIRS`` (test point, value) pairs. Values are assumed to be in the
+unit of their budget; nothing is converted.
+
+    python qualer.py evaluate --source files --format parquet
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import metrics
+from bulkLoad import copy_records
+from qualerResources import database_url, new_engine
+from records import Batch
+from recordSink import FORMATS, read_output
+
+DEFAULT_COVERAGE_FACTOR = 2.0
+CHUNK_PAIRS = 2_000_000
+
+RESULT_COLUMNS = (
+    "UncertaintyBudgetId",
+    "TestPoint",
+    "Components",
+    "CombinedUncertainty",
+    "EffectiveDegreesOfFreedom",
+    "CoverageFactor",
+    "ExpandedUncertainty",
+)
+# Columns ``evaluate`` reads. They must be present; a null in one of them
+# takes the default noted (no default: the value is required)
+COMPONENT_COLUMNS = (
+    "Id",
+    "UncertaintyBudgetId",
+    "Divisor",  # 1
+    "SensitivityCoefficient",  # 1
+    "DegreesOfFreedom",  # infinite
+)
+VALUE_COLUMNS = (
+    "UncertaintyComponentId",
+    "Value",  # 0
+    "RangeMin",  # open
+    "RangeMax",  # open
+    "IsPercent",  # false
+)
+CONTRIBUTION_COLUMNS = (
+    "UncertaintyBudgetId",
+    "TestPoint",
+    "UncertaintyComponentId",
+    "StandardUncertainty",
+)
+
+
+def evaluate(
+    components, values, coverage_factor=DEFAULT_COVERAGE_FACTOR, chunk_pairs=CHUNK_PAIRS
+):
+    """Evaluate every budget at its test points.
+
+    ``components`` and ``values`` map column names to arrays (or anything
+    ``numpy.asarray`` takes, such as DataFrame columns), with at least
+    ``COMPONENT_COLUMNS`` and ``VALUE_COLUMNS``. Returns two dicts of arrays:
+    one row per test point with ``RESULT_COLUMNS``, and one row per
+    contributing component and test point with ``CONTRIBUTION_COLUMNS``.
+    Effective degrees of freedom are NaN where they are infinite. Budgets
+    ``unevaluable_budgets`` names are left out.
+    """
+    with metrics.timer("evaluate_seconds"):
+        joined = _join(components, values)
+        componentIds, dof, component, budget, u, low, high, percent = joined
+        keep = ~np.isin(budget, _unbounded_percent(budget, percent, low, high))
+        component, budget, u = component[keep], budget[keep], u[keep]
+        low, high, percent = low[keep], high[keep], percent[keep]
+
+        budgets, value_start, value_count = np.unique(
+            budget, return_index=True, return_counts=True
+        )
+        point_budget, points = _test_points(budget, low, high, budgets)
+        point_start = np.searchsorted(point_budget, budgets)
+        point_count = np.diff(np.append(point_start, len(points)))
+
+        results, contributions = [], []
+        for first, last in _chunks(value_count * point_count, chunk_pairs):
+            v0, v1 = value_start[first], value_start[last - 1] + value_count[last - 1]
+            p0, p1 = point_start[first], point_start[last - 1] + point_count[last - 1]
+            chunk = _evaluate_chunk(
+                point_budget[p0:p1],
+                points[p0:p1],
+                budget[v0:v1],
+                component[v0:v1],
+                u[v0:v1],
+                percent[v0:v1],
+                low[v0:v1],
+                high[v0:v1],
+                dof,
+                componentIds,
+                coverage_factor,
+            )
+            results.append(chunk[0])
+            contributions.append(chunk[1])
+    return _concat(results, RESULT_COLUMNS), _concat(contributions, CONTRIBUTION_COLUMNS)
+
+
+def unevaluable_budgets(components, values):
+    """IDs of budgets with percent values but no range bound to take them of.
+
+    ``evaluate`` would have to take the percentage of an unknown test point,
+    so it leaves these budgets out.
+    """
+    _, _, _, budget, _, low, high, percent = _join(components, values)
+    return _unbounded_percent(budget, percent, low, high)
+
+
+def _join(components, values):
+    """Each value joined to its component, sorted by budget.
+
+    Returns the component IDs and degrees of freedom per component, then per
+    value its component's position, its budget, the part of u_i that does
+    not depend on the test point, its range and whether it is a percentage.
+    """
+    missing = [name for name in COMPONENT_COLUMNS if name not in components]
+    missing += [name for name in VALUE_COLUMNS if name not in values]
+    if missing:
+        raise KeyError(f"Columns {', '.join(missing)} are required")
+    componentIds = _column(components, "Id", np.int64)
+    budgetOf = _column(components, "UncertaintyBudgetId", np.int64)
+    divisor = _column(components, "Divisor", float, 1.0)
+    divisor[divisor == 0] = 1.0
+    sensitivity = np.abs(_column(components, "SensitivityCoefficient", float, 1.0))
+    dof = _column(components, "DegreesOfFreedom", float, np.inf)
+    dof[dof <= 0] = np.inf
+
+    component = _lookup(componentIds, _column(values, "UncertaintyComponentId", np.int64))
+    known = component >= 0
+    component = component[known]
+    budget = budgetOf[component]
+    order = np.argsort(budget, kind="stable")
+    component, budget = component[order], budget[order]
+    value = np.abs(_column(values, "Value", float, 0.0)[known][order])
+    low = _column(values, "RangeMin", float, -np.inf)[known][order]
+    high = _column(values, "RangeMax", float, np.inf)[known][order]
+    percent = _column(values, "IsPercent", bool, False)[known][order]
+    u = value * sensitivity[component] / divisor[component]
+    return componentIds, dof, component, budget, u, low, high, percent
+
+
+def _unbounded_percent(budget, percent, low, high):
+    """Budgets with a percent value and no finite range bound at all."""
+    bounded = np.unique(budget[np.isfinite(low) | np.isfinite(high)])
+    return np.setdiff1d(np.unique(budget[percent]), bounded)
+
+
+def _evaluate_chunk(
+    point_budget, points, budget, component, u, percent, low, high, dof, componentIds, k
+):
+    """Results for the test points of a run of whole budgets."""
+    # Pair each test point with every value of its budget
+    first_value = np.searchsorted(budget, point_budget)
+    count = np.searchsorted(budget, point_budget, side="right") - first_value
+    pair_point = np.repeat(np.arange(len(points)), count)
+    offset = np.arange(len(pair_point)) - np.repeat(np.cumsum(count) - count, count)
+    pair_value = first_value[pair_point] + offset
+
+    x = points[pair_point]
+    covers = np.isnan(x) | ((low[pair_value] <= x) & (x <= high[pair_value]))
+    pair_point, pair_value, x = pair_point[covers], pair_value[covers], x[covers]
+    pair_u = u[pair_value]
+    pair_u = np.where(percent[pair_value], pair_u * np.abs(x) / 100, pair_u)
+
+    # One contribution per component and test point: the largest
+    pair_component = component[pair_value]
+    key = pair_point * (int(component.max()) + 1 if len(component) else 1) + pair_component
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    pair_u = np.maximum.reduceat(pair_u[order], start) if len(start) else pair_u
+    pair_point, pair_component = pair_point[order][start], pair_component[order][start]
+
+    n = len(points)
+    variance = np.bincount(pair_point, pair_u ** 2, minlength=n)
+    combined = np.sqrt(variance)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ws = np.bincount(pair_point, pair_u ** 4 / dof[pair_component], minlength=n)
+        effective = np.where(ws > 0, variance ** 2 / ws, np.nan)
+    results = {
+        "UncertaintyBudgetId": point_budget,
+        "TestPoint": points,
+        "Components": np.bincount(pair_point, minlength=n),
+        "CombinedUncertainty": combined,
+        "EffectiveDegreesOfFreedom": effective,
+        "CoverageFactor": np.full(n, float(k)),
+        "ExpandedUncertainty": k * combined,
+    }
+    contributions = {
+        "UncertaintyBudgetId": point_budget[pair_point],
+        "TestPoint": points[pair_point],
+        "UncertaintyComponentId": componentIds[pair_component],
+        "StandardUncertainty": pair_u,
+    }
+    return results, contributions
+
+
+def _test_points(budget, low, high, budgets):
+    """Sorted distinct range bounds per budget; NaN for a budget without any."""
+    point_budget = np.concatenate([budget, budget])
+    points = np.concatenate([low, high])
+    finite = np.isfinite(points)
+    point_budget, points = point_budget[finite], points[finite]
+    # Budgets with open ranges only are evaluated once, over the whole range
+    missing = np.setdiff1d(budgets, point_budget)
+    point_budget = np.concatenate([point_budget, missing])
+    points = np.concatenate([points, np.full(len(missing), np.nan)])
+    order = np.lexsort((points, point_budget))
+    point_budget, points = point_budget[order], points[order]
+    distinct = np.ones(len(points), dtype=bool)
+    distinct[1:] = (point_budget[1:] != point_budget[:-1]) | (points[1:] != points[:-1])
+    return point_budget[distinct], points[distinct]
+
+
+def _chunks(pairs, limit):
+    """(first, last) budget slices holding at most ``limit`` pairs, or one budget."""
+    first, total = 0, 0
+    for i, count in enumerate(pairs.tolist()):
+        if total and total + count > limit:
+            yield first, i
+            first, total = i, 0
+        total += count
+    if first < len(pairs):
+        yield first, len(pairs)
+
+
+def _lookup(keys, wanted):
+    """Positions of ``wanted`` in ``keys``, -1 where absent."""
+    if not len(keys):
+        return np.full(len(wanted), -1)
+    order = np.argsort(keys, kind="stable")
+    found = order[np.minimum(np.searchsorted(keys, wanted, sorter=order), len(keys) - 1)]
+    return np.where(keys[found] == wanted, found, -1)
+
+
+def _column(table, name, dtype, default=None):
+    """``table[name]`` as an array of ``dtype``, null values set to ``default``."""
+    column = np.asarray(table[name])
+    if column.dtype.kind == "O":
+        missing = np.fromiter((v is None or v != v for v in column), bool, len(column))
+    elif column.dtype.kind == "f":
+        missing = np.isnan(column)
+    else:
+        return column.astype(dtype)
+    if missing.any():
+        if default is None:
+            raise ValueError(f"Column {name} has missing values")
+        column = np.where(missing, default, column)
+    return column.astype(dtype)
+
+
+def _concat(chunks, columns):
+    if not chunks:
+        return {name: np.array([]) for name in columns}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in columns}
+
+
+def to_batch(table, arrays, columns):
+    """A ``records.Batch`` of result arrays, for ``bulkLoad.copy_records``."""
+    batch = Batch(table, columns)
+    lists = [arrays[name].tolist() for name in columns]
+    batch.rows = list(zip(*lists))
+    return batch
+
+
+def load_database(engine):
+    """Components and values from the tables ``moveBudgetsToDB`` loads."""
+    import pandas as pd
+
+    components = pd.read_sql("SELECT * FROM uncertainty_components", engine)
+    values = pd.read_sql("SELECT * FROM uncertainty_values", engine)
+    return _arrays(components), _arrays(values)
+
+
+def load_files(components_base, values_base, fmt="csv"):
+    """Components and values from the output of ``collectBudgets``."""
+    return _arrays(read_output(components_base, fmt)), _arrays(read_output(values_base, fmt))
+
+
+def _arrays(df):
+    return {name: df[name].to_numpy() for name in df.columns}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute combined and expanded uncertainties of every budget."
+    )
+    parser.add_argument(
+        "--source",
+        choices=("files", "db"),
+        default="files",
+        help="Read components and values from collectBudgets' output files or "
+        "from the database (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="csv",
+        help="Format of the collectBudgets output files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="csv",
+        help="Directory of the collectBudgets output files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--coverage-factor",
+        type=float,
+        default=DEFAULT_COVERAGE_FACTOR,
+        help="k for the expanded uncertainty (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--table",
+        default="uncertainty_results",
+        help="Table the results replace (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--contributions",
+        action="store_true",
+        help="Also save each component's standard uncertainty per test point "
+        "to <table>_contributions",
+    )
+    parser.add_argument(
+        "--database-url",
+        default=database_url(),
+        help="Database to write to (default: QUALER_DATABASE_URL or the Qualer mirror)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = new_engine(args.database_url)
+    started = time.perf_counter()
+    if args.source == "db":
+        components, values = load_database(engine)
+    else:
+        components, values = load_files(
+            os.path.join(args.output_dir, "UncertaintyComponents"),
+            os.path.join(args.output_dir, "UncertaintyValues"),
+            args.format,
+        )
+    loaded = time.perf_counter()
+    unevaluable = unevaluable_budgets(components, values)
+    if len(unevaluable):
+        print(
+            f"{len(unevaluable)} budgets have percent values but no range bounds and "
+            f"are not evaluated: {unevaluable.tolist()}"
+        )
+    results, contributions = evaluate(components, values, args.coverage_factor)
+    evaluated = time.perf_counter()
+    copy_records(
+        engine, args.table, to_batch(args.table, results, RESULT_COLUMNS), replace=True
+    )
+    if args.contributions:
+        table = f"{args.table}_contributions"
+        copy_records(
+            engine, table, to_batch(table, contributions, CONTRIBUTION_COLUMNS), replace=True
+        )
+    budgets = len(np.unique(results["UncertaintyBudgetId"]))
+    print(
+        f"{budgets} budgets, {len(results['TestPoint'])} test points: "
+        f"loaded in {loaded - started:.1f}s, evaluated in {evaluated - loaded:.2f}s, "
+        f"saved to {args.table}."
+    )
+
+
+def run(argv=None):
+    """Command-line entry point."""
+    main(argv)
+
+
+if __name__ == "__main__":
+    run()
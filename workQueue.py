@@ -0,0 +1,287 @@
+"""PostgreSQL work queue, so a crawl can be spread over processes and machines.
+
+The units of a crawl (ServiceGroup/Technique pairs, techniques, budget IDs)
+go into the ``crawl_queue`` table under a queue name shared by every worker
+of one run, e.g. ``collectUncertainties/2024-05-01``. Each worker claims a
+few pending units at a time with ``FOR UPDATE SKIP LOCKED``, so workers never
+wait on each other or get the same unit, and marks them done once their rows
+are committed. A background thread heartbeats the units a worker holds; the
+units of a worker that stops heartbeating for ``lease`` seconds are claimed
+again by the others. A unit that fails ``max_attempts`` times is set aside
+as failed.
+
+    with WorkQueue(engine, "getCMCs/2024-05-01") as queue:
+        queue.enqueue(TechniqueIds)
+        queue.drain(partial(crawl, fetch=..., on_result=..., on_error=queue.fail))
+
+Enqueueing is idempotent, so every worker of a run may do it; units already
+done are not fetched again. A finished queue stays in the table as a record
+of the run until ``reset`` clears it. collectBudgets writes files, so in a
+queued run each worker writes its own part (``UncertaintyComponents-<worker>``),
+which the readers of the output pick up with the rest. A worker's name
+defaults to its host name, so a worker restarted on the same machine appends
+to its own part; workers sharing a machine need their own ``--worker`` names.
+"""
+
+import json
+import socket
+import threading
+import time
+
+TABLE = "crawl_queue"
+DEFAULT_LEASE = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_CREATE_SQL = f"""
+SELECT pg_advisory_xact_lock(hashtext('{TABLE}'));
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    "QueueId" BIGSERIAL PRIMARY KEY,
+    "Queue" TEXT NOT NULL,
+    "Unit" JSONB NOT NULL,
+    "Status" TEXT NOT NULL DEFAULT 'pending',
+    "Worker" TEXT,
+    "Attempts" INTEGER NOT NULL DEFAULT 0,
+    "HeartbeatAt" TIMESTAMPTZ,
+    "DoneAt" TIMESTAMPTZ,
+    "Error" TEXT,
+    UNIQUE ("Queue", "Unit")
+);
+CREATE INDEX IF NOT EXISTS crawl_queue_status ON {TABLE} ("Queue", "Status", "QueueId")
+"""
+
+_CLAIM_SQL = f"""
+UPDATE {TABLE} q SET "Status" = 'claimed', "Worker" = %(worker)s,
+    "Attempts" = q."Attempts" + 1, "HeartbeatAt" = now()
+WHERE q."QueueId" IN (
+    SELECT "QueueId" FROM {TABLE}
+    WHERE "Queue" = %(queue)s AND (
+        "Status" = 'pending'
+        OR ("Status" = 'claimed' AND "HeartbeatAt" < now() - %(lease)s * interval '1 second')
+    )
+    ORDER BY "QueueId"
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING q."Unit"
+"""
+
+# Units whose worker died on them too often are not handed out again
+_GIVE_UP_SQL = f"""
+UPDATE {TABLE} SET "Status" = 'failed', "Error" = 'worker stopped heartbeating'
+WHERE "Queue" = %(queue)s AND "Status" = 'claimed' AND "Attempts" >= %(max_attempts)s
+    AND "HeartbeatAt" < now() - %(lease)s * interval '1 second'
+"""
+
+
+def worker_name():
+    """The host name, stable across restarts and safe in file names."""
+    return socket.gethostname()
+
+
+def _unit(key):
+    return list(key) if isinstance(key, (list, tuple)) else [key]
+
+
+def _key(unit):
+    """A unit as it was enqueued: a tuple, or the ID itself for single IDs."""
+    return unit[0] if len(unit) == 1 else tuple(unit)
+
+
+class WorkQueue:
+    """One worker's handle on a named queue in ``crawl_queue``."""
+
+    def __init__(
+        self,
+        engine,
+        name,
+        worker=None,
+        lease=DEFAULT_LEASE,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        poll=1.0,
+    ):
+        self.engine = engine
+        self.name = name
+        self.worker = worker or worker_name()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll = poll
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self._execute(_CREATE_SQL)
+
+    def _execute(self, sql, params=None, fetch=False):
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if fetch else cursor.rowcount
+            connection.commit()
+            return rows
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def enqueue(self, units):
+        """Add units (tuples or single IDs) not queued yet; returns how many were new."""
+        units = [_unit(key) for key in units]
+        if not units:
+            return 0
+        return self._execute(
+            f'INSERT INTO {TABLE} ("Queue", "Unit") '
+            "SELECT %s, unit FROM jsonb_array_elements(%s::jsonb) WITH ORDINALITY AS u(unit, n) "
+            'ORDER BY n ON CONFLICT ("Queue", "Unit") DO NOTHING',
+            (self.name, json.dumps(units)),
+        )
+
+    def reset(self):
+        """Forget every unit of the queue, to run the crawl again from scratch."""
+        self._execute(f'DELETE FROM {TABLE} WHERE "Queue" = %s', (self.name,))
+
+    def claim(self, limit):
+        """Claim up to ``limit`` units, pending ones or ones whose worker went quiet."""
+        params = {
+            "queue": self.name,
+            "worker": self.worker,
+            "lease": self.lease,
+            "limit": limit,
+            "max_attempts": self.max_attempts,
+        }
+        self._execute(_GIVE_UP_SQL, params)
+        return [_key(unit) for (unit,) in self._execute(_CLAIM_SQL, params, fetch=True)]
+
+    def claimed(self, batch_size=10):
+        """Units claimed ``batch_size`` at a time, until none is left to claim."""
+        while units := self.claim(batch_size):
+            yield from units
+
+    def mark(self, *key):
+        """Mark a unit done. Call only after its rows are written, as ``Checkpoint.mark``."""
+        self._execute(
+            f"UPDATE {TABLE} SET \"Status\" = 'done', \"DoneAt\" = now(), \"Error\" = NULL "
+            'WHERE "Queue" = %s AND "Unit" = %s::jsonb',
+            (self.name, json.dumps(list(key))),
+        )
+
+    def fail(self, key, error):
+        """Hand a unit back for another try, or set it aside once out of attempts."""
+        self._execute(
+            f'UPDATE {TABLE} SET "Status" = CASE WHEN "Attempts" >= %s '
+            "THEN 'failed' ELSE 'pending' END, \"Error\" = %s "
+            'WHERE "Queue" = %s AND "Unit" = %s::jsonb AND "Status" = \'claimed\'',
+            (self.max_attempts, repr(error), self.name, json.dumps(_unit(key))),
+        )
+
+    def counts(self):
+        """{status: units} for the queue."""
+        rows = self._execute(
+            f'SELECT "Status", count(*) FROM {TABLE} WHERE "Queue" = %s GROUP BY "Status"',
+            (self.name,),
+            fetch=True,
+        )
+        return dict(rows)
+
+    def remaining(self):
+        """Units not done or failed yet."""
+        counts = self.counts()
+        return counts.get("pending", 0) + counts.get("claimed", 0)
+
+    def wait(self):
+        """Wait while other workers hold the last units; True if one came free to claim.
+
+        Returns False once every unit is done or failed.
+        """
+        while True:
+            counts = self._execute(
+                f"SELECT count(*) FILTER (WHERE \"Status\" = 'pending' OR \"HeartbeatAt\" "
+                "< now() - %s * interval '1 second'), count(*) "
+                f"FROM {TABLE} WHERE \"Queue\" = %s AND \"Status\" IN ('pending', 'claimed')",
+                (self.lease, self.name),
+                fetch=True,
+            )
+            claimable, unfinished = counts[0]
+            if claimable:
+                return True
+            if not unfinished:
+                return False
+            time.sleep(self.poll)
+
+    def drain(self, process, batch_size=10):
+        """Call ``process(units)`` with claimed units until the queue is finished.
+
+        ``process`` should ``mark`` or ``fail`` each unit; units it has not
+        marked yet when it returns (rows still with the database writer) are
+        waited for like those of other workers. When nothing is left to claim
+        but other workers hold units, this waits in case one of them dies and
+        its units come free.
+        """
+        while True:
+            process(self.claimed(batch_size))
+            if not self.wait():
+                return
+
+    def start(self):
+        """Start heartbeating the units this worker holds."""
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(
+                target=self._beat, name="WorkQueueHeartbeat", daemon=True
+            )
+            self._heartbeat.start()
+        return self
+
+    def _beat(self):
+        while not self._stop.wait(self.lease / 4):
+            try:
+                self._execute(
+                    f'UPDATE {TABLE} SET "HeartbeatAt" = now() '
+                    "WHERE \"Queue\" = %s AND \"Worker\" = %s AND \"Status\" = 'claimed'",
+                    (self.name, self.worker),
+                )
+            except Exception as e:  # A missed beat is retried; the lease allows several
+                print(f"Work queue heartbeat failed: {e!r}")
+
+    def close(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_arguments(parser):
+    """``--queue``, ``--worker`` and ``--lease`` options of the crawl scripts."""
+    parser.add_argument(
+        "--queue",
+        metavar="RUN",
+        help="Share the crawl with other workers through the database work queue; "
+        "every worker of one run passes the same RUN name (--restart empties it)",
+    )
+    parser.add_argument(
+        "--worker",
+        default=worker_name(),
+        help="This worker's name in the queue and its part of collectBudgets' output; "
+        "unique per worker of a run (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=DEFAULT_LEASE,
+        help="Seconds without a heartbeat before a worker's units are claimed again "
+        "(default: %(default)s)",
+    )
+
+
+def open_queue(args, engine, crawl):
+    """The ``WorkQueue`` of ``crawl`` for the run named by ``--queue``, or None."""
+    if not args.queue:
+        return None
+    queue = WorkQueue(engine, f"{crawl}/{args.queue}", worker=args.worker, lease=args.lease)
+    if getattr(args, "restart", False):
+        queue.reset()
+    return queue